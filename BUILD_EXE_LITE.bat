@@ -0,0 +1,160 @@
+@echo off
+title Build EXE File - Lite (khong pandas)
+color 0B
+
+REM Ban build lite: khong dong goi pandas/numpy, doc du lieu bang kiem_kho_lite
+REM (file .exe nho hon, khoi dong nhanh hon tren may yeu)
+REM   BUILD_EXE_LITE.bat            -> dist\KiemKhoApp.exe
+REM   BUILD_EXE_LITE.bat showroom   -> dist\KiemKhoShowroomApp.exe
+set APP_NAME=KiemKhoApp
+set APP_SCRIPT=kiem_kho_app.py
+set INPUT_FILE=DuLieuDauVao.xlsx
+if /i "%~1"=="showroom" (
+    set APP_NAME=KiemKhoShowroomApp
+    set APP_SCRIPT=kiem_kho_showroom.py
+    set INPUT_FILE=DuLieuDauVaoShowroom.xlsx
+)
+
+echo ========================================
+echo    BUILD EXE FILE - LITE (%APP_NAME%)
+echo ========================================
+echo.
+echo This will build .exe file without pandas/numpy
+echo (data is read with kiem_kho_lite + openpyxl/xlrd)
+echo.
+
+REM Check Python
+python --version >nul 2>&1
+if errorlevel 1 (
+    echo [ERROR] Python not installed!
+    echo Please install Python from: https://www.python.org/downloads/
+    pause
+    exit /b 1
+)
+
+echo [OK] Python found
+python --version
+echo.
+
+REM Install required libraries
+echo [INFO] Installing required libraries...
+python -m pip install --quiet --upgrade pip
+
+REM Khong can pandas cho ban lite
+python -m pip install --quiet openpyxl xlrd pyinstaller
+
+if errorlevel 1 (
+    echo [ERROR] Cannot install libraries!
+    pause
+    exit /b 1
+)
+
+echo [OK] Libraries installed successfully
+echo.
+
+REM Verify PyInstaller installation
+echo [INFO] Verifying PyInstaller installation...
+python -m PyInstaller --version >nul 2>&1
+if errorlevel 1 (
+    echo [ERROR] PyInstaller not found after installation!
+    echo [INFO] Trying to install PyInstaller directly...
+    python -m pip install --quiet pyinstaller
+    python -m PyInstaller --version >nul 2>&1
+    if errorlevel 1 (
+        echo [ERROR] Still cannot find PyInstaller!
+        echo [INFO] Please install manually: python -m pip install pyinstaller
+        pause
+        exit /b 1
+    )
+)
+echo [OK] PyInstaller verified successfully
+echo.
+
+REM Delete old build folders
+if exist "build" (
+    echo [INFO] Deleting old build folder...
+    rmdir /s /q build
+)
+if exist "dist" (
+    echo [INFO] Deleting old dist folder...
+    rmdir /s /q dist
+)
+if exist "%APP_NAME%.spec" (
+    echo [INFO] Deleting old spec file...
+    del /q "%APP_NAME%.spec"
+)
+
+echo.
+
+REM Build .exe file
+echo ========================================
+echo    BUILDING EXE FILE...
+echo ========================================
+echo.
+echo Building, please wait (may take a few minutes)...
+echo.
+
+REM Tạo file config tạm thời TRƯỚC KHI build (sẽ được cập nhật sau)
+echo # File này được tạo tự động khi build exe > dist_path_config.py
+echo # Chứa đường dẫn thư mục dist gốc >> dist_path_config.py
+echo DIST_PATH = None  # Sẽ được cập nhật sau khi build >> dist_path_config.py
+
+python -m PyInstaller --onefile --windowed --name "%APP_NAME%" ^
+    --add-data "Kiemke_template.xlsx;." ^
+    --add-data "dist_path_config.py;." ^
+    --hidden-import kiem_kho_lite ^
+    --hidden-import openpyxl ^
+    --hidden-import xlrd ^
+    --hidden-import tkinter ^
+    --hidden-import tkinter.ttk ^
+    --hidden-import tkinter.messagebox ^
+    --hidden-import tkinter.filedialog ^
+    --hidden-import json ^
+    --hidden-import pathlib ^
+    --hidden-import shutil ^
+    --exclude-module pandas ^
+    --exclude-module numpy ^
+    --collect-all openpyxl ^
+    --collect-submodules openpyxl ^
+    "%APP_SCRIPT%"
+
+if errorlevel 1 (
+    echo.
+    echo [ERROR] Cannot create .exe file!
+    echo Please check the error messages above.
+    pause
+    exit /b 1
+)
+
+REM Copy Excel file to dist folder
+if exist "%INPUT_FILE%" (
+    if not exist "dist" mkdir dist
+    copy "%INPUT_FILE%" "dist\" >nul
+    echo [OK] Copied Excel file to dist folder
+)
+
+REM Cập nhật file config với đường dẫn chính xác sau khi build
+REM File này đã được đóng gói vào exe, không cần copy vào thư mục dist
+if exist "dist" (
+    for %%I in (dist) do set DIST_PATH_FINAL=%%~fI
+    echo # File này được tạo tự động khi build exe > dist_path_config.py
+    echo # Chứa đường dẫn thư mục dist gốc >> dist_path_config.py
+    echo DIST_PATH = r"%DIST_PATH_FINAL%" >> dist_path_config.py
+    echo [OK] Updated dist_path_config.py with path: %DIST_PATH_FINAL%
+    echo [INFO] Original dist path saved in exe: %DIST_PATH_FINAL%
+    echo [INFO] Application will automatically find this path even if moved to another location
+    echo [INFO] dist folder now contains only: %APP_NAME%.exe and %INPUT_FILE%
+)
+
+echo.
+echo ========================================
+echo    COMPLETE!
+echo ========================================
+echo.
+echo Executable file created at: dist\%APP_NAME%.exe
+echo.
+echo This file has been built without pandas/numpy (lite data engine).
+echo You can copy the .exe file to another Windows machine and run it.
+echo.
+pause
+
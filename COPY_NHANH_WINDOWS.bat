@@ -33,6 +33,119 @@ if exist "kiem_kho_app.py" (
     echo [ERROR] Không tìm thấy: kiem_kho_app.py
 )
 
+REM Module dùng chung
+if exist "kiem_kho_index.py" (
+    copy "kiem_kho_index.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_index.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_index.py
+)
+
+if exist "kiem_kho_import.py" (
+    copy "kiem_kho_import.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_import.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_import.py
+)
+
+if exist "kiem_kho_scan.py" (
+    copy "kiem_kho_scan.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_scan.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_scan.py
+)
+
+if exist "kiem_kho_notify.py" (
+    copy "kiem_kho_notify.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_notify.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_notify.py
+)
+
+if exist "kiem_kho_isbn.py" (
+    copy "kiem_kho_isbn.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_isbn.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_isbn.py
+)
+
+if exist "kiem_kho_loader.py" (
+    copy "kiem_kho_loader.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_loader.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_loader.py
+)
+
+if exist "kiem_kho_lite.py" (
+    copy "kiem_kho_lite.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_lite.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_lite.py
+)
+
+if exist "kiem_kho_records.py" (
+    copy "kiem_kho_records.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_records.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_records.py
+)
+
+if exist "kiem_kho_export.py" (
+    copy "kiem_kho_export.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_export.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_export.py
+)
+
+if exist "kiem_kho_watchdog.py" (
+    copy "kiem_kho_watchdog.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_watchdog.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_watchdog.py
+)
+
+if exist "kiem_kho_perf.py" (
+    copy "kiem_kho_perf.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_perf.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_perf.py
+)
+
+if exist "kiem_kho_engine.py" (
+    copy "kiem_kho_engine.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_engine.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_engine.py
+)
+
+if exist "kiem_kho_cache.py" (
+    copy "kiem_kho_cache.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_cache.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_cache.py
+)
+
+if exist "kiem_kho_treeview.py" (
+    copy "kiem_kho_treeview.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_treeview.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_treeview.py
+)
+
+if exist "kiem_kho_io.py" (
+    copy "kiem_kho_io.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_io.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_io.py
+)
+
+if exist "kiem_kho_journal.py" (
+    copy "kiem_kho_journal.py" "%COPY_FOLDER%\" >nul
+    echo [OK] Đã copy: kiem_kho_journal.py
+) else (
+    echo [ERROR] Không tìm thấy: kiem_kho_journal.py
+)
+
 REM File Excel
 if exist "DuLieuDauVao.xlsx" (
     copy "DuLieuDauVao.xlsx" "%COPY_FOLDER%\" >nul
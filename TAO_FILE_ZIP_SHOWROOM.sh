@@ -38,6 +38,135 @@ else
     exit 1
 fi
 
+# Module dung chung (chi muc tra cuu)
+if [ -f "kiem_kho_index.py" ]; then
+    cp "kiem_kho_index.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_index.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_index.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_import.py" ]; then
+    cp "kiem_kho_import.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_import.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_import.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_scan.py" ]; then
+    cp "kiem_kho_scan.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_scan.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_scan.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_notify.py" ]; then
+    cp "kiem_kho_notify.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_notify.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_notify.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_isbn.py" ]; then
+    cp "kiem_kho_isbn.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_isbn.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_isbn.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_loader.py" ]; then
+    cp "kiem_kho_loader.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_loader.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_loader.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_lite.py" ]; then
+    cp "kiem_kho_lite.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_lite.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_lite.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_records.py" ]; then
+    cp "kiem_kho_records.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_records.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_records.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_export.py" ]; then
+    cp "kiem_kho_export.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_export.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_export.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_watchdog.py" ]; then
+    cp "kiem_kho_watchdog.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_watchdog.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_watchdog.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_perf.py" ]; then
+    cp "kiem_kho_perf.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_perf.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_perf.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_engine.py" ]; then
+    cp "kiem_kho_engine.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_engine.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_engine.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_cache.py" ]; then
+    cp "kiem_kho_cache.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_cache.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_cache.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_treeview.py" ]; then
+    cp "kiem_kho_treeview.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_treeview.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_treeview.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_io.py" ]; then
+    cp "kiem_kho_io.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_io.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_io.py"
+    exit 1
+fi
+
+if [ -f "kiem_kho_journal.py" ]; then
+    cp "kiem_kho_journal.py" "$TEMP_DIR/"
+    echo "[OK] Da copy: kiem_kho_journal.py"
+else
+    echo "[ERROR] Khong tim thay: kiem_kho_journal.py"
+    exit 1
+fi
+
 # File Excel Showroom
 if [ -f "DuLieuDauVaoShowroom.xlsx" ]; then
     cp "DuLieuDauVaoShowroom.xlsx" "$TEMP_DIR/"
@@ -79,6 +208,11 @@ if [ -f "BUILD_EXE_SHOWROOM_SIMPLE.bat" ]; then
     echo "[OK] Da copy: BUILD_EXE_SHOWROOM_SIMPLE.bat"
 fi
 
+if [ -f "BUILD_EXE_LITE.bat" ]; then
+    cp "BUILD_EXE_LITE.bat" "$TEMP_DIR/"
+    echo "[OK] Da copy: BUILD_EXE_LITE.bat"
+fi
+
 if [ -f "BUILD_EXE_SHOWROOM_DEBUG.bat" ]; then
     cp "BUILD_EXE_SHOWROOM_DEBUG.bat" "$TEMP_DIR/"
     echo "[OK] Da copy: BUILD_EXE_SHOWROOM_DEBUG.bat"
@@ -120,10 +254,27 @@ CACH 2: TAO FILE .EXE (Can Python de build)
 CAC FILE CAN THIET
 ───────────────────────────────────────────────────────────────
 ✓ kiem_kho_showroom.py          - File chinh cua ung dung Showroom
+✓ kiem_kho_index.py             - Module chi muc tra cuu (dung chung)
+✓ kiem_kho_import.py            - Nhap file ma quet cua may quet
+✓ kiem_kho_scan.py              - Hang doi quet ma vach (FIFO)
+✓ kiem_kho_notify.py            - Dai thong bao khong chan quet
+✓ kiem_kho_isbn.py              - Chuan hoa ISBN (EAN-13, check digit)
+✓ kiem_kho_loader.py            - Doc du lieu dau vao tren thread nen
+✓ kiem_kho_lite.py              - Engine doc du lieu khong can pandas (ban lite)
+✓ kiem_kho_records.py           - Dong Tong hop dang gon (slots)
+✓ kiem_kho_export.py            - Xuat file Excel tong hop (write-only)
+✓ kiem_kho_watchdog.py          - Watchdog ghi log khi giao dien bi dung
+✓ kiem_kho_perf.py              - Do do tre thao tac (bang hieu nang Ctrl+Shift+P)
+✓ kiem_kho_engine.py            - Engine kiem ke khong giao dien (dung chung)
+✓ kiem_kho_cache.py             - Module cache du lieu dau vao (dung chung)
+✓ kiem_kho_treeview.py          - Module bang virtual list (dung chung)
+✓ kiem_kho_io.py                - Module ghi file chay nen (dung chung)
+✓ kiem_kho_journal.py           - Module journal backup (dung chung)
 ✓ DuLieuDauVaoShowroom.xlsx     - File du lieu Excel Showroom (BAT BUOC)
 ✓ Kiemke_template.xlsx          - File template Excel (de copy khi save)
 ✓ requirements.txt              - Danh sach thu vien can thiet
 ✓ BUILD_EXE_SHOWROOM_SIMPLE.bat - De build file .exe (khuyen nghi)
+✓ BUILD_EXE_LITE.bat            - Build .exe khong pandas (them tham so: showroom)
 ✓ CHAY_TREN_WINDOWS_SHOWROOM_SIMPLE.bat - De chay truc tiep (khuyen nghi)
 
 
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark Kiểm Kho / Kiểm Kho Showroom với dữ liệu đầu vào giả lập (1k / 10k / 100k / 1M dòng)
+
+Sinh file DuLieuDauVao.xlsx (và DuLieuDauVaoShowroom.xlsx) giả lập, sau đó đo thời gian và bộ nhớ
+đỉnh (tracemalloc) của từng bước: đọc dữ liệu, load thùng, quét ISBN, lưu vào Tổng hợp, vẽ bảng
+Tổng hợp, lưu/khôi phục backup, xuất Excel và cộng dồn Showroom. Kết quả có thể lưu làm baseline
+và so sánh ở lần chạy sau để phát hiện chậm đi trước đợt kiểm kê.
+
+Chỉ đo dữ liệu đầu vào .xlsx (openpyxl): pandas >= 2 không ghi được .xls (xlwt đã ngừng hỗ trợ và không
+có trong requirements.txt) nên không sinh được file giả lập .xls - đường đọc .xls (xlrd) không được đo.
+
+Ví dụ:
+    python benchmark_kiem_kho.py --sizes 1000,10000 --save-baseline
+    python benchmark_kiem_kho.py --sizes 1000,10000            # so sánh với baseline
+    python benchmark_kiem_kho.py --sizes 1000000 --scan-boxes 200
+    KIEM_KHO_ENGINE=lite python benchmark_kiem_kho.py --sizes 10000   # engine không cần pandas
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from pathlib import Path
+
+import pandas as pd
+
+from kiem_kho_engine import InventorySession, read_input_file, load_data_engine
+from kiem_kho_cache import load_cached_dataframe, save_cached_dataframe
+from kiem_kho_journal import BackupJournal, replay_journal
+
+BASELINE_FILE = Path(__file__).resolve().with_name("benchmark_baseline.json")
+
+# Chậm hơn baseline quá tỉ lệ này (và quá MIN_REGRESSION_SECONDS) thì coi là chậm đi
+DEFAULT_TOLERANCE = 1.3
+MIN_REGRESSION_SECONDS = 0.005
+
+_TITLE_WORDS = ('Sách', 'Truyện', 'Tuyển tập', 'Cẩm nang', 'Panda', 'milk tea', 'Flower', 'Gift Box',
+                'Jewelry', 'Taiyaki', 'Scooter', 'Takoyaki', 'Lịch sử', 'Việt Nam', 'Thế giới', 'Tập')
+
+
+# ---- Sinh dữ liệu giả lập ----
+
+def _isbn13(rng, prefix):
+    digits = prefix + ''.join(str(rng.randrange(10)) for _ in range(12 - len(prefix)))
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+
+def make_isbn(rng, isbn_format):
+    """ISBN giả lập: isbn13 (978/979), ean (693...), short (9 chữ số, có số 0 đầu) hoặc mixed"""
+    if isbn_format == 'mixed':
+        isbn_format = rng.choice(('isbn13', 'isbn13', 'ean', 'short'))
+    if isbn_format == 'isbn13':
+        return _isbn13(rng, rng.choice(('978', '979')))
+    if isbn_format == 'ean':
+        return _isbn13(rng, '693')
+    return '0' + ''.join(str(rng.randrange(10)) for _ in range(8))
+
+
+def make_title(rng, title_length):
+    words = []
+    while len(' '.join(words)) < title_length:
+        words.append(rng.choice(_TITLE_WORDS))
+    return ' '.join(words)[:title_length]
+
+
+def generate_input(path, rows, titles_per_box=6, isbn_format='mixed', title_length=30, showroom=False, seed=0):
+    """Ghi file dữ liệu đầu vào giả lập, trả về DataFrame đã ghi
+
+    Cột giống file thật: Tmp, Số thùng, isbn, tựa, Tồn từng tựa (Showroom: isbn, tựa, Tồn từng tựa).
+    """
+    rng = random.Random(seed)
+    isbns = set()
+    while len(isbns) < rows:
+        isbns.add(make_isbn(rng, isbn_format))
+    isbns = list(isbns)
+    rng.shuffle(isbns)
+
+    data = {}
+    if not showroom:
+        data['Tmp'] = [f"EKD1-T{rng.randrange(10**14):014d}" for _ in range(rows)]
+        data['Số thùng'] = [f"{i // titles_per_box // 1000:03d}-on {i // titles_per_box % 1000}" for i in range(rows)]
+    data['isbn '] = isbns  # File thật có khoảng trắng thừa trong tên cột
+    data['tựa'] = [make_title(rng, title_length) for _ in range(rows)]
+    data['Tồn từng tựa'] = [rng.randint(1, 30) for _ in range(rows)]
+    df = pd.DataFrame(data)
+
+    suffix = Path(path).suffix.lower()
+    if suffix == '.xls':
+        # pandas >= 2 không còn ghi được .xls (xlwt đã ngừng hỗ trợ)
+        raise ValueError("Không ghi được file .xls - dùng .xlsx")
+    df.to_excel(path, index=False, engine='openpyxl')
+    return df
+
+
+# ---- Đo thời gian và bộ nhớ ----
+
+class Recorder:
+    """Ghi thời gian (giây) và bộ nhớ đỉnh (MB, tracemalloc) của từng bước trong một kịch bản"""
+
+    def __init__(self, trace_memory=True):
+        self.results = {}
+        self.trace_memory = trace_memory
+
+    def measure(self, name, func, *args, **kwargs):
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+        self.results[name] = {'seconds': elapsed}
+        if self.trace_memory:
+            self.results[name]['peak_mb'] = peak / (1024 * 1024)
+        return result
+
+    def skip(self, name, reason):
+        self.results[name] = {'skipped': reason}
+
+
+def _scan_box(session, box_data, miss_rate, rng):
+    """Quét tất cả ISBN trong thùng (kèm một tỉ lệ ISBN không có trong thùng), nhập Tồn thực tế"""
+    count = 0
+    for isbn in box_data['isbn'].tolist():
+        result = session.scan_isbn(isbn)
+        if result.item is not None:
+            session.set_counted_quantity(result.isbn, str(rng.randint(1, 30)))
+        count += 1
+        if rng.random() < miss_rate:
+            missing = make_isbn(rng, 'short')
+            result = session.scan_isbn(missing)
+            if result.item is not None:
+                session.set_counted_quantity(result.isbn, '1')
+            count += 1
+    return count
+
+
+def _run_stock_take(session, boxes, miss_rate, seed):
+    """Kiểm kê lần lượt các thùng: load thùng, quét, lưu vào Tổng hợp - trả về thời gian từng phần"""
+    rng = random.Random(seed)
+    timings = {'load_box_data': 0.0, 'scan': 0.0, 'save_data': 0.0}
+    scans = 0
+    for so_thung in boxes:
+        start = time.perf_counter()
+        box_data = session.get_box_data(so_thung) if not session.showroom else None
+        session.open_box(so_thung, box_data)
+        timings['load_box_data'] += time.perf_counter() - start
+
+        if session.showroom:
+            positions = rng.sample(range(len(session.df)), min(6, len(session.df)))
+            box_data = session.df.iloc[positions]
+        start = time.perf_counter()
+        scans += _scan_box(session, box_data, miss_rate, rng)
+        timings['scan'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        session.commit_box(nhap_xuat='N', ngay=time.strftime('%d/%m/%y'), note_thung='benchmark')
+        timings['save_data'] += time.perf_counter() - start
+    return timings, scans
+
+
+def _save_backup(app_class, session, backup_file):
+    """Ghi snapshot backup bằng đúng code của ứng dụng (_take_backup_snapshot + _write_backup_snapshot)"""
+    app = types.SimpleNamespace(
+        scanned_items=session.scanned_items,
+        tong_hop_data=session.tong_hop_data,
+        current_box_number=session.current_box_number,
+        _backup_journal=BackupJournal(backup_file),
+        get_backup_file_path=lambda: backup_file,
+    )
+    backup_data = app_class._take_backup_snapshot(app)
+    app._backup_journal.begin(backup_data['journal_id'])
+    app_class._write_backup_snapshot(app, backup_data)
+    return app._backup_journal
+
+
+def _restore_backup(backup_file, showroom):
+    """Phần dữ liệu của check_and_restore_backup: đọc snapshot, phát lại journal, xây lại chỉ mục"""
+    with open(backup_file, 'r', encoding='utf-8') as f:
+        backup_data = json.load(f)
+    entries = BackupJournal(backup_file).read_entries(backup_data.get('journal_id'))
+    scanned_items, tong_hop_data, current_box_number = replay_journal(
+        entries, backup_data.get('scanned_items', {}), backup_data.get('tong_hop_data', []),
+        backup_data.get('current_box_number'))
+    session = InventorySession(showroom=showroom)
+    session.scanned_items = scanned_items
+    session.current_box_number = current_box_number
+    session.set_tong_hop_data(tong_hop_data)
+    return session
+
+
+def _update_tong_hop_table(tk_root, app_class, rows):
+    """Vẽ bảng Tổng hợp (virtual list) như update_tong_hop_table"""
+    from tkinter import ttk
+    from kiem_kho_treeview import VirtualTreeview
+    from kiem_kho_index import ROW_ID_KEY
+
+    frame = ttk.Frame(tk_root)
+    tree = ttk.Treeview(frame, columns=[str(i) for i in range(11)], show='headings', height=25)
+    scrollbar = ttk.Scrollbar(frame, orient='vertical')
+    view = VirtualTreeview(tree, scrollbar, lambda data: app_class._tong_hop_row_values(None, data),
+                           iid_func=lambda data, index: data[ROW_ID_KEY])
+    view.set_rows(rows)
+    view.yview('moveto', 0.5)
+    tk_root.update_idletasks()
+    frame.destroy()
+
+
+def run_scenario(rows, work_dir, args, tk_root):
+    """Chạy một kịch bản kích thước, trả về {tên bước: kết quả}"""
+    import kiem_kho_app
+
+    recorder = Recorder(trace_memory=not args.no_memory)
+    input_path = work_dir / f"DuLieuDauVao_{rows}.xlsx"
+    print(f"\n[{rows:,} dòng] Sinh dữ liệu giả lập...")
+    generate_input(input_path, rows, titles_per_box=args.titles_per_box, isbn_format=args.isbn_format,
+                   title_length=args.title_length, seed=args.seed)
+
+    # Đọc dữ liệu đầu vào (load_data lần đầu) và từ cache (các lần mở sau)
+    session = InventorySession()
+    df = recorder.measure('load_data', read_input_file, session.pd, input_path)
+    recorder.measure('load_data_index', session.load_dataframe, df)
+    cache_path = work_dir / f"input_cache_{rows}.pkl"
+    save_cached_dataframe(cache_path, [input_path], input_path, df)
+    recorder.measure('load_data_cached', lambda: load_cached_dataframe(cache_path, [input_path]))
+
+    # Kiểm kê một số thùng (load thùng, quét từng ISBN, lưu vào Tổng hợp)
+    boxes = sorted(session.get_all_box_numbers())
+    rng = random.Random(args.seed)
+    if args.scan_boxes and len(boxes) > args.scan_boxes:
+        boxes = rng.sample(boxes, args.scan_boxes)
+    timings, scans = recorder.measure('stock_take', _run_stock_take, session, boxes, args.miss_rate, args.seed)
+    recorder.results['load_box_data'] = {'seconds': timings['load_box_data'] / max(1, len(boxes)), 'per': 'box'}
+    recorder.results['scan'] = {'seconds': timings['scan'] / max(1, scans), 'per': 'scan'}
+    recorder.results['save_data'] = {'seconds': timings['save_data'] / max(1, len(boxes)), 'per': 'box'}
+    print(f"  Đã kiểm {len(boxes):,} thùng, {scans:,} lần quét, Tổng hợp {len(session.tong_hop_data):,} dòng")
+
+    if tk_root is not None:
+        recorder.measure('update_tong_hop_table', _update_tong_hop_table, tk_root,
+                         kiem_kho_app.KiemKhoApp, session.tong_hop_data)
+    else:
+        recorder.skip('update_tong_hop_table', 'không có màn hình (Tk)')
+
+    backup_file = work_dir / f"kiem_kho_backup_{rows}.json"
+    recorder.measure('save_backup', _save_backup, kiem_kho_app.KiemKhoApp, session, backup_file)
+    recorder.measure('check_and_restore_backup', _restore_backup, backup_file, False)
+
+    export_path = work_dir / f"Kiemkecuoinam_{rows}.xlsx"
+    recorder.measure('export_tong_hop_excel', session.export, export_path)
+
+    # Showroom: dữ liệu không có số thùng, quét lặp lại để cộng dồn theo (ISBN, Số thùng)
+    showroom_path = work_dir / f"DuLieuDauVaoShowroom_{rows}.xlsx"
+    generate_input(showroom_path, rows, isbn_format=args.isbn_format, title_length=args.title_length,
+                   showroom=True, seed=args.seed + 1)
+    showroom = InventorySession(showroom=True)
+    showroom.load_input(showroom_path)
+    showroom_boxes = [f"SR{i % 20}" for i in range(max(1, len(boxes)))]
+    _run_stock_take(showroom, showroom_boxes, args.miss_rate, args.seed)
+    recorder.measure('showroom_aggregate_tong_hop_data', showroom.export_rows)
+    recorder.measure('showroom_aggregate_rebuild', showroom.tong_hop_aggregate.rebuild, showroom.tong_hop_data)
+
+    for path in (input_path, cache_path, backup_file, backup_file.with_suffix('.journal'), export_path, showroom_path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return recorder.results
+
+
+# ---- Baseline ----
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Danh sách các bước chậm hơn baseline: [(kịch bản, bước, giây baseline, giây hiện tại)]"""
+    regressions = []
+    for size, steps in results.items():
+        for name, result in steps.items():
+            base = baseline.get(size, {}).get(name)
+            if not base or 'seconds' not in base or 'seconds' not in result:
+                continue
+            if (result['seconds'] > base['seconds'] * tolerance and
+                    result['seconds'] - base['seconds'] > MIN_REGRESSION_SECONDS):
+                regressions.append((size, name, base['seconds'], result['seconds']))
+    return regressions
+
+
+def print_results(results, baseline):
+    for size, steps in results.items():
+        print(f"\n=== {int(size):,} dòng ===")
+        print(f"{'Bước':36} {'Thời gian':>12} {'Bộ nhớ đỉnh':>12} {'Baseline':>12}")
+        for name, result in steps.items():
+            if 'skipped' in result:
+                print(f"{name:36} {'bỏ qua':>12}   ({result['skipped']})")
+                continue
+            per = f"/{result['per']}" if 'per' in result else ''
+            seconds = result['seconds']
+            time_text = f"{seconds * 1000:.3f}ms" if seconds < 1 else f"{seconds:.2f}s"
+            peak = f"{result['peak_mb']:.1f}MB" if 'peak_mb' in result else ''
+            base = baseline.get(size, {}).get(name, {})
+            base_text = f"{base['seconds'] / seconds:.2f}x" if base.get('seconds') and seconds else ''
+            print(f"{name:36} {time_text + per:>12} {peak:>12} {base_text:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Kiểm Kho với dữ liệu giả lập")
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help="Số dòng dữ liệu đầu vào, cách nhau bởi dấu phẩy (ví dụ 1000,10000,100000,1000000)")
+    parser.add_argument('--titles-per-box', type=int, default=6, help="Số tựa trong mỗi thùng")
+    parser.add_argument('--isbn-format', default='mixed', choices=('mixed', 'isbn13', 'ean', 'short'))
+    parser.add_argument('--title-length', type=int, default=30, help="Độ dài tên tựa (ký tự)")
+    parser.add_argument('--scan-boxes', type=int, default=500,
+                        help="Số thùng được kiểm kê trong mỗi kịch bản (0 = tất cả)")
+    parser.add_argument('--miss-rate', type=float, default=0.05, help="Tỉ lệ quét ISBN không có trong thùng")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true',
+                        help="Không đo bộ nhớ đỉnh (tracemalloc làm chậm các bước nhiều lần gọi hàm)")
+    parser.add_argument('--baseline', default=str(BASELINE_FILE), help="File baseline JSON")
+    parser.add_argument('--save-baseline', action='store_true', help="Lưu kết quả lần chạy này làm baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Tỉ lệ chậm hơn baseline được chấp nhận")
+    parser.add_argument('--output', help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    engine_name = load_data_engine().__name__
+    print(f"[INFO] Engine dữ liệu: {engine_name}")
+
+    tk_root = None
+    try:
+        import tkinter as tk
+        tk_root = tk.Tk()
+        tk_root.withdraw()
+    except Exception as e:
+        print(f"[INFO] Bỏ qua đo bảng Tổng hợp (không mở được Tk): {str(e)}")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='kiem_kho_bench_') as work_dir:
+        for rows in sizes:
+            results[str(rows)] = run_scenario(rows, Path(work_dir), args, tk_root)
+
+    if tk_root is not None:
+        tk_root.destroy()
+
+    baseline_path = Path(args.baseline)
+    baseline = {}
+    if baseline_path.exists():
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline_file = json.load(f)
+        if baseline_file.get('trace_memory', True) != (not args.no_memory):
+            # tracemalloc làm chậm nhiều bước - chỉ so sánh các lần chạy cùng chế độ
+            print("[INFO] Baseline được đo ở chế độ đo bộ nhớ khác (--no-memory), bỏ qua so sánh")
+        elif baseline_file.get('engine', 'pandas') != engine_name:
+            print(f"[INFO] Baseline được đo với engine {baseline_file.get('engine', 'pandas')}, bỏ qua so sánh")
+        else:
+            baseline = baseline_file.get('results', {})
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'results': results}, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        merged = dict(baseline)
+        merged.update(results)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'pandas': pd.__version__,
+                       'engine': engine_name, 'trace_memory': not args.no_memory, 'results': merged},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n[OK] Đã lưu baseline: {baseline_path}")
+        return 0
+
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print("\n[CẢNH BÁO] Chậm hơn baseline:")
+        for size, name, base_seconds, seconds in regressions:
+            print(f"  {int(size):,} dòng - {name}: {base_seconds * 1000:.3f}ms -> {seconds * 1000:.3f}ms")
+        return 1
+    if baseline:
+        print("\n[OK] Không có bước nào chậm hơn baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
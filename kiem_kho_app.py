@@ -13,14 +13,44 @@ import os
 from pathlib import Path
 import sys
 import json
-import shutil
 import time
 import traceback
 import base64
 import signal
 import atexit
+from kiem_kho_index import ROW_ID_KEY
+from kiem_kho_journal import (BackupJournal, new_journal_id, replay_journal,
+                              OP_ADD_ROWS, OP_UPDATE_ROW, OP_DELETE_ROWS, OP_SCAN_STATE)
+from kiem_kho_io import IoWorker
+from kiem_kho_loader import InputLoader
+from kiem_kho_treeview import VirtualTreeview
+from kiem_kho_perf import PERF, PerfPanel, PERF_PANEL_HOTKEYS, timed
+from kiem_kho_watchdog import StallWatchdog, stall_log_path, threshold_from_env
+from kiem_kho_export import consolidate_export, copy_with_properties, export_incremental
+from kiem_kho_cache import input_cache_name
+from kiem_kho_isbn import isbn_key, record_isbn_key
+from kiem_kho_scan import ScanQueue
+from kiem_kho_import import format_import_summary, read_scan_dump
+from kiem_kho_notify import (NotificationStrip, show_notification, NOTIFY_INFO, NOTIFY_SUCCESS, NOTIFY_WARNING,
+                             NOTIFY_ERROR)
+from kiem_kho_engine import (InventorySession, session_attribute,
+                             format_ton_trong_thung, SCAN_NO_DATA, SCAN_NO_ISBN_COLUMN, SCAN_ALREADY_SAVED,
+                             SCAN_BOX_CONFLICT, SCAN_BAD_CHECKSUM, SCAN_INCREMENTED, STATUS_MISMATCH, STATUS_MATCH,
+                             STATUS_NEW_TITLE)
 
 class KiemKhoApp:
+    # Trạng thái phiên kiểm kê nằm trong self.session (InventorySession) - giữ tên thuộc tính cũ cho code giao diện
+    pd = session_attribute('pd')
+    df = session_attribute('df')
+    current_box_data = session_attribute('current_box_data')
+    current_box_number = session_attribute('current_box_number')
+    box_partition = session_attribute('box_partition')
+    isbn_indexes = session_attribute('isbn_indexes')
+    scanned_items = session_attribute('scanned_items')
+    tong_hop_data = session_attribute('tong_hop_data')
+    tong_hop_index = session_attribute('tong_hop_index')
+    tong_hop_rows = session_attribute('tong_hop_rows')
+
     def __init__(self, root):
         self.root = root
         self.root.title("Kiểm Kho - Quét Mã Vạch")
@@ -31,20 +61,11 @@ class KiemKhoApp:
         # Màu nền nhẹ nhàng hơn
         self.root.configure(bg='#F5F5F5')
         
-        # Import pandas ngay sau khi UI được tạo (để có thể dùng trong toàn bộ class)
-        # Import sớm hơn một chút để tránh lỗi "name 'pd' is not defined"
-        try:
-            import pandas as pd
-            self.pd = pd  # Lưu vào instance để dùng trong các method khác
-        except ImportError:
-            self.pd = None
-            # Sẽ báo lỗi khi load_data được gọi
+        # Phiên kiểm kê không phụ thuộc giao diện: dữ liệu đầu vào, thùng đang kiểm, ISBN đã quét, Tổng hợp
+        # (pandas được import trong session - self.pd là None nếu chưa cài, sẽ báo lỗi khi load_data được gọi)
+        self.session = InventorySession()
         
         # Biến lưu trữ dữ liệu
-        self.df = None
-        self.current_box_data = None
-        self.current_box_number = None
-        self.scanned_items = {}  # Lưu các item đã quét: {isbn: {tua, ton_thuc_te, so_thung, ton_trong_thung, ghi_chu}}
         self.edit_entry = None  # Entry widget để chỉnh sửa trực tiếp
         self.editing_item = None  # Item đang được chỉnh sửa
         self.error_highlights = {}  # Lưu các highlight widgets: {item_id: [entry1, entry2]}
@@ -53,9 +74,11 @@ class KiemKhoApp:
         self.auto_save_folder = None  # Thư mục tự động lưu file Excel 2 (Kiemkecuoinam)
         self.config_folder = None  # Thư mục lưu file config (do người dùng chọn)
         self.config_file = self.get_config_file_path()  # Đường dẫn file config
-        self.tong_hop_data = []  # Lưu tổng hợp các data đã kiểm kê
         self.notebook = None  # Notebook widget để chứa các tab
+        self.notifier = None  # Dải thông báo không chặn quét (NotificationStrip), tạo trong create_ui
+        self.scan_queue = None  # Hàng đợi mã quét (ScanQueue), tạo cùng ô quét ISBN trong create_ui
         self.tong_hop_tree = None  # Treeview trong tab Tổng hợp
+        self.tong_hop_view = None  # Virtual list điều khiển tong_hop_tree (chỉ render dòng đang nhìn thấy)
         self.so_tua_da_quet_var = None  # Biến để hiển thị số tựa đã quét
         self.tong_hop_edit_entry = None  # Entry widget để chỉnh sửa trong tab Tổng hợp
         self.tong_hop_editing_item = None  # Item đang được chỉnh sửa trong tab Tổng hợp
@@ -69,6 +92,13 @@ class KiemKhoApp:
         except Exception:
             # Fallback: sử dụng thư mục hiện tại
             self._backup_file_path = Path.cwd() / "kiem_kho_backup.json"
+        # Journal backup (append-only) đi kèm file backup - chỉ ghi phần thay đổi thay vì ghi lại toàn bộ
+        self._backup_journal = BackupJournal(self._backup_file_path)
+        # Thread ghi nền: backup và xuất Excel không chạy trên mainloop Tk (quét mã vạch không bị khựng)
+        self.backup_worker = IoWorker(self.root, name='backup-writer')
+        self.export_worker = IoWorker(self.root, name='export-writer', maxsize=4)
+        # File Kiemkecuoinam đã xuất tăng dần trong phiên - gộp các file phần khi đóng phần mềm
+        self.exported_files = set()
         
         # Load cấu hình từ file (nếu có)
         saved_config = self.load_config()
@@ -141,6 +171,12 @@ class KiemKhoApp:
         # Bind Enter key để hỗ trợ quét mã vạch
         self.root.bind('<Return>', self.on_enter_pressed)
         
+        # Phím tắt ẩn mở bảng hiệu năng (độ trễ quét, backup, bảng Tổng hợp, xuất Excel)
+        PERF.context_func = lambda: (len(self.tong_hop_data), len(self.scanned_items))
+        self.perf_panel = PerfPanel(self.root, csv_dir=str(self.get_backup_file_path().parent))
+        for hotkey in PERF_PANEL_HOTKEYS:
+            self.root.bind(hotkey, self.perf_panel.toggle)
+        
         # Bind sự kiện đóng cửa sổ để kiểm tra dữ liệu chưa lưu
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         
@@ -156,6 +192,11 @@ class KiemKhoApp:
         
         # Đăng ký xử lý signal để lưu backup khi shutdown (cúp điện, tắt máy)
         self.setup_signal_handlers()
+        
+        # Watchdog: ghi stack main thread vào log cạnh file backup khi giao diện bị đứng
+        self.stall_watchdog = StallWatchdog(self.root, stall_log_path(self.get_backup_file_path()),
+                                            threshold_from_env())
+        self.stall_watchdog.start()
     
     def get_config_location_file(self):
         """Lấy đường dẫn file pointer trỏ đến vị trí config thực sự"""
@@ -934,17 +975,6 @@ class KiemKhoApp:
     
     def load_data(self):
         """Load dữ liệu từ file Excel"""
-        # Sử dụng pandas đã được import trong __init__
-        if self.pd is None:
-            try:
-                import pandas as pd
-                self.pd = pd
-            except ImportError:
-                messagebox.showerror("Lỗi", "Không thể import pandas! Vui lòng cài đặt: pip install pandas")
-                sys.exit(1)
-        
-        pd = self.pd  # Alias để dùng trong hàm này
-        
         try:
             # Kiểm tra nếu đang chạy từ executable (PyInstaller)
             if getattr(sys, 'frozen', False):
@@ -991,263 +1021,130 @@ class KiemKhoApp:
                     Path(__file__).parent / "DuLieuDauVao.xls",
                 ]
             
-            # Kiểm tra file .xlsx có hợp lệ không
-            if excel_path.exists() and excel_path.suffix.lower() == '.xlsx':
-                try:
-                    import openpyxl
-                    wb = openpyxl.load_workbook(excel_path, read_only=True)
-                    if len(wb.sheetnames) == 0:
-                        # File .xlsx không có worksheet, tìm file .xls thay thế
-                        wb.close()
-                        for alt_path in xls_alternatives:
-                            if alt_path.exists():
-                                excel_path = alt_path
-                                break
-                        else:
-                            raise ValueError("File Excel không có worksheet nào và không tìm thấy file thay thế!")
-                    else:
-                        wb.close()
-                except Exception as e:
-                    # Nếu file .xlsx lỗi, thử tìm file .xls thay thế
-                    for alt_path in xls_alternatives:
-                        if alt_path.exists():
-                            excel_path = alt_path
-                            break
-            
-            # Nếu vẫn không tìm thấy file hợp lệ
-            if not excel_path.exists():
-                # Thử tìm file .xls
-                for alt_path in xls_alternatives:
-                    if alt_path.exists():
-                        excel_path = alt_path
-                        break
-                
-                # Nếu vẫn không có, cho phép người dùng chọn file
-                if not excel_path.exists():
-                    excel_path = filedialog.askopenfilename(
-                        title="Chọn file dữ liệu Excel",
-                        filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")]
-                    )
-                    if not excel_path:
-                        messagebox.showerror("Lỗi", "Không tìm thấy file dữ liệu!")
-                        sys.exit(1)
-                    excel_path = Path(excel_path)
-            
-            # Đọc file Excel (hỗ trợ cả .xls và .xlsx)
-            # Ưu tiên thử đọc với header=0 (dòng 1) trước
-            header_row = None
+            # Đọc trên thread nền: dùng cache nếu file đầu vào không đổi kể từ lần đọc trước,
+            # nếu không thì đọc dần file Excel - các thùng đã đọc xong có thể load và quét ngay
+            cache_candidates = [excel_path] + xls_alternatives
+            excel_path = self._resolve_input_path(excel_path, xls_alternatives)
+            self._start_input_loader(excel_path, xls_alternatives, self._get_input_cache_path(), cache_candidates)
             
-            if excel_path.suffix.lower() == '.xls':
-                # Thử đọc với header=0 trước (dòng 1 trong Excel)
-                try:
-                    temp_df = pd.read_excel(excel_path, engine='xlrd', header=0, nrows=2)
-                    temp_df.columns = temp_df.columns.str.strip()
-                    # Kiểm tra xem có đủ cột cần thiết không
-                    cols_lower = [str(c).lower() if pd.notna(c) else '' for c in temp_df.columns]
-                    cols_str = ' '.join(cols_lower)
-                    keywords_found = sum([
-                        'isbn' in cols_str,
-                        'số thùng' in cols_str or 'so thung' in cols_str or 'thùng' in cols_str,
-                        'tựa' in cols_str or 'tua' in cols_str or 'titles' in cols_str,
-                        'tồn' in cols_str or 'ton' in cols_str or 'qty' in cols_str
-                    ])
-                    if keywords_found >= 3:  # Nếu tìm thấy ít nhất 3 từ khóa, dùng header=0
-                        header_row = 0
-                except:
-                    pass
-                
-                # Nếu header=0 không hợp lệ, tìm header tự động
-                if header_row is None:
-                    try:
-                        temp_df = pd.read_excel(excel_path, engine='xlrd', header=None, nrows=30)
-                        for idx, row in temp_df.iterrows():
-                            row_values = [str(cell).lower() if pd.notna(cell) else '' for cell in row.values]
-                            row_str = ' '.join(row_values)
-                            if 'isbn' in row_str:
-                                keywords_found = sum([
-                                    'isbn' in row_str,
-                                    'số thùng' in row_str or 'so thung' in row_str or 'thùng' in row_str,
-                                    'tựa' in row_str or 'tua' in row_str or 'titles' in row_str,
-                                    'tồn' in row_str or 'ton' in row_str or 'qty' in row_str
-                                ])
-                                if keywords_found >= 2:
-                                    header_row = idx
-                                    break
-                    except:
-                        pass
-                
-                # Đọc file với header row đã tìm được
-                try:
-                    if header_row is not None:
-                        self.df = pd.read_excel(excel_path, engine='xlrd', header=header_row)
-                    else:
-                        # Mặc định dùng header=0
-                        self.df = pd.read_excel(excel_path, engine='xlrd', header=0)
-                except Exception as e2:
-                    raise ValueError(f"Không thể đọc file .xls: {str(e2)}")
+        except Exception as e:
+            self._on_input_load_error(e)
+    
+    def _start_input_loader(self, excel_path, xls_alternatives=(), cache_path=None, cache_candidates=()):
+        """Bắt đầu đọc dữ liệu đầu vào trên thread nền (InputLoader)"""
+        if getattr(self, 'input_loader', None) is not None:
+            self.input_loader.cancel()
+        self._set_load_status("Đang mở file dữ liệu đầu vào...")
+        self.input_loader = InputLoader(
+            self.root, self.pd, excel_path, xls_alternatives, showroom=False,
+            cache_path=cache_path, cache_candidates=cache_candidates,
+            on_header=self.session.begin_partial_input,
+            on_progress=self._on_input_progress,
+            on_done=self._on_input_loaded,
+            on_error=self._on_input_load_error)
+        self.input_loader.start()
+    
+    def notify(self, level, message, title=None):
+        """Thông báo không chặn luồng quét (dải thông báo cuối cửa sổ, tự ẩn)"""
+        show_notification(getattr(self, 'notifier', None), level, message, title)
+    
+    def _set_load_status(self, text):
+        """Hiển thị tiến độ đọc dữ liệu đầu vào (rỗng khi đã đọc xong)"""
+        if hasattr(self, 'load_status_var') and self.load_status_var:
+            self.load_status_var.set(text)
+    
+    def _on_input_progress(self, boxes, reopened, rows_loaded, total_rows):
+        """Nhận các thùng vừa đọc xong từ thread nền"""
+        current_changed = self.session.update_partial_input(boxes, reopened, rows_loaded, total_rows)
+        if current_changed and hasattr(self, 'so_tua_var'):
+            # Thùng đang kiểm có thêm dòng (file không sắp xếp theo thùng)
+            self.so_tua_var.set(str(len(self.current_box_data)))
+        total_text = f"/{total_rows:,}" if total_rows else ""
+        self._set_load_status(f"Đang đọc dữ liệu: {rows_loaded:,}{total_text} dòng - {len(self.session.get_all_box_numbers()):,} thùng đã sẵn sàng")
+    
+    def _on_input_loaded(self, result):
+        """Đọc xong dữ liệu đầu vào: dùng DataFrame và chỉ mục đã xây trên thread nền"""
+        self.input_loader = None
+        self.session.adopt_input(result.session)
+        self._set_load_status("")
+        if result.from_cache:
+            print(f"[OK] Đọc dữ liệu đầu vào từ cache: {result.source_path}")
+        else:
+            print(f"[OK] Đã đọc {len(self.df):,} dòng dữ liệu đầu vào: {result.source_path}")
+        if self.current_box_data is not None and hasattr(self, 'so_tua_var'):
+            self.so_tua_var.set(str(len(self.current_box_data)))
+        
+        # Kiểm tra xem có đủ cột không
+        col_mapping = self.session.col_mapping
+        if len(col_mapping) < 4:
+            self.notify(NOTIFY_WARNING, 
+                f"Không tìm thấy đủ các cột cần thiết. Tìm thấy: {list(col_mapping.keys())}\n"
+                f"Các cột trong file: {list(self.df.columns)}")
+    
+    def _on_input_load_error(self, e):
+        """Không đọc được dữ liệu đầu vào: cho phép chọn file khác"""
+        self.input_loader = None
+        self.session.partial_input = None
+        self._set_load_status("")
+        error_msg = f"Không thể đọc file Excel: {str(e)}\n\n"
+        error_msg += "Vui lòng kiểm tra:\n"
+        error_msg += "1. File Excel có đúng định dạng không (.xlsx hoặc .xls)\n"
+        error_msg += "2. File có chứa dữ liệu không\n"
+        error_msg += "3. File không bị hỏng\n\n"
+        error_msg += "Bạn có muốn chọn file khác không?"
+        
+        result = messagebox.askyesno("Lỗi", error_msg)
+        if result:
+            # Cho phép chọn file khác
+            excel_path = filedialog.askopenfilename(
+                title="Chọn file dữ liệu Excel",
+                filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")]
+            )
+            if excel_path:
+                # Thử đọc lại với file mới (lỗi sẽ hỏi lại để chọn file khác)
+                self._start_input_loader(Path(excel_path))
             else:
-                # File .xlsx - thử đọc với header=0 trước
-                try:
-                    self.df = pd.read_excel(excel_path, engine='openpyxl', header=0)
-                except Exception as e2:
-                    raise ValueError(f"Không thể đọc file .xlsx: {str(e2)}")
-            
-            # Loại bỏ các dòng rỗng hoàn toàn
-            self.df = self.df.dropna(how='all')
-            
-            # Kiểm tra DataFrame có rỗng không (trước khi filter ISBN)
-            if self.df.empty:
-                raise ValueError("File Excel không có dữ liệu!")
-            
-            # Loại bỏ các dòng có ISBN rỗng hoặc không hợp lệ (chỉ khi đã có cột ISBN)
-            if 'isbn' in self.df.columns or 'ISBN' in self.df.columns:
-                isbn_col = 'isbn' if 'isbn' in self.df.columns else 'ISBN'
-                original_count = len(self.df)
-                
-                # Loại bỏ các dòng có ISBN rỗng
-                self.df = self.df[self.df[isbn_col].notna()]
-                
-                # Loại bỏ các dòng có ISBN là số thứ tự đơn giản (1, 2, 3...) hoặc số nhỏ hơn 4 chữ số
-                if len(self.df) > 0:
-                    # Chuyển ISBN sang string để kiểm tra
-                    isbn_str = self.df[isbn_col].astype(str)
-                    # Loại bỏ các ISBN chỉ là số đơn giản (1.0, 2.0, ...) hoặc có ít hơn 4 ký tự số
-                    mask = ~isbn_str.str.match(r'^\d+\.0?$')  # Không phải chỉ số đơn giản
-                    # Giữ lại các ISBN có độ dài hợp lý (ít nhất 4 ký tự sau khi loại bỏ .0)
-                    mask = mask & (isbn_str.str.replace('.0', '').str.len() >= 4)
-                    self.df = self.df[mask]
-                
-                # Kiểm tra lại sau khi filter
-                if self.df.empty:
-                    raise ValueError(f"File Excel không có dữ liệu hợp lệ! Đã loại bỏ {original_count} dòng không hợp lệ.")
-            
-            # Kiểm tra lại DataFrame có rỗng không (sau khi filter)
-            if self.df.empty:
-                raise ValueError("File Excel không có dữ liệu sau khi lọc!")
-            
-            # Xử lý DataFrame
-            self._process_dataframe()
+                messagebox.showerror("Lỗi", "Không có file nào được chọn!")
+                sys.exit(1)
+        else:
+            sys.exit(1)
+    
+    def _get_input_cache_path(self):
+        """Đường dẫn file cache dữ liệu đầu vào (cạnh file config)"""
+        cache_name = input_cache_name(self.pd)
+        if self.config_file:
+            return Path(self.config_file).with_name(cache_name)
+        return Path.cwd() / cache_name
+    
+    def _resolve_input_path(self, excel_path, xls_alternatives):
+        """File dữ liệu đầu vào cần đọc: DuLieuDauVao.xlsx, file thay thế, hoặc file do người dùng chọn
+
+        File .xlsx không đọc được/không có worksheet sẽ được thay bằng file thay thế khi đọc (InputLoader).
+        """
+        # Nếu không tìm thấy file
+        if not excel_path.exists():
+            # Thử tìm file .xls
+            for alt_path in xls_alternatives:
+                if alt_path.exists():
+                    excel_path = alt_path
+                    break
             
-        except Exception as e:
-            error_msg = f"Không thể đọc file Excel: {str(e)}\n\n"
-            error_msg += "Vui lòng kiểm tra:\n"
-            error_msg += "1. File Excel có đúng định dạng không (.xlsx hoặc .xls)\n"
-            error_msg += "2. File có chứa dữ liệu không\n"
-            error_msg += "3. File không bị hỏng\n\n"
-            error_msg += "Bạn có muốn chọn file khác không?"
-            
-            result = messagebox.askyesno("Lỗi", error_msg)
-            if result:
-                # Cho phép chọn file khác
+            # Nếu vẫn không có, cho phép người dùng chọn file
+            if not excel_path.exists():
                 excel_path = filedialog.askopenfilename(
                     title="Chọn file dữ liệu Excel",
                     filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")]
                 )
-                if excel_path:
-                    try:
-                        # Đảm bảo pandas đã được import
-                        if self.pd is None:
-                            import pandas as pd
-                            self.pd = pd
-                        pd = self.pd
-                        
-                        # Thử đọc lại với file mới
-                        if Path(excel_path).suffix.lower() == '.xls':
-                            self.df = pd.read_excel(excel_path, engine='xlrd')
-                        else:
-                            self.df = pd.read_excel(excel_path, engine='openpyxl')
-                        # Nếu thành công, tiếp tục xử lý
-                        self._process_dataframe()
-                        return
-                    except Exception as e2:
-                        messagebox.showerror("Lỗi", f"Vẫn không thể đọc file: {str(e2)}")
-                        sys.exit(1)
-                else:
-                    messagebox.showerror("Lỗi", "Không có file nào được chọn!")
+                if not excel_path:
+                    messagebox.showerror("Lỗi", "Không tìm thấy file dữ liệu!")
                     sys.exit(1)
-            else:
-                sys.exit(1)
+                excel_path = Path(excel_path)
+        return excel_path
     
     def load_data_deferred(self):
         """Load dữ liệu sau khi UI đã hiển thị (deferred loading để tăng tốc độ khởi động)"""
-        try:
-            # Cập nhật cursor để hiển thị đang load
-            self.root.config(cursor='wait')
-            self.root.update_idletasks()
-            
-            # Load dữ liệu
-            self.load_data()
-        finally:
-            # Khôi phục cursor
-            self.root.config(cursor='')
-    
-    def _process_dataframe(self):
-        """Xử lý DataFrame sau khi đọc thành công"""
-        # Đảm bảo pandas đã được import
-        if self.pd is None:
-            try:
-                import pandas as pd
-                self.pd = pd
-            except ImportError:
-                messagebox.showerror("Lỗi", "Không thể import pandas! Vui lòng cài đặt: pip install pandas")
-                return
-        
-        pd = self.pd  # Alias để dùng trong hàm này
-        
-        # Chuẩn hóa tên cột (loại bỏ khoảng trắng thừa, chuyển sang lowercase)
-        self.df.columns = self.df.columns.str.strip()
-        
-        # Tìm các cột cần thiết (case-insensitive)
-        col_mapping = {}
-        for col in self.df.columns:
-            if pd.isna(col):
-                continue
-            col_str = str(col).strip()
-            col_lower = col_str.lower()
-            
-            # Số thùng / Thùng
-            if ('số thùng' in col_lower or 'so thung' in col_lower or 
-                col_lower == 'thùng' or col_lower == 'thung'):
-                if 'so_thung' not in col_mapping:
-                    col_mapping['so_thung'] = col
-            
-            # ISBN
-            if 'isbn' in col_lower:
-                if 'isbn' not in col_mapping:
-                    col_mapping['isbn'] = col
-            
-            # Tựa/Tên sách / Titles
-            if ('tựa' in col_lower or 'tua' in col_lower or 'tên' in col_lower or 
-                'titles' in col_lower or 'title' in col_lower):
-                if 'tua' not in col_mapping:
-                    col_mapping['tua'] = col
-            
-            # Tồn từng tựa / Qty tựa trong thùng / Qty
-            # Ưu tiên các cột có tên đầy đủ trước
-            if 'qty tựa trong thùng' in col_lower or 'qty tua trong thung' in col_lower:
-                if 'ton_tung_tua' not in col_mapping:
-                    col_mapping['ton_tung_tua'] = col
-            elif (('tồn' in col_lower and 'tựa' in col_lower) or 
-                  ('ton' in col_lower and 'tua' in col_lower)):
-                if 'ton_tung_tua' not in col_mapping:
-                    col_mapping['ton_tung_tua'] = col
-            elif col_lower == 'qty' and 'ton_tung_tua' not in col_mapping:
-                # Chỉ dùng Qty nếu chưa tìm thấy cột nào khác
-                col_mapping['ton_tung_tua'] = col
-        
-        # Kiểm tra xem có đủ cột không
-        if len(col_mapping) < 4:
-            messagebox.showwarning("Cảnh báo", 
-                f"Không tìm thấy đủ các cột cần thiết. Tìm thấy: {list(col_mapping.keys())}\n"
-                f"Các cột trong file: {list(self.df.columns)}")
-        
-        # Đổi tên cột để dễ sử dụng
-        if col_mapping:
-            self.df = self.df.rename(columns=col_mapping)
-        
-        # Làm sạch dữ liệu
-        if 'isbn' in self.df.columns:
-            self.df['isbn'] = self.df['isbn'].astype(str).str.strip()
+        # Chỉ mở file và bắt đầu thread đọc - cửa sổ vẫn dùng được trong lúc đọc
+        self.load_data()
     
     def create_ui(self):
         """Tạo giao diện người dùng"""
@@ -1259,6 +1156,10 @@ class KiemKhoApp:
         label_required_fg = '#C62828'  # Đỏ đậm cho label bắt buộc
         button_bg = '#E3F2FD'  # Nền button xanh nhẹ
         
+        # Dải thông báo không chặn quét - ở cuối cửa sổ, nhìn thấy ở mọi tab
+        self.notifier = NotificationStrip(self.root, bg=bg_color)
+        self.notifier.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 6))
+        
         # Tạo Notebook để chứa các tab
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -1343,6 +1244,12 @@ class KiemKhoApp:
                             width=15, height=2, relief=tk.RAISED, bd=2, cursor='hand2')
         reset_btn.grid(row=3, column=3, rowspan=2, padx=20, pady=5, sticky='n')
         
+        # Nút IMPORT - nhập file mã quét của máy quét cầm tay (lưu thẳng vào Tổng hợp)
+        import_btn = tk.Button(info_frame, text="IMPORT FILE QUÉT", command=self.import_scan_file, 
+                            bg='#2196F3', fg='white', font=('Arial', 11, 'bold'), 
+                            width=18, height=2, relief=tk.RAISED, bd=2, cursor='hand2')
+        import_btn.grid(row=1, column=4, rowspan=2, padx=5, pady=5, sticky='n')
+        
         info_frame.columnconfigure(1, weight=1)
         
         # === PHẦN HIỂN THỊ SỐ TỰA ===
@@ -1358,6 +1265,10 @@ class KiemKhoApp:
         self.so_tua_da_quet_var = tk.StringVar(value="0")
         tk.Label(count_frame, textvariable=self.so_tua_da_quet_var, bg=bg_color, fg='#4CAF50', font=('Arial', 14, 'bold')).grid(row=0, column=3, padx=5, pady=5, sticky='w')
         
+        # Tiến độ đọc dữ liệu đầu vào trên thread nền (rỗng khi đã đọc xong)
+        self.load_status_var = tk.StringVar(value="")
+        tk.Label(count_frame, textvariable=self.load_status_var, bg=bg_color, fg='#757575', font=('Arial', 10, 'italic')).grid(row=0, column=4, padx=(20, 5), pady=5, sticky='w')
+        
         # === PHẦN NHẬP ISBN (QUÉT MÃ VẠCH) - Đặt ở dưới cùng với grid ===
         scan_frame = tk.Frame(main_frame, bg=bg_color)
         scan_frame.grid(row=3, column=0, sticky='ew', pady=(10, 0))
@@ -1369,7 +1280,10 @@ class KiemKhoApp:
                                    bg='#FFFFFF', fg='#000000', relief=tk.SOLID, bd=3, insertbackground='#000000')
         # Tăng chiều cao bằng cách thêm padding
         self.isbn_entry.grid(row=0, column=1, padx=5, pady=8, sticky='ew', ipady=8)
-        self.isbn_entry.bind('<Return>', self.on_isbn_entered)
+        # Enter chỉ đưa mã vào hàng đợi quét - mã được xử lý lần lượt khi giao diện rảnh
+        self.scan_queue = ScanQueue(self.root, self.isbn_entry, self.process_scan,
+                                    context=lambda: self.vi_tri_moi_var.get().strip())
+        self.scan_queue.bind()
         self.isbn_entry.focus()
         
         scan_frame.columnconfigure(1, weight=1)
@@ -1521,7 +1435,7 @@ class KiemKhoApp:
         
         # Tạo Treeview cho tổng hợp với tối ưu hiệu suất
         self.tong_hop_tree = ttk.Treeview(tonghop_table_frame, columns=tonghop_columns, show='headings', 
-                                          yscrollcommand=tonghop_scrollbar_y.set, xscrollcommand=tonghop_scrollbar_x.set,
+                                          xscrollcommand=tonghop_scrollbar_x.set,
                                           height=20, style='Treeview')
         
         # Tối ưu hiệu suất: tắt một số tính năng không cần thiết
@@ -1540,9 +1454,11 @@ class KiemKhoApp:
         # Tag để highlight dòng tìm thấy
         self.tong_hop_tree.tag_configure('search_highlight', background='#FFF9C4')  # Màu vàng nhạt
         
-        # Tối ưu scrollbar để scroll mượt hơn - không có delay
-        # Sử dụng trực tiếp method của treeview để giảm overhead
-        tonghop_scrollbar_y.config(command=self.tong_hop_tree.yview)
+        # Virtual list: Treeview chỉ chứa các dòng đang nhìn thấy, scrollbar dọc map theo vị trí trong dữ liệu
+        self.tong_hop_view = VirtualTreeview(self.tong_hop_tree, tonghop_scrollbar_y, self._tong_hop_row_values,
+                                             rows=self.tong_hop_data,
+                                             before_render=self._finish_tong_hop_edit_before_render,
+                                             iid_func=lambda data, index: data[ROW_ID_KEY])
         tonghop_scrollbar_x.config(command=self.tong_hop_tree.xview)
         
         self.tong_hop_tree.grid(row=0, column=0, sticky='nsew')
@@ -1559,27 +1475,8 @@ class KiemKhoApp:
         self.tong_hop_tree.bind('<Key-Delete>', self.on_tong_hop_delete)
     
     def get_all_box_numbers(self):
-        """Lấy danh sách tất cả mã thùng từ dữ liệu đầu vào"""
-        if self.df is None or self.df.empty:
-            return set()
-        
-        # Tìm cột số thùng
-        box_col = None
-        for col in self.df.columns:
-            col_lower = str(col).lower().strip()
-            if ('số thùng' in col_lower or 'so thung' in col_lower or 
-                col_lower == 'thùng' or col_lower == 'thung'):
-                box_col = col
-                break
-        
-        if box_col is None:
-            return set()
-        
-        # Lấy tất cả giá trị số thùng, loại bỏ NaN và chuyển thành string
-        box_numbers = self.df[box_col].dropna().astype(str).str.strip()
-        # Loại bỏ các giá trị rỗng
-        box_numbers = box_numbers[box_numbers != '']
-        return set(box_numbers.unique())
+        """Lấy danh sách tất cả mã thùng từ dữ liệu đầu vào (đọc từ phân vùng đã xây sẵn)"""
+        return self.session.get_all_box_numbers()
     
     def validate_vi_tri_moi(self):
         """Kiểm tra mã thùng mới có trùng với dữ liệu đầu vào không"""
@@ -1594,11 +1491,9 @@ class KiemKhoApp:
         
         # Kiểm tra xem mã thùng mới có trùng với mã thùng nào trong dữ liệu không
         if vi_tri_moi in existing_box_numbers:
-            messagebox.showerror(
-                "Lỗi", 
-                f"Mã thùng mới '{vi_tri_moi}' đã tồn tại trong dữ liệu đầu vào!\n\n"
-                f"Vui lòng nhập mã thùng khác với các mã thùng hiện có.\n\n"
-                f"Các mã thùng hiện có: {', '.join(sorted(existing_box_numbers)[:10])}"
+            self.notify(NOTIFY_ERROR,
+                f"Mã thùng mới '{vi_tri_moi}' đã tồn tại trong dữ liệu đầu vào! "
+                f"Vui lòng nhập mã thùng khác với các mã thùng hiện có: {', '.join(sorted(existing_box_numbers)[:10])}"
                 + (f" và {len(existing_box_numbers) - 10} mã khác..." if len(existing_box_numbers) > 10 else "")
             )
             # Xóa giá trị và focus lại vào ô nhập
@@ -1610,9 +1505,12 @@ class KiemKhoApp:
     
     def load_box_data(self):
         """Load dữ liệu của thùng được nhập"""
+        # Các mã đã quét nhưng chưa xử lý thuộc về thùng đang mở
+        if not self._flush_scan_queue():
+            return
         so_thung = self.so_thung_var.get().strip()
         if not so_thung:
-            messagebox.showwarning("Cảnh báo", "Vui lòng nhập số thùng!")
+            self.notify(NOTIFY_WARNING, "Vui lòng nhập số thùng!")
             return
         
         # Kiểm tra nếu đang có dữ liệu đã quét
@@ -1644,26 +1542,23 @@ class KiemKhoApp:
                     return
         
         try:
-            # Tìm cột số thùng (có thể là 'so_thung' sau khi mapping hoặc tên gốc)
-            so_thung_col = None
-            for col in self.df.columns:
-                col_lower = str(col).lower().strip()
-                if 'số thùng' in col_lower or 'so thung' in col_lower or col_lower == 'thùng' or col_lower == 'so_thung':
-                    so_thung_col = col
-                    break
-            
-            if so_thung_col is None:
-                messagebox.showerror("Lỗi", f"Không tìm thấy cột 'Số thùng' trong file Excel!\nCác cột có sẵn: {list(self.df.columns)}")
+            # Dữ liệu đầu vào còn đang đọc trên thread nền: chỉ load được các thùng đã đọc xong
+            if self.session.is_loading_input():
+                if not self.session.is_box_available(so_thung):
+                    self.notify(NOTIFY_INFO, 
+                        f"Đang đọc dữ liệu đầu vào, thùng số {so_thung} chưa đọc xong.\n\n"
+                        "Vui lòng thử lại sau giây lát.")
+                    return
+            # Phân vùng số thùng được xây khi đọc dữ liệu từ cột số thùng đã phát hiện
+            elif self.box_partition is None:
+                self.notify(NOTIFY_ERROR, f"Không tìm thấy cột 'Số thùng' trong file Excel!\nCác cột có sẵn: {list(self.df.columns)}")
                 return
             
-            # Chuyển đổi sang string để so sánh (không phân biệt chữ hoa/thường)
-            self.df[so_thung_col] = self.df[so_thung_col].astype(str).str.strip()
-            # So sánh không phân biệt chữ hoa/thường
-            so_thung_lower = so_thung.lower()
-            self.current_box_data = self.df[self.df[so_thung_col].str.lower() == so_thung_lower].copy()
+            # Lấy các dòng của thùng từ phân vùng (không phân biệt chữ hoa/thường) - O(số dòng trong thùng)
+            self.current_box_data = self.session.get_box_data(so_thung)
             
             if self.current_box_data.empty:
-                messagebox.showinfo("Thông báo", f"Không tìm thấy dữ liệu cho thùng số {so_thung}")
+                self.notify(NOTIFY_WARNING, f"Không tìm thấy dữ liệu cho thùng số {so_thung}")
                 self.current_box_number = None
                 self.so_tua_var.set("0")
                 self.clear_table()
@@ -1676,16 +1571,15 @@ class KiemKhoApp:
             # Nếu đang load lại cùng một thùng và đã quét đủ (so sánh không phân biệt chữ hoa/thường)
             current_box_lower = str(self.current_box_number).lower() if self.current_box_number else ''
             if current_box_lower == so_thung.lower() and so_tua_da_quet >= so_tua_trong_thung:
-                messagebox.showwarning(
-                    "Cảnh báo", 
-                    f"Thùng {so_thung} đã được kiểm kê đủ {so_tua_trong_thung} tựa!\n\n"
-                    f"Bạn đã quét {so_tua_da_quet} tựa.\n\n"
+                self.notify(NOTIFY_WARNING,
+                    f"Thùng {so_thung} đã được kiểm kê đủ {so_tua_trong_thung} tựa! "
+                    f"Bạn đã quét {so_tua_da_quet} tựa. "
                     "Vui lòng load thùng khác hoặc lưu dữ liệu trước khi tiếp tục."
                 )
                 return
             
-            self.current_box_number = so_thung
-            self.scanned_items = {}  # Reset danh sách đã quét
+            # Bắt đầu kiểm thùng mới (reset danh sách đã quét)
+            self.session.open_box(so_thung, self.current_box_data)
             
             # Đếm số tựa đã quét từ tab Tổng hợp cho thùng này
             so_tua_da_quet = self.count_scanned_titles_for_box(so_thung)
@@ -1700,487 +1594,139 @@ class KiemKhoApp:
             
             # Thông báo thành công với thông tin số tựa đã quét
             if so_tua_da_quet > 0:
-                messagebox.showinfo("Thành công", 
+                self.notify(NOTIFY_SUCCESS, 
                     f"Đã load {len(self.current_box_data)} tựa cho thùng số {so_thung}\n\n"
                     f"Đã quét: {so_tua_da_quet} tựa (đã lưu trong Tổng hợp)\n"
                     f"Còn lại: {len(self.current_box_data) - so_tua_da_quet} tựa")
             else:
-                messagebox.showinfo("Thành công", f"Đã load {len(self.current_box_data)} tựa cho thùng số {so_thung}")
+                self.notify(NOTIFY_SUCCESS, f"Đã load {len(self.current_box_data)} tựa cho thùng số {so_thung}")
             
             # Focus vào ô nhập ISBN để sẵn sàng quét
             self.isbn_entry.focus()
             
         except Exception as e:
-            messagebox.showerror("Lỗi", f"Không thể load dữ liệu thùng: {str(e)}")
+            self.notify(NOTIFY_ERROR, f"Không thể load dữ liệu thùng: {str(e)}")
     
     def count_valid_scanned_isbns(self):
         """Đếm số ISBN hợp lệ (tồn tại trong Excel) đã được quét - không đếm ISBN không tồn tại"""
-        if not self.scanned_items or self.df is None:
-            return 0
-        
-        count = 0
-        if 'isbn' not in self.df.columns:
-            return 0
-        
-        for isbn, item_data in self.scanned_items.items():
-            # Bỏ qua nếu là ISBN không hợp lệ (không tồn tại trong Excel)
-            if item_data.get('is_invalid_isbn', False) or item_data.get('is_new_isbn_not_in_data', False):
-                continue
-            
-            # Nếu ISBN không bị đánh dấu là invalid, coi như hợp lệ
-            count += 1
-        
-        return count
+        return self.session.count_valid_scanned_isbns()
     
     def count_scanned_titles_for_box(self, so_thung):
         """Đếm số tựa đã quét từ tab Tổng hợp cho một thùng cụ thể - chỉ đếm ISBN tồn tại"""
-        if not so_thung or not self.tong_hop_data:
-            return 0
-        
-        so_thung_clean = str(so_thung).strip()
-        count = 0
-        
-        for data in self.tong_hop_data:
-            # So sánh số thùng (có thể là 'Số thùng' hoặc 'Vị trí mới') - không phân biệt chữ hoa/thường
-            so_thung_in_data = str(data.get('Số thùng', '')).strip()
-            vi_tri_moi_in_data = str(data.get('Vị trí mới', '')).strip()
-            
-            # Kiểm tra nếu số thùng khớp (so sánh không phân biệt chữ hoa/thường)
-            if (so_thung_in_data.lower() == so_thung_clean.lower() or 
-                vi_tri_moi_in_data.lower() == so_thung_clean.lower()):
-                
-                # QUAN TRỌNG: Chỉ đếm các ISBN tồn tại (có _is_valid_isbn = True)
-                # ISBN không tồn tại không được tính vào số tựa đã quét
-                is_valid = data.get('_is_valid_isbn', True)  # Mặc định là True để tương thích với dữ liệu cũ
-                
-                # Nếu không có field _is_valid_isbn, coi như hợp lệ (tương thích ngược)
-                if is_valid is not False:  # Chỉ đếm nếu is_valid = True hoặc không có field
-                    count += 1
-        
-        return count
-    
+        return self.session.count_scanned_titles_for_box(so_thung)
+
     def is_isbn_in_input_data(self, isbn):
         """Kiểm tra xem ISBN có tồn tại trong dữ liệu đầu vào (tong_hop_data) không - không kiểm tra số thùng"""
-        if not isbn or not self.tong_hop_data:
-            return False
-        
-        try:
-            isbn_clean = str(isbn).strip()
-            isbn_clean_digits = ''.join(filter(str.isdigit, isbn_clean))
-            
-            for data in self.tong_hop_data:
-                isbn_in_data = str(data.get('ISBN', '')).strip()
-                
-                # So sánh nhanh: khớp chính xác trước
-                if isbn_in_data == isbn_clean:
-                    return True
-                
-                # So sánh với digits
-                isbn_in_data_digits = ''.join(filter(str.isdigit, isbn_in_data))
-                if isbn_in_data_digits and isbn_clean_digits and isbn_in_data_digits == isbn_clean_digits:
-                    return True
-                
-                # So sánh với endswith/startswith (chậm hơn, chỉ khi cần)
-                if (isbn_in_data.endswith(isbn_clean) or isbn_clean.endswith(isbn_in_data)):
-                    return True
-            
-            return False
-        except Exception as e:
-            # Nếu có lỗi, trả về False để không block quét
-            print(f"Lỗi khi kiểm tra ISBN trong dữ liệu đầu vào: {str(e)}")
-            return False
-    
+        return self.session.is_isbn_in_input_data(isbn)
+
+    @timed('is_isbn_already_scanned')
     def is_isbn_already_scanned(self, isbn, so_thung):
-        """Kiểm tra xem ISBN đã được quét và lưu trong tab Tổng hợp cho thùng này chưa - tối ưu"""
-        if not isbn or not so_thung or not self.tong_hop_data:
-            return False
-        
+        """Kiểm tra xem ISBN đã được quét và lưu trong tab Tổng hợp cho thùng này chưa"""
+        return self.session.is_isbn_already_scanned(isbn, so_thung)
+
+    def find_isbn_row_in_box(self, isbn_clean):
+        """Tìm dòng khớp ISBN trong thùng hiện tại bằng chỉ mục ISBN"""
+        return self.session.find_isbn_row(isbn_clean)
+    
+    def _sync_scanned_item_from_tree(self, isbn_clean):
+        """Đồng bộ Tồn thực tế/Tình trạng/Ghi chú đang hiển thị trên bảng vào scanned_items trước khi cộng dồn"""
+        item = self.scanned_items.get(isbn_clean)
+        if not item or not item.get('item_id'):
+            return
         try:
-            isbn_clean = str(isbn).strip()
-            isbn_clean_digits = ''.join(filter(str.isdigit, isbn_clean))
-            so_thung_clean = str(so_thung).strip()
-            
-            # Tối ưu: chỉ kiểm tra các item có số thùng khớp trước (không phân biệt chữ hoa/thường)
-            so_thung_clean_lower = so_thung_clean.lower()
-            for data in self.tong_hop_data:
-                # Kiểm tra số thùng trước (nhanh hơn)
-                so_thung_in_data = str(data.get('Số thùng', '')).strip()
-                vi_tri_moi_in_data = str(data.get('Vị trí mới', '')).strip()
-                
-                # Nếu số thùng không khớp, bỏ qua ngay (so sánh không phân biệt chữ hoa/thường)
-                if (so_thung_in_data.lower() != so_thung_clean_lower and 
-                    vi_tri_moi_in_data.lower() != so_thung_clean_lower):
-                    continue
-                
-                # Kiểm tra ISBN chỉ khi số thùng khớp
-                isbn_in_data = str(data.get('ISBN', '')).strip()
-                
-                # So sánh nhanh: khớp chính xác trước
-                if isbn_in_data == isbn_clean:
-                    return True
-                
-                # So sánh với digits
-                isbn_in_data_digits = ''.join(filter(str.isdigit, isbn_in_data))
-                if isbn_in_data_digits and isbn_clean_digits and isbn_in_data_digits == isbn_clean_digits:
-                    return True
-                
-                # So sánh với endswith/startswith (chậm hơn, chỉ khi cần)
-                if (isbn_in_data.endswith(isbn_clean) or isbn_clean.endswith(isbn_in_data)):
-                    return True
-            
-            return False
-        except Exception as e:
-            # Nếu có lỗi, trả về False để không block quét
-            print(f"Lỗi khi kiểm tra ISBN đã quét: {str(e)}")
-            return False
+            old_values = list(self.tree.item(item['item_id'], 'values'))
+        except Exception:
+            return  # Item có thể đã bị xóa khỏi bảng
+        # Ưu tiên Tồn thực tế trong scanned_items, chỉ lấy từ bảng nếu giá trị trong scanned_items không phải số
+        try:
+            float(str(item.get('ton_thuc_te', '')).strip())
+        except (ValueError, TypeError):
+            if len(old_values) > 3:
+                item['ton_thuc_te'] = str(old_values[3]).strip()
+        # Tình trạng (index 6) và Ghi chú (index 7) có thể đã được sửa trực tiếp trên bảng
+        item['tinh_trang'] = old_values[6] if len(old_values) > 6 else ''
+        item['ghi_chu'] = old_values[7] if len(old_values) > 7 else ''
+    
+    def _show_box_conflict_error(self, vi_tri_moi):
+        """Báo lỗi mã thùng mới trùng với mã thùng trong dữ liệu đầu vào (không block luồng quét)"""
+        existing_box_numbers = self.get_all_box_numbers()
+        existing_list = ', '.join(sorted(existing_box_numbers)[:10])
+        existing_count = len(existing_box_numbers)
+        existing_suffix = f" và {existing_count - 10} mã khác..." if existing_count > 10 else ""
+        self.notify(NOTIFY_ERROR,
+            f"Mã thùng mới '{vi_tri_moi}' đã tồn tại trong dữ liệu đầu vào! "
+            f"Vui lòng nhập mã thùng khác với các mã thùng hiện có: {existing_list}{existing_suffix}")
     
     def on_isbn_entered(self, event=None):
-        """Xử lý khi nhập/quét ISBN - tối ưu để tránh freeze"""
+        """Nhập/quét ISBN: đưa mã trong ô quét vào hàng đợi (xử lý sau, khi giao diện rảnh)"""
+        if self.scan_queue is not None:
+            return self.scan_queue.on_return(event)
+    
+    @timed('process_scan')
+    def process_scan(self, isbn, context, count=1):
+        """Xử lý một mã từ hàng đợi quét - context là vị trí mới lúc quét, count là số lần quét liên tiếp đã gộp"""
         try:
-            isbn = self.isbn_entry.get().strip()
-            if not isbn:
-                return
-            
-            if self.current_box_data is None or self.current_box_data.empty:
-                # Sử dụng after để không block UI
-                self.root.after(10, lambda: messagebox.showwarning("Cảnh báo", "Vui lòng nhập số thùng và load dữ liệu trước!"))
-                self.isbn_entry.delete(0, tk.END)
-                return
+            isbn_clean = str(isbn).strip()
+            # Đồng bộ giá trị người dùng đã sửa trên bảng để cộng dồn đúng
+            if isbn_clean in self.scanned_items:
+                self._sync_scanned_item_from_tree(isbn_clean)
             
-            # Lưu số tựa trong thùng để dùng sau
-            so_tua_trong_thung = len(self.current_box_data)
+            # Tìm ISBN trong thùng hiện tại, kiểm tra đã lưu / trùng mã thùng mới và cộng dồn (session)
+            vi_tri_moi = context or ''
+            result = self.session.scan_isbn(isbn_clean, vi_tri_moi, count)
             
-            # Tìm tựa trong dữ liệu thùng hiện tại - tối ưu với vectorization
-            # (Kiểm tra is_over_limit sẽ được thực hiện sau khi xác định ISBN có hợp lệ không)
-            if 'isbn' in self.current_box_data.columns:
-                isbn_clean = str(isbn).strip()
-                isbn_clean_digits = ''.join(filter(str.isdigit, isbn_clean))
-                matched_row = None
-                
-                # Tối ưu: sử dụng vectorization thay vì iterrows() (nhanh hơn nhiều)
-                try:
-                    # Chuyển đổi ISBN sang số để so sánh nhanh hơn
-                    isbn_col = self.current_box_data['isbn'].astype(str).str.strip()
-                    
-                    # Tìm khớp chính xác trước (nhanh nhất)
-                    exact_match = isbn_col == isbn_clean
-                    if exact_match.any():
-                        matched_row = self.current_box_data[exact_match].iloc[0]
-                    else:
-                        # Tìm khớp với digits
-                        isbn_col_digits = isbn_col.str.replace(r'\D', '', regex=True)
-                        digit_match = isbn_col_digits == isbn_clean_digits
-                        if digit_match.any():
-                            matched_row = self.current_box_data[digit_match].iloc[0]
-                        else:
-                            # Tìm khớp với endswith/startswith (chậm hơn nhưng cần thiết)
-                            for idx, row in self.current_box_data.iterrows():
-                                row_isbn = str(row.get('isbn', '')).strip()
-                                row_isbn_clean = ''.join(filter(str.isdigit, row_isbn))
-                                
-                                if (row_isbn == isbn_clean or 
-                                    row_isbn.endswith(isbn_clean) or 
-                                    isbn_clean.endswith(row_isbn) or
-                                    (row_isbn_clean and isbn_clean_digits and row_isbn_clean == isbn_clean_digits)):
-                                    matched_row = row
-                                    break
-                except Exception as e:
-                    # Fallback về cách cũ nếu vectorization lỗi
-                    print(f"Lỗi khi tìm ISBN với vectorization: {str(e)}")
-                    for idx, row in self.current_box_data.iterrows():
-                        row_isbn = str(row.get('isbn', '')).strip()
-                        row_isbn_clean = ''.join(filter(str.isdigit, row_isbn))
-                        
-                        if (row_isbn == isbn_clean or 
-                            row_isbn.endswith(isbn_clean) or 
-                            isbn_clean.endswith(row_isbn) or
-                            (row_isbn_clean and isbn_clean_digits and row_isbn_clean == isbn_clean_digits)):
-                            matched_row = row
-                            break
-                
-                # Kiểm tra xem ISBN này đã được quét và lưu trong tab Tổng hợp chưa
-                if matched_row is not None:
-                    if self.is_isbn_already_scanned(isbn_clean, self.current_box_number):
-                        # Fix closure issue: capture giá trị vào biến local
-                        isbn_msg = isbn_clean
-                        box_msg = self.current_box_number
-                        self.root.after(10, lambda i=isbn_msg, b=box_msg: messagebox.showwarning(
-                            "Cảnh báo",
-                            f"ISBN {i} đã được quét và lưu trong tab Tổng hợp cho thùng {b}!\n\n"
-                            "Vui lòng không quét lại ISBN đã được lưu."
-                        ))
-                        self.isbn_entry.delete(0, tk.END)
-                        return
-                
-                # Kiểm tra xem ISBN có thuộc thùng này không
-                # Nếu không tìm thấy trong thùng hiện tại, coi như ISBN không tồn tại (không lấy dữ liệu từ thùng khác)
-                is_invalid_isbn = False
-                
-                if matched_row is None:
-                    # Nếu không tìm thấy trong thùng hiện tại, coi như ISBN không tồn tại
-                    # Không tìm kiếm trong các thùng khác
-                    is_invalid_isbn = True
-                
-                # Đảm bảo pandas đã được import
-                if self.pd is None:
-                    try:
-                        import pandas as pd
-                        self.pd = pd
-                    except ImportError:
-                        messagebox.showerror("Lỗi", "Không thể import pandas!")
-                        return
-                
-                pd = self.pd  # Alias để dùng trong hàm này
-                
-                # Kiểm tra xem ISBN có tồn tại trong dữ liệu đầu vào không
-                isbn_not_in_input_data = False
-                if matched_row is None:
-                    # Chỉ kiểm tra nếu ISBN không tồn tại trong thùng
-                    isbn_not_in_input_data = not self.is_isbn_in_input_data(isbn_clean)
-                
-                # Kiểm tra xem ISBN đã được quét trước đó chưa (để cho phép tăng số lượng)
-                # Nếu đã quét rồi và ISBN tồn tại trong thùng, luôn cho phép tăng số lượng, không cần kiểm tra is_over_limit
-                is_already_scanned = isbn_clean in self.scanned_items
-                
-                # Kiểm tra nếu ISBN không hợp lệ (không thuộc thùng, không tồn tại trong dữ liệu, hoặc quét quá số tựa)
-                # Trong trường hợp này, coi như tạo dòng trống mới, chỉ điền số thùng đang load vào cột "Số thùng"
-                # KHÔNG thêm thông báo lỗi vào Ghi chú
-                # LƯU Ý: 
-                # - Nếu ISBN đã được quét trước đó (is_already_scanned) và tồn tại trong thùng (matched_row is not None),
-                #   thì không coi là quá giới hạn vì đây là quét lại để tăng số lượng
-                # - QUAN TRỌNG: Chỉ tìm ISBN trong thùng hiện tại, không lấy dữ liệu từ thùng khác
-                # - Nếu ISBN không thuộc thùng hiện tại, coi như không tồn tại
-                # - Chỉ đếm các ISBN hợp lệ (tồn tại trong thùng hiện tại) khi kiểm tra giới hạn
-                should_treat_as_invalid = False
-                if matched_row is None:
-                    should_treat_as_invalid = True  # ISBN không tồn tại trong thùng hiện tại
-                elif is_invalid_isbn:
-                    should_treat_as_invalid = True  # ISBN không hợp lệ
-                # Nếu ISBN tồn tại trong thùng hiện tại (matched_row is not None), luôn coi là hợp lệ
-                # Chỉ đếm các ISBN hợp lệ (tồn tại trong thùng hiện tại)
-                # ISBN không tồn tại sẽ không được đếm vào số tựa
-                
-                if should_treat_as_invalid:
-                    # Để trống các cột: Tựa, Tồn thực tế, Tồn tựa trong thùng, Tình trạng, Ghi chú
-                    # Tự động lấy số thùng từ input "Số thùng" ở trên
-                    tua = ''
-                    ton_trong_thung = 0
-                    ton_thuc_te_value = ''  # Để trống thay vì mặc định là 1
-                    tinh_trang_value = ''  # Bỏ hiển thị trạng thái
-                    ghi_chu_value = ''  # Để trống, không thêm thông báo lỗi
-                    # Tự động lấy số thùng từ input "Số thùng" ở trên
-                    so_thung_hien_thi = str(self.current_box_number) if self.current_box_number else ''
-                    is_existing_item = False
-                else:
-                    # Lấy thông tin từ matched_row (ISBN hợp lệ)
-                    # Tìm cột 'tua' (có thể là 'tua' sau khi mapping hoặc tên gốc)
-                    tua = ''
-                    for col in matched_row.index:
-                        col_lower = str(col).lower().strip()
-                        if 'tựa' in col_lower or 'tua' in col_lower or 'tên' in col_lower or 'titles' in col_lower:
-                            tua = str(matched_row[col]) if pd.notna(matched_row[col]) else ''
-                            break
-                    
-                    # Tìm cột 'ton_tung_tua' (có thể là 'ton_tung_tua' sau khi mapping hoặc tên gốc)
-                    ton_trong_thung = 0
-                    for col in matched_row.index:
-                        col_lower = str(col).lower().strip()
-                        if ('tồn' in col_lower and 'tựa' in col_lower) or ('ton' in col_lower and 'tua' in col_lower) or 'qty tựa trong thùng' in col_lower or 'qty tua trong thung' in col_lower:
-                            ton_trong_thung = matched_row[col] if pd.notna(matched_row[col]) else 0
-                            try:
-                                ton_trong_thung = int(float(ton_trong_thung))  # Chuyển thành số nguyên
-                            except:
-                                ton_trong_thung = 0
-                            break
-                    
-                    so_thung = self.current_box_number
-                    
-                    # Kiểm tra xem đã quét chưa để tự động tăng số lượng
-                    ton_thuc_te_value = '1'  # Mặc định là 1 khi quét lần đầu
-                    ghi_chu_value = ''
-                    tinh_trang_value = ''
-                    is_existing_item = False
+            if result.status == SCAN_NO_DATA:
+                self.notify(NOTIFY_WARNING, "Vui lòng nhập số thùng và load dữ liệu trước!")
+                return
+            if result.status == SCAN_NO_ISBN_COLUMN:
+                self.notify(NOTIFY_ERROR, "Không tìm thấy cột 'ISBN' trong dữ liệu!")
+            elif result.status == SCAN_ALREADY_SAVED:
+                self.notify(NOTIFY_WARNING,
+                    f"ISBN {isbn_clean} đã được quét và lưu trong tab Tổng hợp cho thùng {self.current_box_number}! "
+                    "Vui lòng không quét lại ISBN đã được lưu.")
+                return
+            elif result.status == SCAN_BOX_CONFLICT:
+                self._show_box_conflict_error(vi_tri_moi)
+                return
+            elif result.status == SCAN_BAD_CHECKSUM:
+                self.notify(NOTIFY_WARNING,
+                    f"Mã {isbn_clean} sai số kiểm tra (check digit) và không có trong dữ liệu đầu vào! "
+                    "Có thể do quét hoặc gõ nhầm - vui lòng quét lại.")
+                return
+            else:
+                item = result.item
+                is_existing_item = result.status == SCAN_INCREMENTED
                 
-                # Xử lý item đã tồn tại: nếu ISBN đã được quét và ISBN tồn tại trong thùng, cho phép tăng số lượng
-                # (không cần kiểm tra is_over_limit vì đây là quét lại để tăng số lượng)
-                if is_already_scanned and matched_row is not None:
-                    # ISBN đã tồn tại - tăng số lượng lên 1
-                    is_existing_item = True
-                    item_id_old = self.scanned_items[isbn_clean]['item_id']
-                    
-                    # Lấy giá trị "Tồn thực tế" từ cả scanned_items và tree để đảm bảo chính xác
-                    old_ton_thuc_te_from_items = self.scanned_items[isbn_clean].get('ton_thuc_te', '')
-                    old_values = list(self.tree.item(item_id_old, 'values'))
-                    old_ton_thuc_te_from_tree = old_values[3] if len(old_values) > 3 else ''  # Tồn thực tế ở index 3
-                    
-                    # Chuyển đổi sang string và strip để so sánh
-                    # QUAN TRỌNG: Kiểm tra cả None và empty string, nhưng không bỏ qua giá trị '0'
-                    old_ton_thuc_te_from_items_str = ''
-                    if old_ton_thuc_te_from_items is not None:
-                        old_ton_thuc_te_from_items_str = str(old_ton_thuc_te_from_items).strip()
-                    
-                    old_ton_thuc_te_from_tree_str = ''
-                    if old_ton_thuc_te_from_tree is not None:
-                        old_ton_thuc_te_from_tree_str = str(old_ton_thuc_te_from_tree).strip()
-                    
-                    # Ưu tiên lấy từ scanned_items (chính xác nhất), nếu không có hoặc rỗng thì lấy từ tree
-                    # Kiểm tra bằng cách thử parse, không chỉ kiểm tra empty string
-                    old_ton_thuc_te = ''
-                    
-                    # Thử parse từ scanned_items trước (ưu tiên)
-                    if old_ton_thuc_te_from_items_str != '':
-                        try:
-                            test_num = float(old_ton_thuc_te_from_items_str)
-                            old_ton_thuc_te = old_ton_thuc_te_from_items_str
-                        except (ValueError, TypeError):
-                            pass
-                    
-                    # Nếu không có từ scanned_items, thử từ tree
-                    if not old_ton_thuc_te and old_ton_thuc_te_from_tree_str != '':
-                        try:
-                            test_num = float(old_ton_thuc_te_from_tree_str)
-                            old_ton_thuc_te = old_ton_thuc_te_from_tree_str
-                        except (ValueError, TypeError):
-                            pass
-                    
-                    try:
-                        # Tăng số lượng lên 1
-                        if old_ton_thuc_te:
-                            # Parse giá trị và tăng lên 1
-                            old_ton_thuc_te_num = int(float(old_ton_thuc_te))
-                            ton_thuc_te_value = str(old_ton_thuc_te_num + 1)
-                        else:
-                            # Nếu không có giá trị, mặc định là 1
-                            ton_thuc_te_value = '1'
-                    except (ValueError, TypeError) as e:
-                        # Nếu không parse được, mặc định là 1
-                        ton_thuc_te_value = '1'
-                    
-                    # Giữ lại giá trị Ghi chú và Tình trạng cũ
-                    ghi_chu_value = old_values[7] if len(old_values) > 7 else ''  # Ghi chú ở index 7
-                    tinh_trang_value = old_values[6] if len(old_values) > 6 else ''  # Tình trạng ở index 6
-                    
+                if is_existing_item:
+                    # Xóa dòng cũ - dòng mới với số lượng đã cộng dồn được thêm vào cuối bảng
+                    item_id_old = result.previous_item.get('item_id')
                     # Xóa highlight cũ trước khi xóa item để tránh lỗi khi click vào highlight
                     try:
                         self.remove_error_highlights(item_id_old)
                     except:
                         pass
-                    
-                    # Xóa item cũ
                     try:
                         self.tree.delete(item_id_old)
                     except:
                         pass  # Item có thể đã bị xóa rồi
-                    del self.scanned_items[isbn_clean]
-                
-                # Thêm vào bảng với đầy đủ thông tin
-                # Chuyển ton_trong_thung thành số nguyên để hiển thị
-                # Nếu ISBN không hợp lệ, để trống thay vì hiển thị 0
-                if should_treat_as_invalid:
-                    ton_trong_thung_display = ''
-                else:
-                    ton_trong_thung_display = int(ton_trong_thung) if ton_trong_thung else 0
-                
-                # Chỉ xử lý vi_tri_moi cho ISBN hợp lệ
-                if not should_treat_as_invalid:
-                    # Kiểm tra nếu có "Thùng / vị trí mới" thì dùng giá trị đó, không thì dùng số thùng hiện tại
-                    vi_tri_moi = self.vi_tri_moi_var.get().strip()
-                    
-                    # Validation: Mã thùng mới phải khác với tất cả mã thùng trong dữ liệu đầu vào
-                    if vi_tri_moi:
-                        # Kiểm tra lại một lần nữa khi quét ISBN (để đảm bảo)
-                        existing_box_numbers = self.get_all_box_numbers()
-                        if vi_tri_moi in existing_box_numbers:
-                            # Fix closure issue: capture giá trị vào biến local
-                            vi_tri_msg = vi_tri_moi
-                            existing_list = ', '.join(sorted(existing_box_numbers)[:10])
-                            existing_count = len(existing_box_numbers)
-                            existing_suffix = f" và {existing_count - 10} mã khác..." if existing_count > 10 else ""
-                            self.root.after(10, lambda v=vi_tri_msg, e=existing_list, s=existing_suffix: messagebox.showerror(
-                                "Lỗi", 
-                                f"Mã thùng mới '{v}' đã tồn tại trong dữ liệu đầu vào!\n\n"
-                                f"Vui lòng nhập mã thùng khác với các mã thùng hiện có.\n\n"
-                                f"Các mã thùng hiện có: {e}{s}"
-                            ))
-                            self.isbn_entry.delete(0, tk.END)
-                            return
-                        
-                        so_thung_hien_thi = vi_tri_moi
-                    else:
-                        so_thung_hien_thi = so_thung
-                # Nếu ISBN không hợp lệ, so_thung_hien_thi đã được set thành '' ở trên
                 
                 # Đảm bảo thứ tự đúng với columns: Số thứ tự, ISBN, Tựa, Tồn thực tế, Số thùng, Tồn tựa trong thùng, Tình trạng, Ghi chú
                 # Tính số thứ tự: số dòng hiện tại + 1
                 so_thu_tu = len(self.tree.get_children()) + 1
-                
-                # Đảm bảo ton_thuc_te_value là string
-                # Nếu ISBN không hợp lệ, giữ nguyên giá trị rỗng
-                # Nếu ISBN hợp lệ, mặc định là '1' nếu rỗng
-                if should_treat_as_invalid:
-                    # Giữ nguyên giá trị rỗng cho ISBN không hợp lệ
-                    ton_thuc_te_value = str(ton_thuc_te_value).strip() if ton_thuc_te_value is not None else ''
-                else:
-                    # Đối với ISBN hợp lệ, mặc định là '1' nếu rỗng
-                    if not ton_thuc_te_value or str(ton_thuc_te_value).strip() == '':
-                        ton_thuc_te_value = '1'
-                    else:
-                        ton_thuc_te_value = str(ton_thuc_te_value).strip()
-                
-                # Đảm bảo ISBN được format đúng và hiển thị
-                isbn_display = str(isbn_clean).strip() if isbn_clean else ''
-                if not isbn_display:
-                    isbn_display = str(isbn).strip() if isbn else ''
+                ton_thuc_te_value = item['ton_thuc_te']
                 
                 item_id = self.tree.insert('', tk.END, values=(
                     str(so_thu_tu),            # 0: Số thứ tự
-                    isbn_display,               # 1: ISBN - đảm bảo hiển thị đúng
-                    str(tua) if tua else '',   # 2: Tựa
+                    item.get('isbn', isbn_clean),  # 1: ISBN (dạng quét lần đầu)
+                    str(item['tua']) if item['tua'] else '',   # 2: Tựa
                     ton_thuc_te_value,         # 3: Tồn thực tế - tự động điền 1 hoặc tăng lên (hoặc rỗng cho ISBN không hợp lệ)
-                    str(so_thung_hien_thi) if so_thung_hien_thi else '',    # 4: Số thùng (dùng vị trí mới nếu có, hoặc rỗng cho ISBN không hợp lệ)
-                    str(ton_trong_thung_display) if ton_trong_thung_display != '' else '',  # 5: Tồn tựa trong thùng (rỗng cho ISBN không hợp lệ)
-                    tinh_trang_value if tinh_trang_value else '',          # 6: Tình trạng - giữ lại nếu đã có (hoặc rỗng cho ISBN không hợp lệ)
-                    ghi_chu_value if ghi_chu_value else '',              # 7: Ghi chú - giữ lại nếu đã có (hoặc rỗng cho ISBN không hợp lệ)
+                    str(item['so_thung']) if item['so_thung'] else '',    # 4: Số thùng (dùng vị trí mới nếu có)
+                    format_ton_trong_thung(item),  # 5: Tồn tựa trong thùng (rỗng cho ISBN không hợp lệ)
+                    item['tinh_trang'] if item['tinh_trang'] else '',          # 6: Tình trạng - giữ lại nếu đã có
+                    item['ghi_chu'] if item['ghi_chu'] else '',              # 7: Ghi chú - giữ lại nếu đã có
                     'Xóa'                       # 8: Xóa - nút xóa dòng
                 ), tags=('',))
-                
-                # Đảm bảo giá trị ISBN được hiển thị đúng ngay sau khi insert
-                current_values_check = list(self.tree.item(item_id, 'values'))
-                if len(current_values_check) >= 2 and current_values_check[1] != isbn_display:
-                    current_values_check[1] = isbn_display
-                    self.tree.item(item_id, values=current_values_check)
-                
-                # Đảm bảo giá trị được hiển thị đúng ngay sau khi insert
-                # Cập nhật lại để đảm bảo đồng bộ
-                current_values_check = list(self.tree.item(item_id, 'values'))
-                if len(current_values_check) >= 4 and current_values_check[3] != ton_thuc_te_value:
-                    current_values_check[3] = ton_thuc_te_value
-                    self.tree.item(item_id, values=current_values_check)
-                
-                # Lưu thông tin
-                # Lưu cả số thùng gốc và số thùng hiển thị (vị trí mới nếu có)
-                # Lưu cả vi_tri_moi để có thể sử dụng khi lưu (nếu người dùng chỉnh sửa trực tiếp)
-                vi_tri_moi_value = self.vi_tri_moi_var.get().strip()
-                # Đảm bảo so_thung được định nghĩa cho cả trường hợp ISBN không hợp lệ
-                # Khi ISBN không hợp lệ, lấy số thùng từ input "Số thùng" ở trên
-                if should_treat_as_invalid:
-                    so_thung_goc = str(self.current_box_number) if self.current_box_number else ''  # Lấy từ input "Số thùng"
-                else:
-                    so_thung_goc = so_thung if 'so_thung' in locals() else self.current_box_number
-                
-                self.scanned_items[isbn_clean] = {
-                    'item_id': item_id,
-                    'tua': tua,
-                    'ton_thuc_te': ton_thuc_te_value,  # Lưu giá trị đã tự động điền hoặc đã tăng (có thể rỗng cho ISBN không hợp lệ)
-                    'so_thung': so_thung_hien_thi,  # Lưu số thùng hiển thị (có thể là vị trí mới, hoặc rỗng cho ISBN không hợp lệ)
-                    'so_thung_goc': so_thung_goc,  # Lưu số thùng gốc từ dữ liệu (hoặc rỗng cho ISBN không hợp lệ)
-                    'vi_tri_moi': vi_tri_moi_value,  # Lưu giá trị từ ô "Thùng / vị trí mới" khi quét
-                    'ton_trong_thung': ton_trong_thung,  # Có thể là 0 hoặc giá trị thực tế
-                    'tinh_trang': tinh_trang_value,  # Giữ lại tình trạng cũ nếu có (hoặc rỗng cho ISBN không hợp lệ)
-                    'ghi_chu': ghi_chu_value,  # Giữ lại ghi chú cũ nếu có (hoặc rỗng cho ISBN không hợp lệ)
-                    'is_invalid_isbn': should_treat_as_invalid,  # Đánh dấu ISBN không hợp lệ để cho phép edit cột Tựa
-                    'is_new_isbn_not_in_data': isbn_not_in_input_data  # Đánh dấu ISBN không tồn tại trong cả thùng và dữ liệu đầu vào
-                }
+                item['item_id'] = item_id
                 
                 # Cập nhật số tựa đã quét (chỉ hiển thị số tựa đã lưu trong Tổng hợp)
                 if hasattr(self, 'so_tua_da_quet_var') and self.so_tua_da_quet_var and self.current_box_number:
@@ -2196,30 +1742,12 @@ class KiemKhoApp:
                 # Áp dụng cho cả ISBN hợp lệ và không hợp lệ - người dùng cần điền tồn thực tế
                 # Nếu là item đã tồn tại (quét lại), chỉ cộng dồn số lượng, không cần focus
                 if not is_existing_item:
-                    # Tự động focus vào ô "Tồn thực tế" để người dùng có thể chỉnh sửa và Enter
-                    # Áp dụng cho cả ISBN hợp lệ và không hợp lệ
                     # Fix closure issue: capture item_id vào biến local
                     item_id_to_edit = item_id
-                    self.root.after(100, lambda i=item_id_to_edit: self.auto_edit_ton_thuc_te(i))
+                    self.root.after(100, lambda i=item_id_to_edit: self._auto_edit_after_scan(i))
                 else:
-                    # Nếu là item đã tồn tại (đã cộng dồn), đảm bảo giá trị được hiển thị đúng
-                    # Cập nhật lại giá trị trong tree ngay lập tức để đảm bảo hiển thị đúng
-                    current_values = list(self.tree.item(item_id, 'values'))
-                    if len(current_values) >= 4:
-                        # Đảm bảo giá trị Tồn thực tế đúng
-                        if current_values[3] != ton_thuc_te_value:
-                            current_values[3] = ton_thuc_te_value
-                            self.tree.item(item_id, values=current_values)
-                            # Force update để hiển thị ngay
-                            self.root.update_idletasks()
-                    
                     # Tự động kiểm tra và cập nhật highlight/tình trạng nếu có lệch
-                    if isbn_clean in self.scanned_items:
-                        # Sau đó mới kiểm tra và cập nhật highlight/tình trạng
-                        self.root.after(200, lambda i=item_id, isbn=isbn_clean: self._check_and_update_status_after_increment(i, isbn))
-                
-            else:
-                self.root.after(10, lambda: messagebox.showerror("Lỗi", "Không tìm thấy cột 'ISBN' trong dữ liệu!"))
+                    self.root.after(200, lambda i=item_id, isbn=isbn_clean: self._check_and_update_status_after_increment(i, isbn))
             
         except Exception as e:
             # Xử lý lỗi để tránh crash
@@ -2227,12 +1755,11 @@ class KiemKhoApp:
             print(f"Lỗi khi quét ISBN: {error_msg}")
             import traceback
             traceback.print_exc()
-            # Fix closure issue: capture error_msg vào biến local
-            self.root.after(10, lambda e=error_msg: messagebox.showerror("Lỗi", f"Lỗi khi quét ISBN: {e}"))
+            self.notify(NOTIFY_ERROR, f"Lỗi khi quét ISBN: {error_msg}")
         
-        # Clear ô nhập ISBN để sẵn sàng quét tiếp
-        self.isbn_entry.delete(0, tk.END)
-        self.isbn_entry.focus()
+        # Ô quét đã được xóa khi đưa mã vào hàng đợi - không xóa lại (có thể đang nhận mã tiếp theo)
+        if not self.edit_entry:
+            self.isbn_entry.focus()
     
     def ensure_values_format(self, values):
         """Đảm bảo values có đủ 9 cột và cột cuối cùng là 'Xóa'"""
@@ -2383,6 +1910,7 @@ class KiemKhoApp:
         self.edit_entry.bind('<FocusOut>', finish_on_focus_out)
         self.edit_entry.bind('<Escape>', lambda e: self.cancel_edit())
     
+    @timed('finish_edit')
     def finish_edit(self):
         """Hoàn tất việc chỉnh sửa"""
         # Tránh xử lý 2 lần nếu đang trong quá trình xử lý
@@ -2438,295 +1966,42 @@ class KiemKhoApp:
             elif column_index == 3:  # Tồn thực tế
                 values[3] = new_value  # Đảm bảo đúng index
                 
-                # Kiểm tra và highlight nếu khác nhau - CHỈ chạy cho ISBN hợp lệ (thuộc thùng)
                 if isbn in self.scanned_items:
-                    self.scanned_items[isbn]['ton_thuc_te'] = new_value
+                    scanned_item = self.scanned_items[isbn]
+                    # Giữ lại Ghi chú đang hiển thị nếu scanned_items chưa có (để giữ phần người dùng nhập)
+                    if not scanned_item.get('ghi_chu'):
+                        scanned_item['ghi_chu'] = values[7]
+                    
+                    # Đối chiếu Thiếu/Dư (session): chỉ so sánh ISBN thuộc thùng có Tồn tựa trong thùng > 0,
+                    # ISBN không tồn tại trong cả thùng và dữ liệu đầu vào thì Tồn tựa trong thùng = Tồn thực tế
+                    status = self.session.set_counted_quantity(isbn, new_value)
                     # Lưu backup khi có thay đổi
                     self.save_backup_on_change()
                     
-                    # Kiểm tra xem ISBN có hợp lệ không (thuộc thùng)
-                    is_invalid_isbn_item = self.scanned_items[isbn].get('is_invalid_isbn', False)
-                    is_new_isbn_not_in_data = self.scanned_items[isbn].get('is_new_isbn_not_in_data', False)
-                    ton_trong_thung = self.scanned_items[isbn].get('ton_trong_thung', 0)
-                    
-                    # Xử lý đặc biệt cho ISBN không tồn tại trong cả thùng và dữ liệu đầu vào
-                    # CHỈ áp dụng khi ISBN không tồn tại trong thùng (is_invalid_isbn_item = True) 
-                    # VÀ không tồn tại trong dữ liệu đầu vào (is_new_isbn_not_in_data = True)
-                    if is_new_isbn_not_in_data and is_invalid_isbn_item and new_value:
-                        try:
-                            # Tự động đặt ton_trong_thung = ton_thuc_te
-                            ton_thuc_te_num = float(new_value) if new_value else 0
-                            if ton_thuc_te_num > 0:
-                                # Cập nhật ton_trong_thung trong scanned_items
-                                self.scanned_items[isbn]['ton_trong_thung'] = ton_thuc_te_num
-                                
-                                # Cập nhật giá trị trong tree (cột 5: Tồn tựa trong thùng)
-                                while len(values) < 8:
-                                    values.append('')
-                                values[5] = str(int(ton_thuc_te_num))
-                                
-                                # Xóa tình trạng và ghi chú tự động (Thiếu/Dư) nếu có
-                                values[6] = ''  # Xóa tình trạng
-                                if 'tinh_trang' in self.scanned_items[isbn]:
-                                    del self.scanned_items[isbn]['tinh_trang']
-                                
-                                # Xóa ghi chú tự động (Thiếu X cuốn/Dư X cuốn) nhưng giữ lại phần người dùng nhập
-                                ghi_chu_hien_tai = self.scanned_items[isbn].get('ghi_chu', '')
-                                if not ghi_chu_hien_tai:
-                                    ghi_chu_hien_tai = values[7] if len(values) > 7 else ''
-                                
-                                if ghi_chu_hien_tai:
-                                    import re
-                                    # Xóa TẤT CẢ các pattern "Thiếu X cuốn" hoặc "Dư X cuốn"
-                                    ghi_chu_cleaned = re.sub(r'(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_hien_tai, flags=re.IGNORECASE)
-                                    ghi_chu_cleaned = re.sub(r'[,\.\s]*(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_cleaned, flags=re.IGNORECASE)
-                                    values[7] = ghi_chu_cleaned.strip()
-                                    self.scanned_items[isbn]['ghi_chu'] = values[7]
-                                else:
-                                    values[7] = ''
-                                    self.scanned_items[isbn]['ghi_chu'] = ''
-                                
-                                # Xóa highlight nếu có
-                                self.remove_error_highlights(item)
-                                
-                                # Cập nhật tree
-                                self.tree.item(item, values=values)
-                                
-                                # Lưu backup khi có thay đổi
-                                self.save_backup_on_change()
-                                
-                                # Return để không chạy logic so sánh Thiếu/Dư
-                                return
-                        except (ValueError, TypeError):
-                            # Nếu không parse được, tiếp tục với logic bình thường
-                            pass
-                    
-                    # CHỈ so sánh nếu ISBN hợp lệ (thuộc thùng) VÀ có giá trị Tồn tựa trong thùng hợp lệ (> 0)
-                    # Nếu is_invalid_isbn_item = True HOẶC ton_trong_thung = 0/rỗng, KHÔNG so sánh
-                    # Đảm bảo ton_trong_thung là số và > 0
-                    ton_trong_thung_valid = False
-                    try:
-                        if ton_trong_thung and ton_trong_thung != 0 and str(ton_trong_thung).strip() != '':
-                            ton_trong_thung_num = float(ton_trong_thung)
-                            if ton_trong_thung_num > 0:
-                                ton_trong_thung_valid = True
-                    except (ValueError, TypeError):
-                        ton_trong_thung_valid = False
+                    if status == STATUS_NEW_TITLE:
+                        values[5] = str(int(scanned_item['ton_trong_thung']))  # Tồn tựa trong thùng
+                    values[6] = scanned_item.get('tinh_trang', '')  # Tình trạng ở index 6
+                    values[7] = scanned_item.get('ghi_chu', '')  # Ghi chú ở index 7
+                    self.tree.item(item, values=values)
                     
-                    # QUAN TRỌNG: Nếu ISBN không hợp lệ, BỎ QUA HOÀN TOÀN logic so sánh
-                    # CHỈ so sánh nếu ISBN hợp lệ VÀ có ton_trong_thung hợp lệ
-                    # Kiểm tra chặt chẽ: nếu is_invalid_isbn_item = True, KHÔNG so sánh
-                    if is_invalid_isbn_item:
-                        # ISBN không hợp lệ - KHÔNG SO SÁNH, chỉ lưu giá trị và xóa các giá trị tự động điền
-                        # Xóa highlight nếu có
-                        self.remove_error_highlights(item)
-                        # Xóa tình trạng và ghi chú tự động nếu có
-                        while len(values) < 8:
-                            values.append('')
-                        
-                        # Lấy giá trị Ghi chú hiện tại từ scanned_items để giữ lại phần lỗi (LỖI: ...)
-                        ghi_chu_hien_tai = self.scanned_items[isbn].get('ghi_chu', '')
-                        if not ghi_chu_hien_tai:
-                            ghi_chu_hien_tai = values[7] if len(values) > 7 else ''
-                        
-                        # Xóa tình trạng tự động (Thiếu/Dư) - BỎ HIỂN THỊ TRẠNG THÁI
-                        values[6] = ''  # Xóa tình trạng
-                        if 'tinh_trang' in self.scanned_items[isbn]:
-                            del self.scanned_items[isbn]['tinh_trang']
-                        
-                        # Xóa TẤT CẢ ghi chú tự động (Thiếu X cuốn/Dư X cuốn và LỖI: ...)
-                        # Coi như dòng trống mới, để trống Ghi chú
-                        values[7] = ''
-                        
-                        # Cập nhật scanned_items
-                        if isbn in self.scanned_items:
-                            self.scanned_items[isbn]['ghi_chu'] = ''
-                            # Đảm bảo flag is_invalid_isbn vẫn được giữ
-                            self.scanned_items[isbn]['is_invalid_isbn'] = True
-                        
-                        # Cập nhật tree với giá trị mới
-                        self.tree.item(item, values=values)
-                    elif ton_trong_thung_valid:
-                        try:
-                            ton_thuc_te_num = float(new_value) if new_value else 0
-                            ton_trong_thung_num = float(ton_trong_thung) if ton_trong_thung else 0
-                            
-                            # Chỉ so sánh nếu ton_trong_thung_num > 0 (có giá trị hợp lệ)
-                            if ton_trong_thung_num > 0:
-                                # Kiểm tra lệch
-                                if abs(ton_thuc_te_num - ton_trong_thung_num) > 0.01:
-                                    # Tự động điền "Thiếu" hoặc "Dư" vào cột Tình trạng (index 6)
-                                    if ton_thuc_te_num < ton_trong_thung_num:
-                                        tinh_trang = "Thiếu"
-                                        so_luong_lech = int(ton_trong_thung_num - ton_thuc_te_num)
-                                        ghi_chu_auto = f"Thiếu {so_luong_lech} cuốn"
-                                    else:
-                                        tinh_trang = "Dư"
-                                        so_luong_lech = int(ton_thuc_te_num - ton_trong_thung_num)
-                                        ghi_chu_auto = f"Dư {so_luong_lech} cuốn"
-                                    
-                                    # Đảm bảo có đủ 8 cột và đúng thứ tự: Số thứ tự, ISBN, Tựa, Tồn thực tế, Số thùng, Tồn tựa trong thùng, Tình trạng, Ghi chú
-                                    while len(values) < 8:
-                                        values.append('')
-                                    
-                                    # Lấy giá trị Ghi chú hiện tại từ scanned_items (để giữ lại phần người dùng nhập)
-                                    ghi_chu_hien_tai = self.scanned_items[isbn].get('ghi_chu', '')
-                                    if not ghi_chu_hien_tai:
-                                        # Nếu không có trong scanned_items, lấy từ values
-                                        ghi_chu_hien_tai = values[7] if len(values) > 7 else ''
-                                    
-                                    # Tự động điền số lượng thiếu/dư vào ô Ghi chú
-                                    # QUAN TRỌNG: Xóa TẤT CẢ các pattern lỗi cũ trước khi thêm lỗi mới
-                                    import re
-                                    if ghi_chu_hien_tai and ghi_chu_hien_tai.strip():
-                                        # Xóa TẤT CẢ các pattern "Thiếu X cuốn" hoặc "Dư X cuốn" và các dấu câu/khoảng trắng sau đó
-                                        # Pattern: "Thiếu X cuốn" hoặc "Dư X cuốn" có thể có dấu phẩy, dấu chấm, khoảng trắng sau đó
-                                        ghi_chu_cleaned = re.sub(r'(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_hien_tai, flags=re.IGNORECASE)
-                                        ghi_chu_cleaned = re.sub(r'\.\s*\.', '.', ghi_chu_cleaned)  # Xóa dấu chấm kép
-                                        ghi_chu_cleaned = ghi_chu_cleaned.strip()
-                                        
-                                        # Thêm thông tin thiếu/dư mới vào đầu
-                                        if ghi_chu_cleaned:
-                                            values[7] = f"{ghi_chu_auto}. {ghi_chu_cleaned}"
-                                        else:
-                                            values[7] = ghi_chu_auto
-                                    else:
-                                        # Chưa có nội dung, điền mới
-                                        values[7] = ghi_chu_auto
-                                    
-                                    values[6] = tinh_trang  # Tình trạng ở index 6
-                                    
-                                    # Cập nhật scanned_items
-                                    self.scanned_items[isbn]['tinh_trang'] = tinh_trang
-                                    self.scanned_items[isbn]['ghi_chu'] = values[7]  # Cập nhật ghi chú
-                                    
-                                    # Cập nhật tree
-                                    self.tree.item(item, values=values)
-                                    
-                                    # Tô đỏ 2 ô: Tồn thực tế (cột 3) và Tình trạng (cột 6)
-                                    self.highlight_error_cells(item)
-                                    
-                                    # Không hiển thị cảnh báo nữa vì đã có cột "Tình trạng" để hiển thị
-                                else:
-                                    # Không có lỗi - xóa highlight và tình trạng
-                                    # Xóa thông tin thiếu/dư khỏi Ghi chú (nếu có) nhưng giữ lại phần người dùng nhập
-                                    while len(values) < 8:
-                                        values.append('')
-                                    
-                                    ghi_chu_hien_tai = values[7] if len(values) > 7 else ''
-                                    
-                                    # Xóa thông tin thiếu/dư tự động khỏi Ghi chú (nếu có)
-                                    if ghi_chu_hien_tai:
-                                        import re
-                                        # Loại bỏ các pattern như "Thiếu X cuốn" hoặc "Dư X cuốn" và các dấu câu/khoảng trắng sau đó
-                                        ghi_chu_cleaned = re.sub(r'^(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_hien_tai, flags=re.IGNORECASE)
-                                        ghi_chu_cleaned = re.sub(r'[,\.\s]*(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_cleaned, flags=re.IGNORECASE)
-                                        values[7] = ghi_chu_cleaned.strip()
-                                    else:
-                                        values[7] = ''
-                                    
-                                    # Xóa tình trạng nếu có
-                                    if len(values) > 6:
-                                        values[6] = ''
-                                        if 'tinh_trang' in self.scanned_items[isbn]:
-                                            del self.scanned_items[isbn]['tinh_trang']
-                                    
-                                    # Cập nhật ghi chú đã làm sạch
-                                    self.scanned_items[isbn]['ghi_chu'] = values[7]
-                                    
-                                    # Lưu backup khi có thay đổi
-                                    self.save_backup_on_change()
-                                    
-                                    # Cập nhật tree
-                                    self.tree.item(item, values=values)
-                                    
-                                    # Xóa highlight
-                                    self.remove_error_highlights(item)
-                        except (ValueError, TypeError):
-                            # Nếu không phải số, không highlight
-                            self.tree.item(item, tags=('',))
+                    if status == STATUS_MISMATCH:
+                        # Tô đỏ 2 ô: Tồn thực tế (cột 3) và Tình trạng (cột 6)
+                        self.highlight_error_cells(item)
                     else:
-                        # ISBN không hợp lệ (không thuộc thùng) hoặc ton_trong_thung = 0 - KHÔNG SO SÁNH, chỉ lưu giá trị
-                        # Xóa highlight nếu có
                         self.remove_error_highlights(item)
-                        # Xóa tình trạng và ghi chú tự động nếu có
-                        while len(values) < 8:
-                            values.append('')
-                        
-                        # Lấy giá trị Ghi chú hiện tại từ scanned_items để giữ lại phần lỗi (LỖI: ...)
-                        ghi_chu_hien_tai = self.scanned_items[isbn].get('ghi_chu', '')
-                        if not ghi_chu_hien_tai:
-                            ghi_chu_hien_tai = values[7] if len(values) > 7 else ''
-                        
-                        # Xóa tình trạng tự động (Thiếu/Dư) - BỎ HIỂN THỊ TRẠNG THÁI
-                        values[6] = ''  # Xóa tình trạng
-                        if 'tinh_trang' in self.scanned_items[isbn]:
-                            del self.scanned_items[isbn]['tinh_trang']
-                        
-                        # Xóa ghi chú tự động (Thiếu X cuốn/Dư X cuốn) nhưng GIỮ LẠI phần lỗi (LỖI: ...)
-                        if ghi_chu_hien_tai:
-                            import re
-                            # Xóa TẤT CẢ các pattern "Thiếu X cuốn" hoặc "Dư X cuốn" nhưng giữ lại "LỖI: ..."
-                            # Tách phần lỗi (LỖI: ...) ra trước
-                            ghi_chu_parts = []
-                            # Tìm tất cả các phần LỖI: (có thể có nhiều phần)
-                            loi_matches = re.findall(r'LỖI:[^.]*(?:\.[^.]*)*', ghi_chu_hien_tai, re.IGNORECASE)
-                            if loi_matches:
-                                ghi_chu_parts.extend(loi_matches)
-                            
-                            # Xóa TẤT CẢ các pattern "Thiếu X cuốn" hoặc "Dư X cuốn"
-                            ghi_chu_cleaned = re.sub(r'(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_hien_tai, flags=re.IGNORECASE)
-                            ghi_chu_cleaned = re.sub(r'[,\.\s]*(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_cleaned, flags=re.IGNORECASE)
-                            # Xóa các dấu chấm/phẩy thừa
-                            ghi_chu_cleaned = re.sub(r'\.\s*\.', '.', ghi_chu_cleaned)
-                            ghi_chu_cleaned = re.sub(r'\.\s*$', '', ghi_chu_cleaned)  # Xóa dấu chấm cuối
-                            ghi_chu_cleaned = ghi_chu_cleaned.strip()
-                            
-                            # Nếu còn phần khác sau khi xóa thiếu/dư (không phải LỖI), có thể là phần người dùng nhập
-                            if ghi_chu_cleaned:
-                                # Kiểm tra xem có phải là phần LỖI không
-                                if re.match(r'^LỖI:', ghi_chu_cleaned, re.IGNORECASE):
-                                    # Là phần LỖI, chỉ giữ phần LỖI
-                                    values[7] = ghi_chu_cleaned
-                                else:
-                                    # Không phải LỖI, có thể là phần người dùng nhập, kết hợp với phần LỖI
-                                    if ghi_chu_parts:
-                                        # Có phần LỖI, kết hợp: LỖI trước, phần người dùng sau
-                                        values[7] = '. '.join(ghi_chu_parts) + '. ' + ghi_chu_cleaned
-                                    else:
-                                        # Không có phần LỖI, chỉ giữ phần người dùng nhập
-                                        values[7] = ghi_chu_cleaned
-                            elif ghi_chu_parts:
-                                # Chỉ có phần LỖI, không có phần khác
-                                values[7] = '. '.join(ghi_chu_parts)
-                            else:
-                                # Không có gì cả
-                                values[7] = ''
-                        else:
-                            values[7] = ''
-                        
-                        # Cập nhật scanned_items
-                        if isbn in self.scanned_items:
-                            self.scanned_items[isbn]['ghi_chu'] = values[7]
-                            # Đảm bảo flag is_invalid_isbn vẫn được giữ
-                            if not self.scanned_items[isbn].get('is_invalid_isbn', False):
-                                # Nếu chưa có flag, kiểm tra lại từ ton_trong_thung
-                                if not ton_trong_thung_valid:
-                                    self.scanned_items[isbn]['is_invalid_isbn'] = True
-                        
-                        # Cập nhật tree với giá trị mới
-                        self.tree.item(item, values=values)
+                else:
+                    self.tree.item(item, values=values)
+                # Return để không chạy phần cập nhật tree chung bên dưới
+                return
             
             elif column_index == 4:  # Số thùng
                 # Validation: Mã thùng mới phải khác với tất cả mã thùng trong dữ liệu đầu vào
                 if new_value.strip():
                     existing_box_numbers = self.get_all_box_numbers()
                     if new_value.strip() in existing_box_numbers:
-                        messagebox.showerror(
-                            "Lỗi", 
-                            f"Mã thùng '{new_value.strip()}' đã tồn tại trong dữ liệu đầu vào!\n\n"
-                            f"Vui lòng nhập mã thùng khác với các mã thùng hiện có.\n\n"
-                            f"Các mã thùng hiện có: {', '.join(sorted(existing_box_numbers)[:10])}"
+                        self.notify(NOTIFY_ERROR,
+                            f"Mã thùng '{new_value.strip()}' đã tồn tại trong dữ liệu đầu vào! "
+                            f"Vui lòng nhập mã thùng khác với các mã thùng hiện có: {', '.join(sorted(existing_box_numbers)[:10])}"
                             + (f" và {len(existing_box_numbers) - 10} mã khác..." if len(existing_box_numbers) > 10 else "")
                         )
                         # Khôi phục giá trị cũ
@@ -2798,102 +2073,6 @@ class KiemKhoApp:
             # Cập nhật tree với giá trị mới (chỉ cho các cột khác, không phải Ghi chú)
             self.tree.item(item, values=values)
             
-            # Nếu là cột Tồn thực tế, kiểm tra lại và cập nhật highlight
-            if column_index == 3:
-                if isbn in self.scanned_items:
-                    # Bỏ qua so sánh cho ISBN không tồn tại trong cả thùng và dữ liệu đầu vào
-                    is_new_isbn_not_in_data = self.scanned_items[isbn].get('is_new_isbn_not_in_data', False)
-                    is_invalid_isbn_item = self.scanned_items[isbn].get('is_invalid_isbn', False)
-                    # CHỈ bỏ qua so sánh khi ISBN không tồn tại trong CẢ HAI (thùng và dữ liệu đầu vào)
-                    if is_new_isbn_not_in_data and is_invalid_isbn_item:
-                        # Không so sánh, chỉ xóa highlight nếu có
-                        self.remove_error_highlights(item)
-                    else:
-                        ton_trong_thung = self.scanned_items[isbn]['ton_trong_thung']
-                        try:
-                            ton_thuc_te_num = float(new_value) if new_value else 0
-                            ton_trong_thung_num = float(ton_trong_thung) if ton_trong_thung else 0
-                            if abs(ton_thuc_te_num - ton_trong_thung_num) > 0.01:
-                                # Vẫn còn lệch - tự động cập nhật tình trạng và số lượng thiếu/dư vào Ghi chú
-                                if ton_thuc_te_num < ton_trong_thung_num:
-                                    tinh_trang = "Thiếu"
-                                    so_luong_lech = int(ton_trong_thung_num - ton_thuc_te_num)
-                                    ghi_chu_auto = f"Thiếu {so_luong_lech} cuốn"
-                                else:
-                                    tinh_trang = "Dư"
-                                    so_luong_lech = int(ton_thuc_te_num - ton_trong_thung_num)
-                                    ghi_chu_auto = f"Dư {so_luong_lech} cuốn"
-                                
-                                # Đảm bảo có đủ 8 cột
-                                while len(values) < 8:
-                                    values.append('')
-                                
-                                # Lấy giá trị Ghi chú hiện tại từ scanned_items (để giữ lại phần người dùng nhập)
-                                ghi_chu_hien_tai = self.scanned_items[isbn].get('ghi_chu', '')
-                                if not ghi_chu_hien_tai:
-                                    # Nếu không có trong scanned_items, lấy từ values
-                                    ghi_chu_hien_tai = values[7] if len(values) > 7 else ''
-                                
-                                # Tự động điền số lượng thiếu/dư vào ô Ghi chú
-                                # QUAN TRỌNG: Xóa TẤT CẢ các pattern lỗi cũ trước khi thêm lỗi mới
-                                import re
-                                if ghi_chu_hien_tai and ghi_chu_hien_tai.strip():
-                                    # Xóa TẤT CẢ các pattern "Thiếu X cuốn" hoặc "Dư X cuốn" và các dấu câu/khoảng trắng sau đó
-                                    # Pattern: "Thiếu X cuốn" hoặc "Dư X cuốn" có thể có dấu phẩy, dấu chấm, khoảng trắng sau đó
-                                    ghi_chu_cleaned = re.sub(r'(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_hien_tai, flags=re.IGNORECASE)
-                                    ghi_chu_cleaned = re.sub(r'\.\s*\.', '.', ghi_chu_cleaned)  # Xóa dấu chấm kép
-                                    ghi_chu_cleaned = ghi_chu_cleaned.strip()
-                                    
-                                    # Thêm thông tin thiếu/dư mới vào đầu
-                                    if ghi_chu_cleaned:
-                                        values[7] = f"{ghi_chu_auto}. {ghi_chu_cleaned}"
-                                    else:
-                                        values[7] = ghi_chu_auto
-                                else:
-                                    # Chưa có nội dung, điền mới
-                                    values[7] = ghi_chu_auto
-                                
-                                values[6] = tinh_trang  # Tình trạng ở index 6
-                                
-                                # Cập nhật scanned_items
-                                self.scanned_items[isbn]['tinh_trang'] = tinh_trang
-                                self.scanned_items[isbn]['ghi_chu'] = values[7]  # Cập nhật ghi chú
-                                
-                                self.tree.item(item, values=values)
-                                self.highlight_error_cells(item)
-                            else:
-                                # Đã khớp - xóa tình trạng
-                                # Xóa thông tin thiếu/dư khỏi Ghi chú (nếu có) nhưng giữ lại phần người dùng nhập
-                                while len(values) < 8:
-                                    values.append('')
-                                
-                                # Lấy giá trị Ghi chú hiện tại từ scanned_items (để giữ lại phần người dùng nhập)
-                                ghi_chu_hien_tai = self.scanned_items[isbn].get('ghi_chu', '')
-                                if not ghi_chu_hien_tai:
-                                    # Nếu không có trong scanned_items, lấy từ values
-                                    ghi_chu_hien_tai = values[7] if len(values) > 7 else ''
-                                
-                                # Xóa thông tin thiếu/dư tự động khỏi Ghi chú (nếu có)
-                                if ghi_chu_hien_tai:
-                                    # Loại bỏ các pattern như "Thiếu X cuốn" hoặc "Dư X cuốn" và các dấu câu/khoảng trắng sau đó
-                                    import re
-                                    ghi_chu_cleaned = re.sub(r'^(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_hien_tai, flags=re.IGNORECASE)
-                                    ghi_chu_cleaned = re.sub(r'[,\.\s]*(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_cleaned, flags=re.IGNORECASE)
-                                    values[7] = ghi_chu_cleaned.strip()
-                                else:
-                                    values[7] = ''
-                                
-                                values[6] = ''  # Xóa tình trạng
-                                
-                                # Cập nhật scanned_items
-                                if 'tinh_trang' in self.scanned_items[isbn]:
-                                    del self.scanned_items[isbn]['tinh_trang']
-                                self.scanned_items[isbn]['ghi_chu'] = values[7]  # Cập nhật ghi chú đã làm sạch
-                                
-                                self.tree.item(item, values=values)
-                                self.remove_error_highlights(item)
-                        except:
-                            self.remove_error_highlights(item)
         finally:
             # Reset flag và cleanup
             self.is_processing_edit = False
@@ -2930,117 +2109,24 @@ class KiemKhoApp:
     
     def _check_and_update_status_after_increment(self, item_id, isbn):
         """Kiểm tra và cập nhật tình trạng sau khi tăng số lượng - CHỈ cho ISBN hợp lệ (thuộc thùng)"""
-        if isbn not in self.scanned_items:
-            return
-        
-        # Kiểm tra xem ISBN có hợp lệ không (thuộc thùng)
-        is_invalid_isbn_item = self.scanned_items[isbn].get('is_invalid_isbn', False)
-        is_new_isbn_not_in_data = self.scanned_items[isbn].get('is_new_isbn_not_in_data', False)
-        ton_trong_thung = self.scanned_items[isbn].get('ton_trong_thung', 0)
-        
-        # QUAN TRỌNG: CHỈ bỏ qua so sánh khi ISBN không tồn tại trong CẢ HAI (thùng và dữ liệu đầu vào)
-        # Nếu ISBN tồn tại trong thùng (is_invalid_isbn_item = False), vẫn so sánh bình thường
-        if is_invalid_isbn_item and is_new_isbn_not_in_data:
-            return  # Bỏ qua so sánh cho ISBN không tồn tại trong cả thùng và dữ liệu đầu vào
-        
-        # Nếu ISBN không hợp lệ (không thuộc thùng) nhưng tồn tại trong dữ liệu đầu vào, vẫn bỏ qua so sánh
-        if is_invalid_isbn_item:
-            return  # Bỏ qua so sánh cho ISBN không hợp lệ
-        
-        # CHỈ so sánh nếu ISBN hợp lệ VÀ có giá trị Tồn tựa trong thùng hợp lệ (> 0)
-        # Đảm bảo ton_trong_thung là số và > 0
-        ton_trong_thung_valid = False
-        try:
-            if ton_trong_thung and ton_trong_thung != 0 and str(ton_trong_thung).strip() != '':
-                ton_trong_thung_num = float(ton_trong_thung)
-                if ton_trong_thung_num > 0:
-                    ton_trong_thung_valid = True
-        except (ValueError, TypeError):
-            ton_trong_thung_valid = False
-        
-        if not ton_trong_thung_valid:
-            return  # Bỏ qua so sánh nếu không có giá trị Tồn tựa trong thùng hợp lệ
-        
         try:
+            # Bỏ qua ISBN không thuộc thùng hoặc không có Tồn tựa trong thùng hợp lệ (> 0)
+            status = self.session.refresh_item_status(isbn)
+            if status not in (STATUS_MISMATCH, STATUS_MATCH):
+                return
+            
             values = list(self.tree.item(item_id, 'values'))
             if len(values) < 8:
                 return
+            scanned_item = self.scanned_items[isbn]
+            values[6] = scanned_item.get('tinh_trang', '')
+            values[7] = scanned_item.get('ghi_chu', '')
+            self.tree.item(item_id, values=values)
             
-            ton_thuc_te_str = values[3] if len(values) > 3 else ''  # Tồn thực tế ở index 3
-            
-            try:
-                ton_thuc_te_num = float(ton_thuc_te_str) if ton_thuc_te_str else 0
-                ton_trong_thung_num = float(ton_trong_thung) if ton_trong_thung else 0
-                
-                # Chỉ so sánh nếu ton_trong_thung_num > 0 (có giá trị hợp lệ)
-                if ton_trong_thung_num > 0 and abs(ton_thuc_te_num - ton_trong_thung_num) > 0.01:
-                    # Có lệch - tự động cập nhật tình trạng và số lượng thiếu/dư vào Ghi chú
-                    if ton_thuc_te_num < ton_trong_thung_num:
-                        tinh_trang = "Thiếu"
-                        so_luong_lech = int(ton_trong_thung_num - ton_thuc_te_num)
-                        ghi_chu_auto = f"Thiếu {so_luong_lech} cuốn"
-                    else:
-                        tinh_trang = "Dư"
-                        so_luong_lech = int(ton_thuc_te_num - ton_trong_thung_num)
-                        ghi_chu_auto = f"Dư {so_luong_lech} cuốn"
-                    
-                    # Đảm bảo có đủ 8 cột
-                    while len(values) < 8:
-                        values.append('')
-                    
-                    # Lấy giá trị Ghi chú hiện tại
-                    ghi_chu_hien_tai = values[7] if len(values) > 7 else ''
-                    
-                    # QUAN TRỌNG: Xóa các thông tin thiếu/dư cũ trong Ghi chú trước khi thêm mới
-                    # Để tránh tích lũy thông tin cũ (ví dụ: "Dư 2 cuốn. Dư 1 cuốn")
-                    # QUAN TRỌNG: Xóa TẤT CẢ các pattern lỗi cũ trước khi thêm lỗi mới
-                    import re
-                    ghi_chu_cleaned = ''
-                    if ghi_chu_hien_tai and ghi_chu_hien_tai.strip():
-                        # Xóa TẤT CẢ các pattern "Thiếu X cuốn" hoặc "Dư X cuốn" và các dấu câu/khoảng trắng sau đó
-                        ghi_chu_cleaned = re.sub(r'(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_hien_tai, flags=re.IGNORECASE)
-                        ghi_chu_cleaned = re.sub(r'\.\s*\.', '.', ghi_chu_cleaned)  # Xóa dấu chấm kép
-                        ghi_chu_cleaned = ghi_chu_cleaned.strip()
-                    
-                    # Thêm thông tin thiếu/dư mới vào đầu
-                    if ghi_chu_cleaned:
-                        values[7] = f"{ghi_chu_auto}. {ghi_chu_cleaned}"
-                    else:
-                        values[7] = ghi_chu_auto
-                    
-                    values[6] = tinh_trang
-                    
-                    # Cập nhật scanned_items
-                    self.scanned_items[isbn]['tinh_trang'] = tinh_trang
-                    self.scanned_items[isbn]['ghi_chu'] = values[7]
-                    
-                    self.tree.item(item_id, values=values)
-                    self.highlight_error_cells(item_id)
-                else:
-                    # Đã khớp - xóa tình trạng
-                    while len(values) < 7:
-                        values.append('')
-                    
-                    ghi_chu_hien_tai = values[7] if len(values) > 7 else ''
-                    
-                    if ghi_chu_hien_tai:
-                        import re
-                        ghi_chu_cleaned = re.sub(r'^(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_hien_tai, flags=re.IGNORECASE)
-                        ghi_chu_cleaned = re.sub(r'[,\.\s]*(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_cleaned, flags=re.IGNORECASE)
-                        values[7] = ghi_chu_cleaned.strip()
-                    else:
-                        values[7] = ''
-                    
-                    values[6] = ''
-                    
-                    if 'tinh_trang' in self.scanned_items[isbn]:
-                        del self.scanned_items[isbn]['tinh_trang']
-                    self.scanned_items[isbn]['ghi_chu'] = values[7]
-                    
-                    self.tree.item(item_id, values=values)
-                    self.remove_error_highlights(item_id)
-            except:
-                pass
+            if status == STATUS_MISMATCH:
+                self.highlight_error_cells(item_id)
+            else:
+                self.remove_error_highlights(item_id)
         except:
             pass
     
@@ -3207,6 +2293,21 @@ class KiemKhoApp:
                     pass
             del self.error_highlights[item_id]
     
+    def _flush_scan_queue(self):
+        """Xử lý hết các mã quét đang chờ, False (đã báo người dùng) nếu một mã quét vẫn đang xử lý dở"""
+        if self.scan_queue is None or self.scan_queue.flush():
+            return True
+        self.notify(NOTIFY_WARNING, "Đang xử lý mã vừa quét - vui lòng hoàn tất rồi thử lại!")
+        return False
+    
+    def _auto_edit_after_scan(self, item_id):
+        """Mở ô sửa Tồn thực tế cho dòng vừa quét, trừ khi đang có mã quét tiếp theo (không lấy focus khỏi ô quét)"""
+        if self.scan_queue is not None and self.scan_queue.pending:
+            return
+        if self.isbn_entry.get().strip():
+            return
+        self.auto_edit_ton_thuc_te(item_id)
+    
     def auto_edit_ton_thuc_te(self, item_id):
         """Tự động mở edit cho cột 'Tồn thực tế' sau khi thêm item mới"""
         if not item_id:
@@ -3284,8 +2385,10 @@ class KiemKhoApp:
         # Xóa tất cả items trong bảng
         self.clear_table()
         
-        # Xóa tất cả scanned items
+        # Xóa tất cả scanned items (và các mã quét chưa xử lý)
         self.scanned_items = {}
+        if self.scan_queue is not None:
+            self.scan_queue.clear()
         
         # Reset số tựa về 0
         if hasattr(self, 'so_tua_var'):
@@ -3301,7 +2404,7 @@ class KiemKhoApp:
             self.cancel_edit()
         
         # Thông báo thành công
-        messagebox.showinfo("Thành công", "Đã reset lại tất cả dữ liệu đã quét.\nBạn có thể bắt đầu quét lại từ đầu.")
+        self.notify(NOTIFY_SUCCESS, "Đã reset lại tất cả dữ liệu đã quét.\nBạn có thể bắt đầu quét lại từ đầu.")
     
     def on_enter_pressed(self, event):
         """Xử lý phím Enter"""
@@ -3311,14 +2414,16 @@ class KiemKhoApp:
     
     def save_data(self):
         """Lưu dữ liệu đã kiểm tra vào tab Tổng hợp"""
+        if not self._flush_scan_queue():
+            return
         if not self.scanned_items:
-            messagebox.showwarning("Cảnh báo", "Chưa có dữ liệu để lưu!")
+            self.notify(NOTIFY_WARNING, "Chưa có dữ liệu để lưu!")
             return
         
         # Kiểm tra ràng buộc: Tổ là bắt buộc
         to_value = self.to_var.get().strip() if hasattr(self, 'to_var') and self.to_var.get() else ''
         if not to_value:
-            messagebox.showerror("Lỗi", "Vui lòng nhập 'Tổ' trước khi lưu!")
+            self.notify(NOTIFY_ERROR, "Vui lòng nhập 'Tổ' trước khi lưu!")
             # Focus vào ô input Tổ
             if hasattr(self, 'to_entry'):
                 self.to_entry.focus()
@@ -3466,83 +2571,9 @@ class KiemKhoApp:
         nhap_xuat_value = self.nhap_xuat_var.get().strip() if hasattr(self, 'nhap_xuat_var') else ''
         note_thung_value = self.note_thung_var.get().strip() if hasattr(self, 'note_thung_var') else ''
         
-        # Tạo số phiếu theo format P-DD/MM/YYYY
-        from datetime import datetime
-        try:
-            if ngay_value:
-                # Parse ngày từ format DD/MM/YY hoặc DD/MM/YYYY
-                if len(ngay_value.split('/')) == 3:
-                    parts = ngay_value.split('/')
-                    if len(parts[2]) == 2:
-                        # Format DD/MM/YY -> DD/MM/YYYY
-                        parts[2] = '20' + parts[2]
-                    ngay_parsed = datetime.strptime('/'.join(parts), "%d/%m/%Y")
-                else:
-                    ngay_parsed = datetime.now()
-            else:
-                ngay_parsed = datetime.now()
-        except:
-            ngay_parsed = datetime.now()
-        
-        so_phieu = f"P-{ngay_parsed.strftime('%d/%m/%Y')}"
-        
-        # Thêm dữ liệu vào tổng hợp - tối ưu cho dữ liệu lớn
-        items_to_add = []
-        for isbn, info in self.scanned_items.items():
-            try:
-                # Kiểm tra xem item có tồn thực tế chưa
-                if not info.get('ton_thuc_te', '').strip():
-                    continue  # Bỏ qua item chưa nhập tồn thực tế
-                
-                # Lưu cả ISBN tồn tại và không tồn tại vào tổng hợp
-                # (ISBN không tồn tại vẫn được lưu, nhưng không được tính vào số tựa đã quét)
-                
-                # Lấy số thùng gốc
-                so_thung_goc = info.get('so_thung_goc', '')
-                if not so_thung_goc:
-                    so_thung_goc = self.current_box_number if self.current_box_number else info.get('so_thung', '')
-                so_thung_goc_clean = str(so_thung_goc).strip()
-                
-                # Xác định số thùng mới (vị trí mới)
-                # QUAN TRỌNG: "Vị trí mới" chỉ lấy từ vi_tri_moi, KHÔNG fallback về so_thung_goc
-                so_thung_moi = ''
-                
-                # Ưu tiên 1: vi_tri_moi_global (từ ô input "Thùng / vị trí mới")
-                if vi_tri_moi_global and vi_tri_moi_global.strip():
-                    so_thung_moi = vi_tri_moi_global.strip()
-                else:
-                    # Ưu tiên 2: vi_tri_moi từ scanned_items (đã lưu khi quét)
-                    vi_tri_moi_saved = info.get('vi_tri_moi', '').strip()
-                    if vi_tri_moi_saved:
-                        so_thung_moi = vi_tri_moi_saved
-                    # Nếu không có vi_tri_moi, để trống (không lấy từ so_thung gốc)
-                
-                # Lấy giá trị từ input "Nhập/Xuất" ở tab Kiểm kê và hiển thị trực tiếp vào cột N/X
-                nx_value = nhap_xuat_value.strip() if nhap_xuat_value else ""
-                
-                # Lấy flag đánh dấu ISBN có tồn tại không (để đếm số tựa đã quét)
-                is_invalid_isbn = info.get('is_invalid_isbn', False)
-                is_valid_isbn = not is_invalid_isbn  # ISBN hợp lệ (tồn tại) = không phải invalid
-                
-                # Thêm vào danh sách để append sau (hiệu quả hơn)
-                items_to_add.append({
-                    'N/X': nx_value,
-                    'Số phiếu': so_phieu,
-                    'Ngày': ngay_value,
-                    'Vị trí mới': so_thung_moi,  # Chỉ lấy từ vi_tri_moi, không fallback về so_thung_goc
-                    'ISBN': isbn,
-                    'Tựa': info.get('tua', ''),
-                    'Tồn thực tế': info.get('ton_thuc_te', ''),
-                    'Số thùng': so_thung_goc_clean,
-                    'Tình trạng': info.get('tinh_trang', ''),  # Lấy từ scanned_items
-                    'Ghi chú': info.get('ghi_chu', ''),  # Ghi chú do người dùng tự nhập
-                    'Note thùng': note_thung_value,  # Note thùng từ input
-                    '_is_valid_isbn': is_valid_isbn  # Đánh dấu ISBN có tồn tại (để đếm số tựa đã quét)
-                })
-            except Exception as e:
-                # Bỏ qua item lỗi và tiếp tục
-                print(f"Lỗi khi xử lý item {isbn}: {str(e)}")
-                continue
+        # Tạo các dòng Tổng hợp (số phiếu P-DD/MM/YYYY, bỏ qua item chưa nhập tồn thực tế)
+        # Lưu cả ISBN tồn tại và không tồn tại - ISBN không tồn tại không được tính vào số tựa đã quét
+        items_to_add = self.session.build_tong_hop_records(nhap_xuat_value, ngay_value, vi_tri_moi_global, note_thung_value)
         
         # Lưu số thùng hiện tại trước khi reset để cập nhật số tựa đã quét
         saved_box_number = self.current_box_number
@@ -3563,19 +2594,19 @@ class KiemKhoApp:
             
             # Thêm tất cả items vào tổng hợp cùng lúc (hiệu quả hơn append từng cái)
             # Với dữ liệu cực lớn, extend vẫn nhanh hơn append từng cái
-            self.tong_hop_data.extend(items_to_add)
+            # Cấp id bền trước khi ghi journal (id được lưu cùng dòng)
+            self.session.add_tong_hop_records(items_to_add)
             
-            # Lưu backup ngay sau khi extend để tránh mất dữ liệu nếu crash
+            # Ghi journal ngay sau khi extend để tránh mất dữ liệu nếu crash (chỉ ghi các dòng mới)
             try:
-                if items_count > 1000:
-                    # Lưu backup ngay lập tức cho dữ liệu lớn
-                    self.save_backup()
+                self.journal_backup(OP_ADD_ROWS, rows=items_to_add)
             except Exception as backup_err:
                 # Log nhưng không chặn quá trình
                 print(f"Lỗi khi lưu backup: {str(backup_err)}")
             
-            # Cập nhật bảng tổng hợp (có xử lý lỗi và batch processing bên trong)
-            self.update_tong_hop_table()
+            # Cập nhật bảng tổng hợp tăng dần: chỉ insert các dòng mới lọt vào vùng nhìn thấy
+            if self.tong_hop_view:
+                self.tong_hop_view.rows_appended(items_count)
             
         except MemoryError:
             # Xử lý lỗi memory
@@ -3616,127 +2647,128 @@ class KiemKhoApp:
         self.current_box_number = None
         self.current_box_data = None
         
+        # Ghi trạng thái đang quét (đã xóa) vào journal để khôi phục đúng sau khi crash
+        self.journal_scan_state()
+        
         # Chuyển sang tab Tổng hợp
         self.notebook.select(1)
         
         # Thông báo thành công với format số cho dữ liệu lớn
         total_count = len(self.tong_hop_data)
-        messagebox.showinfo("Thành công", 
+        self.notify(NOTIFY_SUCCESS, 
             f"Đã lưu {items_count:,} dòng mới vào Tổng hợp!\nTổng cộng: {total_count:,} dòng")
     
+    def import_scan_file(self):
+        """Nhập file mã quét (.txt/.csv) của máy quét cầm tay: đếm theo ISBN, đối chiếu theo thùng và lưu thẳng vào Tổng hợp"""
+        if not self._flush_scan_queue():
+            return
+        if self.df is None or self.df.empty:
+            self.notify(NOTIFY_WARNING, "Vui lòng đợi đọc xong dữ liệu đầu vào trước khi import file mã quét!")
+            return
+        if self.scanned_items:
+            self.notify(NOTIFY_WARNING, "Đang có dữ liệu quét chưa lưu! Vui lòng SAVE hoặc RESET trước khi import file mã quét.")
+            return
+        
+        # Cùng ràng buộc như khi SAVE: Tổ là bắt buộc, mã thùng mới không trùng dữ liệu đầu vào
+        to_value = self.to_var.get().strip() if hasattr(self, 'to_var') and self.to_var.get() else ''
+        if not to_value:
+            self.notify(NOTIFY_ERROR, "Vui lòng nhập 'Tổ' trước khi import!")
+            if hasattr(self, 'to_entry'):
+                self.to_entry.focus()
+                self.to_entry.select_range(0, tk.END)
+            return
+        if not self.validate_vi_tri_moi():
+            return
+        
+        file_path = filedialog.askopenfilename(
+            title="Chọn file mã quét",
+            filetypes=[("File mã quét", "*.txt *.csv"), ("Tất cả file", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            dump = read_scan_dump(file_path, self.get_all_box_numbers())
+        except Exception as e:
+            messagebox.showerror("Lỗi", f"Không thể đọc file mã quét: {str(e)}")
+            return
+        
+        # Mã đứng trước mọi dấu thùng trong file thuộc thùng đang nhập
+        so_thung = self.so_thung_var.get().strip() if hasattr(self, 'so_thung_var') else ''
+        if dump.unassigned and not so_thung:
+            self.notify(NOTIFY_WARNING, "File mã quét có mã chưa có dấu thùng - vui lòng nhập số thùng trước khi import!")
+            if hasattr(self, 'so_thung_entry'):
+                self.so_thung_entry.focus()
+            return
+        batches = dump.batches(so_thung)
+        if not batches:
+            self.notify(NOTIFY_WARNING, "Không tìm thấy mã ISBN nào trong file mã quét!")
+            return
+        
+        vi_tri_moi = self.vi_tri_moi_var.get().strip() if hasattr(self, 'vi_tri_moi_var') else ''
+        ngay_value = self.ngay_var.get().strip() if hasattr(self, 'ngay_var') else ''
+        nhap_xuat_value = self.nhap_xuat_var.get().strip() if hasattr(self, 'nhap_xuat_var') else ''
+        note_thung_value = self.note_thung_var.get().strip() if hasattr(self, 'note_thung_var') else ''
+        results = self.session.reconcile_scan_batches(batches, nhap_xuat_value, ngay_value, vi_tri_moi, note_thung_value)
+        records = [record for result in results for record in result.records]
+        summary = format_import_summary(dump, results)
+        if not records:
+            self.notify(NOTIFY_WARNING, f"Không có dòng nào để import. {summary}")
+            return
+        if not messagebox.askyesno("Xác nhận import", f"{summary}\n\nLưu {len(records):,} dòng vào Tổng hợp?"):
+            return
+        
+        try:
+            # Cấp id bền trước khi ghi journal (id được lưu cùng dòng)
+            self.session.add_tong_hop_records(records)
+            try:
+                self.journal_backup(OP_ADD_ROWS, rows=records)
+            except Exception as backup_err:
+                # Log nhưng không chặn quá trình
+                print(f"Lỗi khi lưu backup: {str(backup_err)}")
+            if self.tong_hop_view:
+                self.tong_hop_view.rows_appended(len(records))
+        except Exception as e:
+            messagebox.showerror("Lỗi", f"Lỗi khi lưu dữ liệu import: {str(e)}\n\nSố dòng đang lưu: {len(records):,}")
+            print(f"Chi tiết lỗi: {traceback.format_exc()}")
+            return
+        
+        if self.so_tua_da_quet_var and self.current_box_number:
+            self.so_tua_da_quet_var.set(str(self.count_scanned_titles_for_box(self.current_box_number)))
+        self.notebook.select(1)
+        self.notify(NOTIFY_SUCCESS,
+            f"Đã import {len(records):,} dòng từ file mã quét vào Tổng hợp! Tổng cộng: {len(self.tong_hop_data):,} dòng")
+    
+    def _tong_hop_row_values(self, data):
+        """Values hiển thị trên bảng tổng hợp cho một dòng dữ liệu"""
+        return (
+            data.get('N/X', ''),
+            data.get('Số phiếu', ''),
+            data.get('Ngày', ''),
+            data.get('Vị trí mới', ''),
+            data.get('ISBN', ''),
+            data.get('Tựa', ''),
+            data.get('Tồn thực tế', ''),
+            data.get('Số thùng', ''),
+            data.get('Tình trạng', ''),
+            data.get('Ghi chú', ''),
+            data.get('Note thùng', '')
+        )
+    
+    def _finish_tong_hop_edit_before_render(self):
+        """Lưu ô đang sửa trước khi virtual list vẽ lại (item đang sửa sẽ bị xóa khỏi tree)"""
+        if self.tong_hop_edit_entry and not self.is_processing_tong_hop_edit:
+            self.finish_tong_hop_edit()
+    
+    @timed('update_tong_hop_table')
     def update_tong_hop_table(self):
-        """Cập nhật bảng tổng hợp - tối ưu cho dữ liệu lớn"""
-        if not self.tong_hop_tree:
+        """Cập nhật bảng tổng hợp - virtual list, chỉ render các dòng đang nhìn thấy"""
+        if not self.tong_hop_tree or not self.tong_hop_view:
             return
         
         try:
-            # Tắt cập nhật UI để tăng tốc độ
-            self.tong_hop_tree.config(cursor='wait')
-            self.root.config(cursor='wait')
-            
-            # Xóa tất cả items cũ - sử dụng cách nhanh hơn
-            children = self.tong_hop_tree.get_children()
-            if children:
-                self.tong_hop_tree.delete(*children)
-            
-            # Tắt update trong quá trình insert để tăng tốc độ
-            self.root.update_idletasks()
-            
-            # Kiểm tra số lượng dữ liệu
-            total_items = len(self.tong_hop_data)
-            
-            # Tối ưu batch size dựa trên số lượng dữ liệu
-            # Với dữ liệu lớn (>1000 items), sử dụng batch insert để tránh freeze UI
-            if total_items > 1000:
-                # Điều chỉnh batch size dựa trên số lượng dữ liệu
-                if total_items > 10000:
-                    batch_size = 500  # Batch lớn hơn cho dữ liệu cực lớn
-                elif total_items > 5000:
-                    batch_size = 300
-                elif total_items > 2000:
-                    batch_size = 200
-                else:
-                    batch_size = 100
-                
-                # Hiển thị thông báo cho dữ liệu lớn
-                if total_items > 5000:
-                    self.root.update()
-                    status_msg = f"Đang cập nhật {total_items:,} dòng... Vui lòng đợi..."
-                    # Có thể thêm progress bar nếu cần
-                
-                processed = 0
-                for i in range(0, total_items, batch_size):
-                    batch = self.tong_hop_data[i:i + batch_size]
-                    
-                    # Tạo values list cho batch trước để tối ưu
-                    batch_values = []
-                    for data in batch:
-                        try:
-                            batch_values.append((
-                                data.get('N/X', ''),
-                                data.get('Số phiếu', ''),
-                                data.get('Ngày', ''),
-                                data.get('Vị trí mới', ''),
-                                data.get('ISBN', ''),
-                                data.get('Tựa', ''),
-                                data.get('Tồn thực tế', ''),
-                                data.get('Số thùng', ''),
-                                data.get('Tình trạng', ''),
-                                data.get('Ghi chú', ''),
-                                data.get('Note thùng', '')
-                            ))
-                        except Exception as e:
-                            # Bỏ qua item lỗi và tiếp tục
-                            print(f"Lỗi khi chuẩn bị item: {str(e)}")
-                            continue
-                    
-                    # Insert batch vào tree
-                    for values in batch_values:
-                        try:
-                            self.tong_hop_tree.insert('', 'end', values=values)
-                            processed += 1
-                        except Exception as e:
-                            # Bỏ qua item lỗi và tiếp tục
-                            print(f"Lỗi khi insert item: {str(e)}")
-                            continue
-                    
-                    # Update UI mỗi batch để không freeze và hiển thị tiến trình
-                    if i + batch_size < total_items:
-                        self.root.update_idletasks()
-                        # Cho phép xử lý events để UI không bị đóng băng
-                        if processed % (batch_size * 2) == 0:  # Update mỗi 2 batch
-                            self.root.update()
-            else:
-                # Với dữ liệu nhỏ, insert trực tiếp
-                for data in self.tong_hop_data:
-                    try:
-                        self.tong_hop_tree.insert('', 'end', values=(
-                            data.get('N/X', ''),
-                            data.get('Số phiếu', ''),
-                            data.get('Ngày', ''),
-                            data.get('Vị trí mới', ''),
-                            data.get('ISBN', ''),
-                            data.get('Tựa', ''),
-                            data.get('Tồn thực tế', ''),
-                            data.get('Số thùng', ''),
-                            data.get('Tình trạng', ''),
-                            data.get('Ghi chú', ''),
-                            data.get('Note thùng', '')
-                        ))
-                    except Exception as e:
-                        # Bỏ qua item lỗi và tiếp tục
-                        print(f"Lỗi khi insert item: {str(e)}")
-                        continue
-            
-            # Bật lại cursor bình thường
-            self.tong_hop_tree.config(cursor='')
-            self.root.config(cursor='')
-            self.root.update_idletasks()
-            
+            self.tong_hop_view.set_rows(self.tong_hop_data)
         except Exception as e:
             # Xử lý lỗi để tránh crash
-            self.tong_hop_tree.config(cursor='')
-            self.root.config(cursor='')
             messagebox.showerror("Lỗi", f"Không thể cập nhật bảng tổng hợp: {str(e)}\n\nSố lượng dữ liệu: {len(self.tong_hop_data)}")
             print(f"Lỗi khi update_tong_hop_table: {str(e)}")
     
@@ -3898,13 +2930,12 @@ class KiemKhoApp:
             values[column_index] = new_value
             self.tong_hop_tree.item(item_id, values=values)
             
-            # Tìm index của item trong tree để map với tong_hop_data
-            all_items = list(self.tong_hop_tree.get_children())
-            if item_id in all_items:
-                data_index = all_items.index(item_id)
-                
-                # Cập nhật trong tong_hop_data theo index
-                if 0 <= data_index < len(self.tong_hop_data):
+            # iid là id bền của dòng: tra dòng trong O(1) qua tong_hop_rows (không tìm vị trí trong danh sách)
+            record = self.tong_hop_rows.get(item_id)
+            data_index = self.tong_hop_view.index_of(item_id)
+            if record is not None:
+                # Cập nhật trực tiếp trên dòng (cùng object với phần tử trong tong_hop_data)
+                if data_index is not None:
                     # Map column index sang tên cột trong data
                     column_mapping = {
                         3: 'Vị trí mới',
@@ -3916,15 +2947,18 @@ class KiemKhoApp:
                     
                     column_name = column_mapping.get(column_index)
                     if column_name:
-                        self.tong_hop_data[data_index][column_name] = new_value
+                        # Cập nhật chỉ mục: bỏ key cũ trước, thêm lại sau khi sửa (Vị trí mới là một key)
+                        self.tong_hop_index.remove(record)
+                        record[column_name] = new_value
+                        self.tong_hop_index.add(record)
                         
                         # Nếu là cột "Tồn thực tế" (column_index == 6), tự động check và cập nhật Tình trạng và Ghi chú
                         if column_index == 6:
                             self._check_and_update_tinh_trang_tong_hop(data_index, new_value, values, item_id)
                         
-                        # Lưu backup khi chỉnh sửa (gọi trực tiếp, không dùng after)
+                        # Ghi dòng đã sửa vào journal backup (gọi trực tiếp, không dùng after)
                         try:
-                            self.save_backup()
+                            self.journal_backup(OP_UPDATE_ROW, row_id=record[ROW_ID_KEY], row=record)
                         except Exception as backup_error:
                             # Không hiển thị lỗi cho người dùng, chỉ log
                             print(f"Error saving backup: {backup_error}")
@@ -3952,192 +2986,20 @@ class KiemKhoApp:
                 return
             
             data = self.tong_hop_data[data_index]
-            isbn = data.get('ISBN', '').strip()
-            so_thung = data.get('Số thùng', '').strip()
-            
-            if not isbn or not so_thung:
-                return
-            
-            # Tìm "Tồn tựa trong thùng" từ dữ liệu gốc (self.df)
-            ton_trong_thung = 0
-            if self.df is not None and not self.df.empty:
-                # Tìm trong df dựa trên ISBN và số thùng
-                isbn_clean = str(isbn).strip()
-                isbn_clean_digits = ''.join(filter(str.isdigit, isbn_clean))
-                
-                # Tìm cột số thùng và ISBN trong df
-                so_thung_col = None
-                isbn_col = None
-                ton_tung_tua_col = None
-                
-                for col in self.df.columns:
-                    col_lower = str(col).lower().strip()
-                    if ('số thùng' in col_lower or 'so thung' in col_lower or 
-                        col_lower == 'thùng' or col_lower == 'thung'):
-                        so_thung_col = col
-                    elif 'isbn' in col_lower:
-                        isbn_col = col
-                    elif (('tồn' in col_lower and 'tựa' in col_lower) or 
-                          ('ton' in col_lower and 'tua' in col_lower) or 
-                          'qty tựa trong thùng' in col_lower or 
-                          'qty tua trong thung' in col_lower):
-                        ton_tung_tua_col = col
-                
-                # Tìm dòng khớp với ISBN và số thùng
-                if so_thung_col and isbn_col and ton_tung_tua_col:
-                    matched_row = None
-                    for idx, row in self.df.iterrows():
-                        row_isbn = str(row.get(isbn_col, '')).strip()
-                        row_so_thung = str(row.get(so_thung_col, '')).strip()
-                        
-                        # So sánh ISBN (có thể không khớp hoàn toàn)
-                        row_isbn_digits = ''.join(filter(str.isdigit, row_isbn))
-                        isbn_match = (row_isbn == isbn_clean or 
-                                     row_isbn.endswith(isbn_clean) or 
-                                     isbn_clean.endswith(row_isbn) or
-                                     (row_isbn_digits and isbn_clean_digits and row_isbn_digits == isbn_clean_digits))
-                        
-                        # So sánh số thùng (không phân biệt chữ hoa/thường)
-                        row_so_thung_lower = row_so_thung.lower()
-                        so_thung_lower = so_thung.lower()
-                        so_thung_match = (row_so_thung_lower == so_thung_lower or 
-                                         row_so_thung_lower.endswith(so_thung_lower) or 
-                                         so_thung_lower.endswith(row_so_thung_lower))
-                        
-                        if isbn_match and so_thung_match:
-                            matched_row = row
-                            break
-                    
-                    if matched_row is not None:
-                        ton_trong_thung = matched_row.get(ton_tung_tua_col, 0)
-                        try:
-                            ton_trong_thung = int(float(ton_trong_thung)) if ton_trong_thung else 0
-                        except:
-                            ton_trong_thung = 0
-            
-            # Kiểm tra xem ISBN có tồn tại trong dữ liệu đầu vào không
-            isbn_not_in_input_data = False
-            if ton_trong_thung == 0:  # Nếu không tìm thấy trong box data
-                isbn_not_in_input_data = not self.is_isbn_in_input_data(isbn)
-            
-            # So sánh Tồn thực tế với Tồn tựa trong thùng
+            # Đối chiếu với Tồn tựa trong thùng từ dữ liệu gốc (session) - cập nhật 'Tình trạng'/'Ghi chú' của dòng
             try:
-                ton_thuc_te_num = float(ton_thuc_te_new) if ton_thuc_te_new else 0
-                ton_trong_thung_num = float(ton_trong_thung) if ton_trong_thung else 0
-                
-                # Đảm bảo values có đủ 11 cột (theo tonghop_columns)
-                while len(values) < 11:
-                    values.append('')
-                
-                # Nếu ISBN không tồn tại trong cả thùng và dữ liệu đầu vào, tự động đặt ton_trong_thung = ton_thuc_te và bỏ qua so sánh
-                if isbn_not_in_input_data and ton_thuc_te_num > 0:
-                    # Tự động đặt ton_trong_thung = ton_thuc_te (không cần cập nhật trong df vì đây là view tổng hợp)
-                    # Xóa tình trạng và ghi chú tự động (Thiếu/Dư) nếu có
-                    values[8] = ''  # Xóa tình trạng
-                    data['Tình trạng'] = ''
-                    
-                    # Xóa ghi chú tự động (Thiếu X cuốn/Dư X cuốn) nhưng giữ lại phần người dùng nhập
-                    ghi_chu_hien_tai = data.get('Ghi chú', '')
-                    if not ghi_chu_hien_tai:
-                        ghi_chu_hien_tai = values[9] if len(values) > 9 else ''
-                    
-                    if ghi_chu_hien_tai:
-                        import re
-                        # Xóa TẤT CẢ các pattern "Thiếu X cuốn" hoặc "Dư X cuốn"
-                        ghi_chu_cleaned = re.sub(r'(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_hien_tai, flags=re.IGNORECASE)
-                        ghi_chu_cleaned = re.sub(r'[,\.\s]*(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_cleaned, flags=re.IGNORECASE)
-                        values[9] = ghi_chu_cleaned.strip()
-                        data['Ghi chú'] = values[9]
-                    else:
-                        values[9] = ''
-                        data['Ghi chú'] = ''
-                    
-                    # Cập nhật tree
-                    self.tong_hop_tree.item(item_id, values=values)
-                    return  # Bỏ qua logic so sánh Thiếu/Dư
-                
-                if abs(ton_thuc_te_num - ton_trong_thung_num) > 0.01:
-                    # Có lệch - tự động cập nhật tình trạng và số lượng thiếu/dư vào Ghi chú
-                    if ton_thuc_te_num < ton_trong_thung_num:
-                        tinh_trang = "Thiếu"
-                        so_luong_lech = int(ton_trong_thung_num - ton_thuc_te_num)
-                        ghi_chu_auto = f"Thiếu {so_luong_lech} cuốn"
-                    else:
-                        tinh_trang = "Dư"
-                        so_luong_lech = int(ton_thuc_te_num - ton_trong_thung_num)
-                        ghi_chu_auto = f"Dư {so_luong_lech} cuốn"
-                    
-                    # Lấy giá trị Ghi chú hiện tại từ tong_hop_data (để giữ lại phần người dùng nhập)
-                    ghi_chu_hien_tai = data.get('Ghi chú', '')
-                    if not ghi_chu_hien_tai:
-                        # Nếu không có trong data, lấy từ values
-                        ghi_chu_hien_tai = values[9] if len(values) > 9 else ''
-                    
-                    # Tự động điền số lượng thiếu/dư vào ô Ghi chú
-                    # QUAN TRỌNG: Xóa TẤT CẢ các pattern lỗi cũ trước khi thêm lỗi mới
-                    import re
-                    if ghi_chu_hien_tai and ghi_chu_hien_tai.strip():
-                        # Xóa TẤT CẢ các pattern "Thiếu X cuốn" hoặc "Dư X cuốn" và các dấu câu/khoảng trắng sau đó
-                        ghi_chu_cleaned = re.sub(r'(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_hien_tai, flags=re.IGNORECASE)
-                        ghi_chu_cleaned = re.sub(r'\.\s*\.', '.', ghi_chu_cleaned)  # Xóa dấu chấm kép
-                        ghi_chu_cleaned = ghi_chu_cleaned.strip()
-                        
-                        # Thêm thông tin thiếu/dư mới vào đầu
-                        if ghi_chu_cleaned:
-                            ghi_chu_moi = f"{ghi_chu_auto}. {ghi_chu_cleaned}"
-                        else:
-                            ghi_chu_moi = ghi_chu_auto
-                    else:
-                        # Chưa có nội dung, điền mới
-                        ghi_chu_moi = ghi_chu_auto
-                    
-                    values[8] = tinh_trang  # Tình trạng ở index 8
-                    values[9] = ghi_chu_moi  # Ghi chú mới
-                    
-                    # Cập nhật tong_hop_data
-                    self.tong_hop_data[data_index]['Tình trạng'] = tinh_trang
-                    self.tong_hop_data[data_index]['Ghi chú'] = ghi_chu_moi
-                    
-                    # Cập nhật tree
-                    if item_id:
-                        self.tong_hop_tree.item(item_id, values=values)
-                else:
-                    # Đã khớp - xóa tình trạng
-                    # Xóa thông tin thiếu/dư khỏi Ghi chú (nếu có) nhưng giữ lại phần người dùng nhập
-                    # Lấy giá trị Ghi chú hiện tại từ tong_hop_data (để giữ lại phần người dùng nhập)
-                    ghi_chu_hien_tai = data.get('Ghi chú', '')
-                    if not ghi_chu_hien_tai:
-                        # Nếu không có trong data, lấy từ values
-                        ghi_chu_hien_tai = values[9] if len(values) > 9 else ''
-                    
-                    # Xóa thông tin thiếu/dư tự động khỏi Ghi chú (nếu có)
-                    if ghi_chu_hien_tai:
-                        # Loại bỏ các pattern như "Thiếu X cuốn" hoặc "Dư X cuốn" và các dấu câu/khoảng trắng sau đó
-                        import re
-                        ghi_chu_cleaned = re.sub(r'^(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_hien_tai, flags=re.IGNORECASE)
-                        ghi_chu_cleaned = re.sub(r'[,\.\s]*(Thiếu \d+ cuốn|Dư \d+ cuốn)[,\.\s]*', '', ghi_chu_cleaned, flags=re.IGNORECASE)
-                        ghi_chu_cleaned = ghi_chu_cleaned.strip()
-                    else:
-                        ghi_chu_cleaned = ''
-                    
-                    values[8] = ''  # Xóa tình trạng
-                    values[9] = ghi_chu_cleaned  # Ghi chú đã làm sạch
-                    
-                    # Cập nhật tong_hop_data
-                    self.tong_hop_data[data_index]['Tình trạng'] = ''
-                    self.tong_hop_data[data_index]['Ghi chú'] = ghi_chu_cleaned
-                    
-                    # Cập nhật tree
-                    if item_id:
-                        self.tong_hop_tree.item(item_id, values=values)
+                updated = self.session.recheck_tong_hop_record(data, ton_thuc_te_new)
             except Exception as e:
                 # Nếu có lỗi khi so sánh, không làm gì cả
                 print(f"Lỗi khi check tình trạng: {str(e)}")
-                pass
+                return
+            
+            # Cập nhật tree
+            if updated and item_id:
+                self.tong_hop_tree.item(item_id, values=self._tong_hop_row_values(data))
         except Exception as e:
             # Nếu có lỗi, không làm gì cả
             print(f"Lỗi khi check và update tình trạng: {str(e)}")
-            pass
     
     def cancel_tong_hop_edit(self):
         """Hủy việc chỉnh sửa trong tab Tổng hợp"""
@@ -4163,41 +3025,36 @@ class KiemKhoApp:
     
     def on_tong_hop_delete(self, event):
         """Xóa dòng được chọn trong tab Tổng hợp"""
-        selected_items = self.tong_hop_tree.selection()
-        if not selected_items:
+        # Virtual list giữ cả các dòng đã chọn nhưng đã cuộn khỏi màn hình
+        selected_indices = self.tong_hop_view.selected_indices()
+        if not selected_indices:
             return
         
         # Xác nhận xóa
-        result = messagebox.askyesno("Xác nhận", f"Bạn có chắc chắn muốn xóa {len(selected_items)} dòng đã chọn?")
+        result = messagebox.askyesno("Xác nhận", f"Bạn có chắc chắn muốn xóa {len(selected_indices)} dòng đã chọn?")
         if not result:
             return
         
         try:
-            # Lấy tất cả items trong tree theo thứ tự
-            all_items = list(self.tong_hop_tree.get_children())
-            
-            # Tìm index của các items được chọn
-            selected_indices = []
-            for item_id in selected_items:
-                if item_id in all_items:
-                    selected_indices.append(all_items.index(item_id))
-            
-            # Sắp xếp theo thứ tự ngược lại để xóa từ cuối lên (tránh lỗi index)
-            selected_indices.sort(reverse=True)
-            
-            # Xóa từ tong_hop_data trước (theo index)
+            # Lấy id bền của các dòng được chọn
+            row_ids = set()
             for idx in selected_indices:
                 if 0 <= idx < len(self.tong_hop_data):
-                    del self.tong_hop_data[idx]
+                    record = self.tong_hop_data[idx]
+                    row_ids.add(record[ROW_ID_KEY])
+                    self.tong_hop_index.remove(record)
+                    self.tong_hop_rows.remove(record[ROW_ID_KEY])
             
-            # Xóa khỏi tree
-            for item_id in selected_items:
-                self.tong_hop_tree.delete(item_id)
+            # Xóa tất cả trong một lần duyệt (giữ nguyên object list - bảng đang tham chiếu)
+            self.tong_hop_data[:] = [data for data in self.tong_hop_data if data[ROW_ID_KEY] not in row_ids]
             
-            # Lưu backup sau khi xóa
-            self.save_backup()
+            # Cập nhật bảng: dời chỉ số các dòng phía sau, chỉ vẽ lại nếu vùng nhìn thấy bị ảnh hưởng
+            self.tong_hop_view.rows_removed(selected_indices)
+            
+            # Ghi thao tác xóa vào journal backup
+            self.journal_backup(OP_DELETE_ROWS, row_ids=sorted(row_ids))
             
-            messagebox.showinfo("Thành công", f"Đã xóa {len(selected_items)} dòng!")
+            self.notify(NOTIFY_SUCCESS, f"Đã xóa {len(selected_indices)} dòng!")
             
         except Exception as e:
             messagebox.showerror("Lỗi", f"Không thể xóa dòng: {str(e)}")
@@ -4212,164 +3069,61 @@ class KiemKhoApp:
         if not search_isbn:
             return
         
-        # Lấy tất cả items trong tree
-        all_items = list(self.tong_hop_tree.get_children())
+        # Tìm trực tiếp trên dữ liệu của virtual list (tree chỉ chứa các dòng đang nhìn thấy)
+        all_rows = self.tong_hop_view.rows
         
-        if not all_items:
-            messagebox.showinfo("Thông báo", "Không có dữ liệu trong bảng tổng hợp!")
+        if not all_rows:
+            self.notify(NOTIFY_INFO, "Không có dữ liệu trong bảng tổng hợp!")
             return
         
-        # Lấy item hiện tại được chọn (nếu có)
-        current_selection = self.tong_hop_tree.selection()
+        # Lấy dòng hiện tại được chọn (nếu có)
         start_index = 0
         
-        # Nếu đang có item được chọn, tìm từ item tiếp theo
+        # Nếu đang có dòng được chọn, tìm từ dòng tiếp theo
+        current_selection = self.tong_hop_view.selected_indices()
         if current_selection:
-            try:
-                current_item = current_selection[0]
-                if current_item in all_items:
-                    current_index = all_items.index(current_item)
-                    start_index = current_index + 1
-            except:
-                pass
+            start_index = current_selection[0] + 1
         
-        # Chuẩn hóa ISBN để tìm kiếm
-        search_isbn_clean = str(search_isbn).strip()
-        search_isbn_digits = ''.join(filter(str.isdigit, search_isbn_clean))
+        # So khớp theo key ISBN chuẩn (ISBN-10 và ISBN-13 của cùng một cuốn sách là như nhau)
+        search_key = isbn_key(search_isbn)
         
-        # Tìm từ vị trí start_index
-        found_item = None
-        for i in range(start_index, len(all_items)):
-            item_id = all_items[i]
-            values = list(self.tong_hop_tree.item(item_id, 'values'))
-            
-            # ISBN ở cột index 4
-            if len(values) > 4:
-                isbn_value = str(values[4]).strip()
-                isbn_value_digits = ''.join(filter(str.isdigit, isbn_value))
-                
-                # So sánh ISBN
-                if (isbn_value == search_isbn_clean or 
-                    isbn_value.endswith(search_isbn_clean) or 
-                    search_isbn_clean.endswith(isbn_value) or
-                    (isbn_value_digits and search_isbn_digits and isbn_value_digits == search_isbn_digits)):
-                    found_item = item_id
-                    break
+        def isbn_matches(index):
+            return record_isbn_key(all_rows[index]) == search_key
         
-        # Nếu không tìm thấy từ start_index, tìm từ đầu
-        if not found_item:
-            for i in range(0, min(start_index, len(all_items))):
-                item_id = all_items[i]
-                values = list(self.tong_hop_tree.item(item_id, 'values'))
-                
-                if len(values) > 4:
-                    isbn_value = str(values[4]).strip()
-                    isbn_value_digits = ''.join(filter(str.isdigit, isbn_value))
-                    
-                    if (isbn_value == search_isbn_clean or 
-                        isbn_value.endswith(search_isbn_clean) or 
-                        search_isbn_clean.endswith(isbn_value) or
-                        (isbn_value_digits and search_isbn_digits and isbn_value_digits == search_isbn_digits)):
-                        found_item = item_id
-                        break
+        # Tìm từ vị trí start_index, nếu không thấy thì tìm lại từ đầu
+        found_index = None
+        for i in list(range(start_index, len(all_rows))) + list(range(0, min(start_index, len(all_rows)))):
+            if isbn_matches(i):
+                found_index = i
+                break
         
-        if found_item:
-            # Xóa highlight cũ trước
-            for item in self.tong_hop_tree.get_children():
-                tags = list(self.tong_hop_tree.item(item, 'tags'))
-                if 'search_highlight' in tags:
-                    tags.remove('search_highlight')
-                    self.tong_hop_tree.item(item, tags=tags)
-            
-            # Highlight dòng tìm thấy
-            current_tags = list(self.tong_hop_tree.item(found_item, 'tags'))
-            if 'search_highlight' not in current_tags:
-                current_tags.append('search_highlight')
-            self.tong_hop_tree.item(found_item, tags=current_tags)
-            
-            # Scroll đến item và chọn nó
-            self.tong_hop_tree.selection_set(found_item)
-            self.tong_hop_tree.focus(found_item)
-            self.tong_hop_tree.see(found_item)
+        if found_index is not None:
+            # Highlight dòng tìm thấy (bỏ highlight cũ), scroll đến dòng và chọn nó
+            self.tong_hop_view.set_highlight(found_index)
+            self.tong_hop_view.select(found_index)
             
             # Focus vào tree để có thể chỉnh sửa ngay (double-click vào cột để edit)
             self.tong_hop_tree.focus()
         else:
             # Xóa highlight cũ nếu không tìm thấy
-            for item in self.tong_hop_tree.get_children():
-                tags = list(self.tong_hop_tree.item(item, 'tags'))
-                if 'search_highlight' in tags:
-                    tags.remove('search_highlight')
-                    self.tong_hop_tree.item(item, tags=tags)
+            self.tong_hop_view.set_highlight(None)
             
             # Tìm lại từ đầu nếu không tìm thấy
-            messagebox.showinfo("Thông báo", f"Không tìm thấy ISBN: {search_isbn}")
+            self.notify(NOTIFY_INFO, f"Không tìm thấy ISBN: {search_isbn}")
             # Xóa selection để có thể tìm lại từ đầu lần sau
-            self.tong_hop_tree.selection_set([])
+            self.tong_hop_view.clear_selection()
     
     def on_tong_hop_search_keyrelease(self, event=None):
         """Tự động tìm kiếm khi gõ trong ô tìm kiếm (tùy chọn - có thể bỏ qua)"""
         # Có thể thêm logic tự động tìm kiếm khi gõ nếu muốn
         pass
     
-    def update_excel_file_metadata(self, file_path):
-        """
-        Cập nhật metadata của file Excel (timestamps và properties) thành ngày hiện tại
-        Để khi người dùng xem Properties của file sẽ thấy ngày tải về thay vì ngày từ file gốc
-        """
-        try:
-            file_path_obj = Path(file_path)
-            if not file_path_obj.exists():
-                return
-            
-            # 1. Cập nhật file system timestamps (created, modified) thành thời điểm hiện tại
-            current_time = time.time()
-            os.utime(str(file_path_obj), (current_time, current_time))
-            
-            # 2. Cập nhật Excel file properties (metadata bên trong file)
-            try:
-                from openpyxl import load_workbook
-                from datetime import datetime
-                
-                wb = load_workbook(str(file_path_obj))
-                
-                # Cập nhật các properties thành ngày hiện tại
-                now = datetime.now()
-                wb.properties.created = now
-                wb.properties.modified = now
-                wb.properties.lastModifiedBy = os.getenv('USERNAME', os.getenv('USER', 'User'))
-                
-                # Lưu lại file với properties mới
-                wb.save(str(file_path_obj))
-                wb.close()
-            except Exception as excel_prop_error:
-                # Nếu không thể cập nhật Excel properties, chỉ log và tiếp tục
-                # File system timestamps đã được cập nhật ở trên
-                print(f"Không thể cập nhật Excel properties (không ảnh hưởng): {str(excel_prop_error)}")
-                
-        except Exception as e:
-            # Log lỗi nhưng không chặn quá trình save
-            print(f"Lỗi khi cập nhật metadata file: {str(e)}")
-            traceback.print_exc()
-    
     def export_tong_hop_excel(self):
         """Xuất file Excel tổng hợp (logic giống save_data cũ)"""
         if not self.tong_hop_data:
-            messagebox.showwarning("Cảnh báo", "Chưa có dữ liệu tổng hợp để xuất!")
+            self.notify(NOTIFY_WARNING, "Chưa có dữ liệu tổng hợp để xuất!")
             return
         
-        # Sử dụng pandas đã được import trong __init__
-        if self.pd is None:
-            try:
-                import pandas as pd
-                self.pd = pd
-            except ImportError:
-                messagebox.showerror("Lỗi", "Không thể import pandas! Vui lòng cài đặt: pip install pandas")
-                return
-        
-        pd = self.pd  # Alias để dùng trong hàm này
-        df_save = pd.DataFrame(self.tong_hop_data)
-        
         # Tạo tên file theo format
         from datetime import datetime
         ngay_hien_tai = datetime.now().strftime("%d/%m/%Y")
@@ -4413,163 +3167,143 @@ class KiemKhoApp:
             # Người dùng đã hủy
             return
         
-        # Lưu file vào đường dẫn đã chọn
+        # QUAN TRỌNG: Lưu backup trước khi save để tránh mất dữ liệu nếu có lỗi
         try:
-            # QUAN TRỌNG: Lưu backup trước khi save để tránh mất dữ liệu nếu có lỗi
+            self.save_backup()
+        except Exception as backup_err:
+            # Log lỗi nhưng không chặn quá trình save
+            print(f"Lỗi khi lưu backup trước khi save: {str(backup_err)}")
+        
+        # Chụp bản sao dữ liệu (bất biến) để thread nền ghi file trong khi vẫn tiếp tục quét
+        rows_snapshot = self.session.export_rows()
+        # File 2: Tự động lưu vào thư mục đã cấu hình (nếu có) - Windows-safe
+        file2_path = str(Path(self.auto_save_folder) / ten_file_2) if self.auto_save_folder else None
+        if file2_path:
+            self.exported_files.add(file2_path)
+        
+        # Với dữ liệu lớn (>5000 dòng), hiển thị progress (không modal để vẫn quét được)
+        progress_window = None
+        progress_bar = None
+        total_rows = len(rows_snapshot)
+        if file2_path and total_rows > 5000:
             try:
-                self.save_backup()
-            except Exception as backup_err:
-                # Log lỗi nhưng không chặn quá trình save
-                print(f"Lỗi khi lưu backup trước khi save: {str(backup_err)}")
-            
-            # Normalize path cho Windows
-            filename = str(Path(filename).resolve())
-            template_path_normalized = str(Path(self.template_file_path).resolve())
-            
-            # File 1: Chỉ copy file template từ đường dẫn đã cấu hình và đổi tên (KHÔNG ghi đè data)
-            # Windows-specific: Retry nếu file bị lock
-            max_retries = 5
-            retry_count = 0
-            copy_success = False
-            
-            while retry_count < max_retries and not copy_success:
+                progress_window = tk.Toplevel(self.root)
+                progress_window.title("Đang lưu file...")
+                progress_window.geometry("400x100")
+                progress_window.resizable(False, False)
+                progress_window.transient(self.root)
+                progress_window.configure(bg='#f5f5f5')
+                
+                # Đặt ở giữa màn hình
+                progress_window.update_idletasks()
+                x = (progress_window.winfo_screenwidth() // 2) - (400 // 2)
+                y = (progress_window.winfo_screenheight() // 2) - (100 // 2)
+                progress_window.geometry(f"400x100+{x}+{y}")
+                
+                label = tk.Label(progress_window, text=f"Đang lưu {total_rows:,} dòng dữ liệu...", 
+                               font=('Arial', 11), bg='#f5f5f5')
+                label.pack(pady=10)
+                
+                progress_bar = ttk.Progressbar(progress_window, mode='indeterminate', length=350)
+                progress_bar.pack(pady=5)
+                progress_bar.start()
+            except Exception as e:
+                print(f"Không thể hiển thị progress: {str(e)}")
+                progress_window = None
+        
+        def close_progress():
+            if progress_window:
                 try:
-                    shutil.copy2(template_path_normalized, filename)
-                    # Cập nhật metadata file thành ngày hiện tại (để hiển thị ngày tải về)
-                    self.update_excel_file_metadata(filename)
-                    copy_success = True
-                except PermissionError as pe:
-                    retry_count += 1
-                    if retry_count < max_retries:
-                        time.sleep(0.5)  # Đợi 0.5 giây trước khi thử lại
-                    else:
-                        messagebox.showerror("Lỗi", 
-                            f"Không thể copy file template!\n\n"
+                    progress_bar.stop()
+                    progress_window.destroy()
+                except:
+                    pass
+        
+        def on_export_done(error_message):
+            # Chạy trên main thread (root.after) khi thread nền ghi xong
+            close_progress()
+            if error_message:
+                messagebox.showerror("Lỗi", error_message)
+            else:
+                self.notify(NOTIFY_SUCCESS, "Đã lưu file tổng hợp thành công!")
+        
+        def on_export_error(error):
+            close_progress()
+            messagebox.showerror("Lỗi", f"Không thể lưu file: {str(error)}")
+        
+        # Ghi file ở thread nền - không chặn mainloop (retry khi file bị lock không làm đứng giao diện)
+        self.export_worker.submit(self._write_export_files, filename, self.template_file_path,
+                                  file2_path, rows_snapshot,
+                                  on_done=on_export_done, on_error=on_export_error)
+    
+    @timed('export_tong_hop_excel')
+    def _write_export_files(self, filename, template_file_path, file2_path, rows_snapshot):
+        """Ghi file Excel tổng hợp (chạy trên thread ghi nền), trả về thông báo lỗi cho người dùng hoặc None"""
+        # Normalize path cho Windows
+        filename = str(Path(filename).resolve())
+        template_path_normalized = str(Path(template_file_path).resolve())
+        
+        # File 1: Chỉ copy file template từ đường dẫn đã cấu hình và đổi tên (KHÔNG ghi đè data)
+        # Windows-specific: Retry nếu file bị lock
+        max_retries = 5
+        retry_count = 0
+        copy_success = False
+        
+        while retry_count < max_retries and not copy_success:
+            try:
+                # Copy template và đặt properties thành ngày hiện tại (để hiển thị ngày tải về)
+                copy_with_properties(template_path_normalized, filename)
+                copy_success = True
+            except PermissionError as pe:
+                retry_count += 1
+                if retry_count < max_retries:
+                    time.sleep(0.5)  # Đợi 0.5 giây trước khi thử lại (trên thread nền)
+                else:
+                    return (f"Không thể copy file template!\n\n"
                             f"File có thể đang được mở trong Excel hoặc chương trình khác.\n"
                             f"Vui lòng đóng file và thử lại.\n\n"
                             f"Lỗi: {str(pe)}")
-                        return
-                except Exception as e:
-                    messagebox.showerror("Lỗi", f"Không thể copy file template: {str(e)}")
-                    traceback.print_exc()
-                    return
-            
-            # KHÔNG ghi đè dữ liệu vào file 1 - giữ nguyên data từ template
-            
-            # File 2: Tự động lưu vào thư mục đã cấu hình (nếu có)
-            if self.auto_save_folder:
-                try:
-                    # Tạo đường dẫn file 2 với tên file đúng format - Windows-safe
-                    file2_path = str(Path(self.auto_save_folder) / ten_file_2)
-                    
-                    # Windows-specific: Retry nếu file bị lock
-                    max_retries = 5
-                    retry_count = 0
-                    save_success = False
-                    
-                    # Với dữ liệu lớn (>5000 dòng), hiển thị progress bar
-                    total_rows = len(df_save)
-                    show_progress = total_rows > 5000
-                    progress_window = None
-                    progress_bar = None
-                    
-                    if show_progress:
-                        # Tạo progress window
-                        progress_window = tk.Toplevel(self.root)
-                        progress_window.title("Đang lưu file...")
-                        progress_window.geometry("400x100")
-                        progress_window.resizable(False, False)
-                        progress_window.transient(self.root)
-                        progress_window.grab_set()
-                        progress_window.configure(bg='#f5f5f5')
-                        
-                        # Đặt ở giữa màn hình
-                        progress_window.update_idletasks()
-                        x = (progress_window.winfo_screenwidth() // 2) - (400 // 2)
-                        y = (progress_window.winfo_screenheight() // 2) - (100 // 2)
-                        progress_window.geometry(f"400x100+{x}+{y}")
-                        
-                        # Label
-                        label = tk.Label(progress_window, text=f"Đang lưu {total_rows:,} dòng dữ liệu...", 
-                                       font=('Arial', 11), bg='#f5f5f5')
-                        label.pack(pady=10)
-                        
-                        # Progress bar
-                        progress_bar = ttk.Progressbar(progress_window, mode='indeterminate', length=350)
-                        progress_bar.pack(pady=5)
-                        progress_bar.start()
-                        
-                        progress_window.update()
-                    
-                    while retry_count < max_retries and not save_success:
-                        try:
-                            # Lưu vào file tạm trước (atomic operation để tránh mất dữ liệu nếu crash)
-                            # Sử dụng .xlsx extension vì pandas yêu cầu extension hợp lệ cho openpyxl engine
-                            temp_file = Path(file2_path).with_name(Path(file2_path).stem + '_temp.xlsx')
-                            
-                            # Lưu file tạm với data tổng hợp
-                            df_save.to_excel(str(temp_file), index=False, engine='openpyxl')
-                            
-                            # Nếu file cũ tồn tại, xóa nó trước
-                            if Path(file2_path).exists():
-                                try:
-                                    Path(file2_path).unlink()
-                                except:
-                                    pass
-                            
-                            # Rename file tạm thành file chính (atomic operation)
-                            temp_file.rename(file2_path)
-                            
-                            # Cập nhật metadata file thành ngày hiện tại (để hiển thị ngày tải về)
-                            self.update_excel_file_metadata(file2_path)
-                            
-                            save_success = True
-                        except PermissionError as pe:
-                            retry_count += 1
-                            if retry_count < max_retries:
-                                time.sleep(0.5)  # Đợi 0.5 giây trước khi thử lại
-                            else:
-                                # Log lỗi nhưng không hiển thị cho người dùng
-                                print(f"Lỗi khi lưu file tự động (file có thể đang mở): {str(pe)}")
-                                traceback.print_exc()
-                                break
-                        except Exception as e2:
+            except Exception as e:
+                traceback.print_exc()
+                return f"Không thể copy file template: {str(e)}"
+        
+        # KHÔNG ghi đè dữ liệu vào file 1 - giữ nguyên data từ template
+        
+        # File 2: Tự động lưu vào thư mục đã cấu hình (nếu có)
+        if file2_path:
+            try:
+                # Windows-specific: Retry nếu file bị lock
+                max_retries = 5
+                retry_count = 0
+                save_success = False
+                
+                while retry_count < max_retries and not save_success:
+                    try:
+                        # Chỉ ghi phần thay đổi từ lần xuất trước (file phần trong thư mục _parts),
+                        # file chính được ghi lại toàn bộ ở lần đầu và khi gộp các file phần
+                        export_incremental(file2_path, rows_snapshot)
+                        save_success = True
+                    except PermissionError as pe:
+                        retry_count += 1
+                        if retry_count < max_retries:
+                            time.sleep(0.5)  # Đợi 0.5 giây trước khi thử lại
+                        else:
                             # Log lỗi nhưng không hiển thị cho người dùng
-                            print(f"Lỗi khi lưu file tự động: {str(e2)}")
+                            print(f"Lỗi khi lưu file tự động (file có thể đang mở): {str(pe)}")
                             traceback.print_exc()
                             break
-                        finally:
-                            # Xóa file tạm nếu còn tồn tại (nếu có lỗi)
-                            if 'temp_file' in locals() and temp_file.exists():
-                                try:
-                                    temp_file.unlink()
-                                except:
-                                    pass
-                    
-                    # Đóng progress window nếu có
-                    if progress_window:
-                        try:
-                            progress_bar.stop()
-                            progress_window.destroy()
-                        except:
-                            pass
-                    
-                    # Hiển thị thông báo thành công
-                    messagebox.showinfo("Thành công", f"Đã lưu file tổng hợp thành công!")
-                except Exception as e2:
-                    # Nếu lỗi khi lưu file 2, chỉ log lỗi nhưng không hiển thị cho người dùng
-                    print(f"Lỗi khi lưu file tự động: {str(e2)}")
-                    traceback.print_exc()
-                    # Vẫn hiển thị thành công cho file 1
-                    messagebox.showinfo("Thành công", f"Đã lưu file tổng hợp thành công!")
-            else:
-                # Không có thư mục tự động, chỉ lưu file 1
-                messagebox.showinfo("Thành công", f"Đã lưu file tổng hợp thành công!")
+                    except Exception as e2:
+                        # Log lỗi nhưng không hiển thị cho người dùng
+                        print(f"Lỗi khi lưu file tự động: {str(e2)}")
+                        traceback.print_exc()
+                        break
                 
-        except Exception as e:
-            error_msg = str(e)
-            traceback.print_exc()
-            messagebox.showerror("Lỗi", f"Không thể lưu file: {error_msg}")
+            except Exception as e2:
+                # Nếu lỗi khi lưu file 2, chỉ log lỗi nhưng không hiển thị cho người dùng
+                print(f"Lỗi khi lưu file tự động: {str(e2)}")
+                traceback.print_exc()
+        
+        return None
     
     def _get_backup_file_path_init(self):
         """Lấy đường dẫn file backup khi khởi tạo - chỉ gọi một lần"""
@@ -4595,76 +3329,133 @@ class KiemKhoApp:
             # Fallback nếu chưa có (không nên xảy ra)
             return Path.cwd() / "kiem_kho_backup.json"
     
+    def _take_backup_snapshot(self):
+        """Chụp bản sao dữ liệu backup trên main thread (bất biến) để ghi ở thread nền"""
+        # Copy từng dòng vì các dòng có thể bị sửa tại chỗ trong khi thread nền đang ghi
+        return {
+            'scanned_items': {isbn: dict(info) for isbn, info in self.scanned_items.items()},
+            'tong_hop_data': [data.to_dict() for data in self.tong_hop_data],
+            'current_box_number': self.current_box_number,
+            'timestamp': time.time(),
+            # journal_id gắn snapshot với journal đi kèm (journal cũ có id khác sẽ bị bỏ qua khi khôi phục)
+            'journal_id': new_journal_id()
+        }
+    
+    @timed('save_backup')
     def save_backup(self):
-        """Tự động lưu backup dữ liệu (scanned_items và tong_hop_data) - tối ưu cho dữ liệu lớn"""
+        """Lưu snapshot backup đầy đủ (scanned_items và tong_hop_data) ở thread ghi nền và bắt đầu journal mới"""
         try:
-            backup_file = self.get_backup_file_path()
-            backup_data = {
-                'scanned_items': self.scanned_items,
-                'tong_hop_data': self.tong_hop_data,
-                'current_box_number': self.current_box_number,
-                'timestamp': time.time()
-            }
-            
-            # Kiểm tra kích thước dữ liệu
-            data_size = len(self.tong_hop_data)
-            
-            # Với dữ liệu lớn (>10000 dòng), tối ưu cách lưu
-            if data_size > 10000:
-                # Giảm indent để file nhỏ hơn và nhanh hơn
-                indent_value = None  # Không indent cho dữ liệu lớn để tăng tốc
-            else:
-                indent_value = 2  # Indent bình thường cho dữ liệu nhỏ
-            
-            # Lưu vào file tạm trước, sau đó rename để tránh mất dữ liệu khi crash
-            temp_file = backup_file.with_suffix('.tmp')
-            
-            # Với dữ liệu cực lớn, sử dụng buffering lớn hơn
-            if data_size > 50000:
-                # Sử dụng buffer lớn hơn cho dữ liệu cực lớn
-                buffer_size = 65536  # 64KB buffer
-            else:
-                buffer_size = 8192   # 8KB buffer mặc định
-            
+            backup_data = self._take_backup_snapshot()
+            # Snapshot mới đã bao gồm mọi thay đổi trước đó -> bỏ các tác vụ backup đang chờ
+            self.backup_worker.cancel_pending()
+            self._backup_journal.begin(backup_data['journal_id'])
+            self.backup_worker.submit(self._write_backup_snapshot, backup_data, key='snapshot')
+        except Exception as e:
+            # Không hiển thị lỗi cho người dùng vì đây là auto-save
+            print(f"Lỗi khi lưu backup: {str(e)}")
+            traceback.print_exc()
+    
+    def save_backup_now(self):
+        """Lưu snapshot backup ngay trên thread hiện tại (khi đóng phần mềm, signal, atexit)"""
+        if hasattr(self, 'backup_worker'):
+            self.backup_worker.cancel_pending()
+        backup_data = self._take_backup_snapshot()
+        self._backup_journal.begin(backup_data['journal_id'])
+        self._write_backup_snapshot(backup_data)
+    
+    @timed('save_backup_write')
+    def _write_backup_snapshot(self, backup_data):
+        """Ghi snapshot backup ra file (chạy trên thread ghi nền) - tối ưu cho dữ liệu lớn"""
+        backup_file = self.get_backup_file_path()
+        # Lock để không ghi chồng giữa thread nền và lần lưu đồng bộ khi thoát
+        with self._backup_journal.lock:
             try:
-                with open(temp_file, 'w', encoding='utf-8', buffering=buffer_size) as f:
-                    json.dump(backup_data, f, ensure_ascii=False, indent=indent_value)
-            except MemoryError:
-                # Nếu không đủ memory, thử lưu không indent
-                print(f"Cảnh báo: Không đủ bộ nhớ, đang lưu backup không indent...")
-                with open(temp_file, 'w', encoding='utf-8', buffering=buffer_size) as f:
-                    json.dump(backup_data, f, ensure_ascii=False, indent=None)
-            except Exception as e:
-                # Thử lại với cách đơn giản hơn
-                print(f"Lỗi khi lưu backup, thử lại không indent: {str(e)}")
-                with open(temp_file, 'w', encoding='utf-8') as f:
-                    json.dump(backup_data, f, ensure_ascii=False, indent=None)
-            
-            # Rename file tạm thành file chính (atomic operation)
-            if backup_file.exists():
+                # Kiểm tra kích thước dữ liệu
+                data_size = len(backup_data['tong_hop_data'])
+                
+                # Với dữ liệu lớn (>10000 dòng), tối ưu cách lưu
+                if data_size > 10000:
+                    # Giảm indent để file nhỏ hơn và nhanh hơn
+                    indent_value = None  # Không indent cho dữ liệu lớn để tăng tốc
+                else:
+                    indent_value = 2  # Indent bình thường cho dữ liệu nhỏ
+                
+                # Lưu vào file tạm trước, sau đó rename để tránh mất dữ liệu khi crash
+                temp_file = backup_file.with_suffix('.tmp')
+                
+                # Với dữ liệu cực lớn, sử dụng buffering lớn hơn
+                if data_size > 50000:
+                    # Sử dụng buffer lớn hơn cho dữ liệu cực lớn
+                    buffer_size = 65536  # 64KB buffer
+                else:
+                    buffer_size = 8192   # 8KB buffer mặc định
+                
                 try:
-                    backup_file.unlink()
+                    with open(temp_file, 'w', encoding='utf-8', buffering=buffer_size) as f:
+                        json.dump(backup_data, f, ensure_ascii=False, indent=indent_value)
+                except MemoryError:
+                    # Nếu không đủ memory, thử lưu không indent
+                    print(f"Cảnh báo: Không đủ bộ nhớ, đang lưu backup không indent...")
+                    with open(temp_file, 'w', encoding='utf-8', buffering=buffer_size) as f:
+                        json.dump(backup_data, f, ensure_ascii=False, indent=None)
                 except Exception as e:
-                    # Nếu không xóa được file cũ, thử đổi tên file cũ
-                    print(f"Không thể xóa file backup cũ: {str(e)}")
-                    old_backup = backup_file.with_suffix('.old')
+                    # Thử lại với cách đơn giản hơn
+                    print(f"Lỗi khi lưu backup, thử lại không indent: {str(e)}")
+                    with open(temp_file, 'w', encoding='utf-8') as f:
+                        json.dump(backup_data, f, ensure_ascii=False, indent=None)
+                
+                # Rename file tạm thành file chính (atomic operation)
+                if backup_file.exists():
                     try:
-                        if old_backup.exists():
-                            old_backup.unlink()
-                        backup_file.rename(old_backup)
-                    except:
-                        pass  # Bỏ qua nếu vẫn lỗi
-            
-            temp_file.rename(backup_file)
-            
-        except MemoryError:
-            # Xử lý lỗi memory riêng
-            print(f"Lỗi: Không đủ bộ nhớ để lưu backup ({len(self.tong_hop_data)} dòng)")
+                        backup_file.unlink()
+                    except Exception as e:
+                        # Nếu không xóa được file cũ, thử đổi tên file cũ
+                        print(f"Không thể xóa file backup cũ: {str(e)}")
+                        old_backup = backup_file.with_suffix('.old')
+                        try:
+                            if old_backup.exists():
+                                old_backup.unlink()
+                            backup_file.rename(old_backup)
+                        except:
+                            pass  # Bỏ qua nếu vẫn lỗi
+                
+                temp_file.rename(backup_file)
+                
+                # Snapshot đã chứa toàn bộ dữ liệu -> bắt đầu journal mới (rỗng)
+                self._backup_journal.reset(backup_data['journal_id'])
+                
+            except MemoryError:
+                # Xử lý lỗi memory riêng
+                self._backup_journal.failed = True
+                print(f"Lỗi: Không đủ bộ nhớ để lưu backup ({len(backup_data['tong_hop_data'])} dòng)")
+            except Exception as e:
+                # Không hiển thị lỗi cho người dùng vì đây là auto-save
+                # Đánh dấu lỗi để lần ghi journal tiếp theo sẽ ghi lại snapshot
+                self._backup_journal.failed = True
+                print(f"Lỗi khi lưu backup: {str(e)}")
+                traceback.print_exc()
+    
+    def journal_backup(self, op, coalesce_key=None, **payload):
+        """Ghi một thao tác vào journal backup (append-only) thay vì ghi lại toàn bộ file backup"""
+        try:
+            if not self._backup_journal.is_active or self._backup_journal.needs_compaction():
+                # Chưa có snapshot trong phiên này hoặc journal đã lớn -> gộp thành snapshot mới
+                self.save_backup()
+                return
+            # Chuyển thành dòng JSON ngay trên main thread (bất biến), thread nền chỉ ghi ra file
+            journal_id = self._backup_journal.journal_id
+            line = self._backup_journal.make_line(op, payload)
+            self.backup_worker.submit(self._backup_journal.write_line, journal_id, line, key=coalesce_key)
         except Exception as e:
-            # Không hiển thị lỗi cho người dùng vì đây là auto-save
-            print(f"Lỗi khi lưu backup: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            # Nếu không ghi được journal, lưu snapshot đầy đủ để không mất dữ liệu
+            print(f"Lỗi khi ghi journal backup: {str(e)}")
+            self.save_backup()
+    
+    def journal_scan_state(self):
+        """Ghi trạng thái đang quét (scanned_items của thùng hiện tại) vào journal backup"""
+        # coalesce_key: nhiều lần ghi trạng thái đang chờ chỉ giữ lần mới nhất
+        self.journal_backup(OP_SCAN_STATE, coalesce_key=OP_SCAN_STATE, scanned_items=self.scanned_items,
+                            current_box_number=self.current_box_number)
     
     def check_and_restore_backup(self):
         """Kiểm tra và khôi phục dữ liệu backup nếu có"""
@@ -4704,6 +3495,17 @@ class KiemKhoApp:
             current_box_number_backup = backup_data.get('current_box_number')
             timestamp = backup_data.get('timestamp', 0)
             
+            # Phát lại các thao tác trong journal (ghi sau snapshot) để có dữ liệu mới nhất
+            try:
+                journal_entries = self._backup_journal.read_entries(backup_data.get('journal_id'))
+                if journal_entries:
+                    scanned_items_backup, tong_hop_data_backup, current_box_number_backup = replay_journal(
+                        journal_entries, scanned_items_backup, tong_hop_data_backup, current_box_number_backup)
+                    timestamp = journal_entries[-1].get('timestamp', timestamp)
+            except Exception as journal_err:
+                # Journal lỗi -> vẫn khôi phục được từ snapshot
+                print(f"Lỗi khi đọc journal backup: {str(journal_err)}")
+            
             # Kiểm tra xem có dữ liệu để khôi phục không
             has_scanned_items = scanned_items_backup and len(scanned_items_backup) > 0
             has_tong_hop_data = tong_hop_data_backup and len(tong_hop_data_backup) > 0
@@ -4831,7 +3633,8 @@ class KiemKhoApp:
             if result['value'] == 'restore':
                 # Khôi phục dữ liệu
                 self.scanned_items = scanned_items_backup
-                self.tong_hop_data = tong_hop_data_backup
+                # Dòng Tổng hợp dạng gọn (TongHopRecord), xây lại chỉ mục
+                self.session.set_tong_hop_data(tong_hop_data_backup)
                 self.current_box_number = current_box_number_backup
                 
                 # Cập nhật UI sau khi khôi phục
@@ -4846,7 +3649,7 @@ class KiemKhoApp:
                         # Tạo lại item trong tree
                         item_id = self.tree.insert('', tk.END, values=(
                             len(self.tree.get_children()) + 1,  # STT
-                            isbn,
+                            info.get('isbn', isbn),
                             info.get('tua', ''),
                             info.get('ton_thuc_te', ''),
                             info.get('so_thung', ''),
@@ -4869,7 +3672,7 @@ class KiemKhoApp:
                     if hasattr(self, 'so_thung_var') and self.current_box_number:
                         self.so_thung_var.set(self.current_box_number)
                 
-                messagebox.showinfo("Thành công", 
+                self.notify(NOTIFY_SUCCESS, 
                     f"Đã khôi phục dữ liệu!\n\n"
                     f"Dữ liệu đang quét: {len(self.scanned_items)} tựa\n"
                     f"Dữ liệu tổng hợp: {len(self.tong_hop_data)} dòng")
@@ -4884,9 +3687,10 @@ class KiemKhoApp:
     def start_auto_save(self):
         """Bắt đầu auto-save định kỳ (mỗi 30 giây)"""
         def auto_save_periodic():
-            # Chỉ lưu nếu có dữ liệu
+            # Chỉ lưu nếu có dữ liệu - ghi trạng thái đang quét vào journal
+            # (journal_backup tự gộp thành snapshot khi cần)
             if self.scanned_items or self.tong_hop_data:
-                self.save_backup()
+                self.journal_scan_state()
             # Lên lịch lại sau 30 giây
             self.root.after(30000, auto_save_periodic)
         
@@ -4908,7 +3712,7 @@ class KiemKhoApp:
         
         def do_save():
             try:
-                self.save_backup()
+                self.journal_scan_state()
             except Exception as e:
                 # Không hiển thị lỗi cho người dùng
                 print(f"Error saving backup: {e}")
@@ -4943,9 +3747,9 @@ class KiemKhoApp:
                     except:
                         pass
                 
-                # Lưu backup ngay lập tức
+                # Lưu backup ngay lập tức (đồng bộ - không chờ thread nền)
                 if self.scanned_items or self.tong_hop_data:
-                    self.save_backup()
+                    self.save_backup_now()
                     print(f"Đã lưu backup khi nhận signal {signum}")
             except Exception as e:
                 print(f"Lỗi khi lưu backup trong signal handler: {str(e)}")
@@ -4954,7 +3758,7 @@ class KiemKhoApp:
             """Xử lý khi exit - lưu backup"""
             try:
                 if self.scanned_items or self.tong_hop_data:
-                    self.save_backup()
+                    self.save_backup_now()
                     print("Đã lưu backup khi exit")
             except Exception as e:
                 print(f"Lỗi khi lưu backup trong atexit handler: {str(e)}")
@@ -4975,6 +3779,27 @@ class KiemKhoApp:
         # Đăng ký atexit handler (hoạt động trên cả Windows và Unix)
         atexit.register(atexit_handler)
     
+    def _consolidate_exports(self):
+        """Gộp các file phần (thư mục _parts) vào file Kiemkecuoinam đã xuất trong phiên - gọi khi đóng phần mềm"""
+        # Đợi thread nền ghi xong lần xuất cuối trước khi gộp
+        if not self.export_worker.wait_idle(timeout=30):
+            print("Lỗi khi gộp file tổng hợp: thread ghi file chưa ghi xong")
+            return
+        for file_path in sorted(self.exported_files):
+            try:
+                count = consolidate_export(file_path)
+                if count is not None:
+                    print(f"[OK] Đã gộp file tổng hợp: {file_path} ({count:,} dòng)")
+            except Exception as e:
+                print(f"Lỗi khi gộp file {file_path}: {str(e)}")
+                traceback.print_exc()
+    
+    def _quit_app(self):
+        """Gộp file tổng hợp đã xuất rồi đóng phần mềm"""
+        self._consolidate_exports()
+        self.root.quit()
+        self.root.destroy()
+    
     def on_closing(self):
         """Xử lý sự kiện đóng cửa sổ - kiểm tra dữ liệu chưa lưu"""
         # Kiểm tra xem có dữ liệu chưa lưu không (cả scanned_items và tong_hop_data)
@@ -5092,10 +3917,9 @@ class KiemKhoApp:
             if result['value'] == 'save':
                 # Lưu vào backup file trước khi đóng
                 try:
-                    self.save_backup()
+                    self.save_backup_now()
                     # Sau khi lưu backup xong, đóng phần mềm
-                    self.root.quit()
-                    self.root.destroy()
+                    self._quit_app()
                 except Exception as e:
                     # Nếu lưu backup lỗi, hỏi lại có muốn đóng không
                     error_result = messagebox.askyesno(
@@ -5104,17 +3928,14 @@ class KiemKhoApp:
                         f"Bạn có muốn đóng phần mềm mà không lưu không?"
                     )
                     if error_result:
-                        self.root.quit()
-                        self.root.destroy()
+                        self._quit_app()
             elif result['value'] == 'close':
                 # Đóng phần mềm luôn, không lưu gì cả
-                self.root.quit()
-                self.root.destroy()
+                self._quit_app()
             # Nếu result['value'] là None (người dùng đóng dialog bằng X), không làm gì cả
         else:
             # Không có dữ liệu chưa lưu, đóng phần mềm bình thường
-            self.root.quit()
-            self.root.destroy()
+            self._quit_app()
 
 def main():
     try:
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache dữ liệu đầu vào đã đọc (DataFrame) dùng chung cho Kiểm Kho và Kiểm Kho Showroom
+
+Lần đầu đọc file Excel, DataFrame đã lọc được lưu (pickle) cạnh file config, kèm chữ ký
+(mtime, kích thước) của file nguồn và các file thay thế. Các lần mở sau, nếu chữ ký không đổi
+thì đọc thẳng từ cache thay vì parse lại file Excel.
+"""
+
+import os
+import pickle
+
+# Tăng khi thay đổi cách đọc/lọc dữ liệu đầu vào để bỏ cache cũ
+CACHE_VERSION = 2
+
+# Từ khóa nhận diện dòng tiêu đề
+_HEADER_KEYWORDS = (
+    ('isbn',),
+    ('số thùng', 'so thung', 'thùng'),
+    ('tựa', 'tua', 'titles'),
+    ('tồn', 'ton', 'qty'),
+)
+
+
+def file_signature(path):
+    """[mtime_ns, size] của file, None nếu file không tồn tại"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def input_signatures(paths):
+    """Chữ ký của tất cả file đầu vào có thể được chọn (file chính + các file thay thế)"""
+    return {str(path): file_signature(path) for path in paths}
+
+
+def input_cache_name(pd, prefix='kiem_kho'):
+    """Tên file cache theo engine dữ liệu: DataFrame pandas và kiem_kho_lite không đọc lẫn được"""
+    if getattr(pd, '__name__', 'pandas') == 'kiem_kho_lite':
+        return f"{prefix}_input_cache_lite.pkl"
+    return f"{prefix}_input_cache.pkl"
+
+
+def _pandas_version():
+    try:
+        import pandas
+        return pandas.__version__
+    except ImportError:
+        return None
+
+
+def load_cached_dataframe(cache_path, candidate_paths):
+    """Đọc DataFrame từ cache, trả về (df, đường dẫn file nguồn) hoặc (None, None) nếu cache không dùng được"""
+    try:
+        if not cache_path.exists():
+            return None, None
+        with open(cache_path, 'rb') as f:
+            entry = pickle.load(f)
+        if entry.get('version') != CACHE_VERSION or entry.get('pandas') != _pandas_version():
+            return None, None
+        signatures = input_signatures(candidate_paths)
+        source = entry.get('source')
+        if entry.get('signatures') != signatures or signatures.get(source) is None:
+            return None, None
+        return entry.get('df'), source
+    except Exception as e:
+        print(f"Lỗi khi đọc cache dữ liệu đầu vào: {str(e)}")
+        return None, None
+
+
+def save_cached_dataframe(cache_path, candidate_paths, source_path, df):
+    """Lưu DataFrame đã lọc vào cache (ghi file tạm rồi thay thế để không để lại file hỏng)"""
+    signatures = input_signatures(candidate_paths)
+    if signatures.get(str(source_path)) is None:
+        # File do người dùng chọn thủ công - không nằm trong danh sách file đầu vào, không cache
+        return False
+    entry = {
+        'version': CACHE_VERSION,
+        'pandas': _pandas_version(),
+        'source': str(source_path),
+        'signatures': signatures,
+        'df': df,
+    }
+    temp_path = cache_path.with_name(cache_path.name + '.tmp')
+    try:
+        with open(temp_path, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+        return True
+    except Exception as e:
+        print(f"Lỗi khi ghi cache dữ liệu đầu vào: {str(e)}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return False
+
+
+def _count_keywords(text):
+    return sum(any(keyword in text for keyword in group) for group in _HEADER_KEYWORDS)
+
+
+def find_header_row(pd, head_df):
+    """Tìm dòng tiêu đề trong các dòng đầu (đọc với header=None), None nếu không tìm thấy
+
+    Dòng 1 được dùng nếu có ít nhất 3 từ khóa; nếu không, lấy dòng đầu tiên có 'isbn'
+    và ít nhất 2 từ khóa.
+    """
+    rows = [
+        ' '.join(str(cell).strip().lower() if pd.notna(cell) else '' for cell in row)
+        for row in head_df.itertuples(index=False)
+    ]
+    if rows and _count_keywords(rows[0]) >= 3:
+        return 0
+    for index, row_str in enumerate(rows):
+        if 'isbn' in row_str and _count_keywords(row_str) >= 2:
+            return index
+    return None
@@ -0,0 +1,1076 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Engine kiểm kê không phụ thuộc giao diện, dùng chung cho Kiểm Kho và Kiểm Kho Showroom
+
+InventorySession giữ trạng thái một phiên kiểm kê (dữ liệu đầu vào, thùng đang kiểm, các ISBN
+đã quét, dữ liệu Tổng hợp) và các quy tắc đối chiếu (khớp ISBN, Thiếu/Dư, tạo dòng Tổng hợp).
+Ứng dụng Tk chỉ gọi các hàm này rồi vẽ kết quả lên bảng; công cụ dòng lệnh/đo hiệu năng có thể
+dùng trực tiếp mà không cần màn hình:
+
+    session = InventorySession()
+    session.load_input('DuLieuDauVao.xlsx')
+    session.open_box('T001')
+    session.scan_isbn('8935235226272')
+    session.set_counted_quantity('8935235226272', '3')
+    session.commit_box(ngay='01/12/2025')
+    session.export('Kiemkecuoinam.xlsx')
+"""
+
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+
+from kiem_kho_export import INTERNAL_COLUMNS, write_rows_xlsx
+from kiem_kho_isbn import clean_isbn_text, isbn_key, is_checksum_error, is_input_isbn
+from kiem_kho_records import ScannedItems, TongHopRecord, to_records
+from kiem_kho_index import (IsbnIndex, IsbnBoxIndex, BoxPartition, build_box_isbn_indexes, TongHopIndex,
+                            RowRegistry, TongHopAggregate)
+
+# Kết quả quét ISBN (ScanResult.status)
+SCAN_ADDED = 'added'                  # Thêm dòng mới vào danh sách đang quét
+SCAN_INCREMENTED = 'incremented'      # ISBN đã quét - cộng thêm 1 vào Tồn thực tế
+SCAN_NO_DATA = 'no_data'              # Chưa load thùng (hoặc dữ liệu đầu vào)
+SCAN_NO_ISBN_COLUMN = 'no_isbn_column'
+SCAN_ALREADY_SAVED = 'already_saved'  # ISBN đã lưu trong Tổng hợp cho thùng này
+SCAN_BOX_CONFLICT = 'box_conflict'    # "Thùng / vị trí mới" trùng mã thùng trong dữ liệu đầu vào
+SCAN_BAD_CHECKSUM = 'bad_checksum'    # Mã dạng ISBN-10/EAN-13 sai check digit (quét/gõ nhầm), không có trong dữ liệu
+
+# Kết quả đối chiếu file mã quét cho một thùng (ImportResult.status)
+IMPORT_OK = 'ok'
+IMPORT_NO_DATA = 'no_data'              # Chưa có dữ liệu đầu vào (hoặc không có cột ISBN)
+IMPORT_UNKNOWN_BOX = 'unknown_box'      # Số thùng không có trong dữ liệu đầu vào
+
+# Kết quả đối chiếu Tồn thực tế với Tồn tựa trong thùng
+STATUS_MISMATCH = 'mismatch'    # Thiếu/Dư - tô đỏ ô Tồn thực tế và Tình trạng
+STATUS_MATCH = 'match'          # Khớp - xóa tình trạng và ghi chú tự động
+STATUS_SKIPPED = 'skipped'      # Không so sánh (ISBN không thuộc thùng, giá trị không phải số...)
+STATUS_NEW_TITLE = 'new_title'  # ISBN không có trong dữ liệu: Tồn tựa trong thùng = Tồn thực tế
+
+# Ghi chú tự động do đối chiếu Thiếu/Dư tạo ra
+_AUTO_NOTE = r'(Thiếu \d+ cuốn|Dư \d+ cuốn)'
+
+# Chọn engine đọc dữ liệu: 'pandas' hoặc 'lite' (kiem_kho_lite, không cần pandas/numpy)
+DATA_ENGINE_ENV_VAR = 'KIEM_KHO_ENGINE'
+
+
+def load_data_engine(name=None):
+    """Module đọc dữ liệu dùng làm session.pd: pandas, hoặc kiem_kho_lite nếu được chọn / không có pandas
+
+    Bản build lite loại pandas khỏi file .exe (--exclude-module pandas) nên tự dùng kiem_kho_lite.
+    """
+    if name is None:
+        name = os.environ.get(DATA_ENGINE_ENV_VAR, '').strip().lower()
+    if name != 'lite':
+        try:
+            import pandas as pd
+            return pd
+        except ImportError:
+            pass
+    try:
+        import kiem_kho_lite
+        return kiem_kho_lite
+    except ImportError:
+        return None
+
+
+# ---- Đọc dữ liệu đầu vào ----
+
+def read_input_file(pd, excel_path, excel_file=None):
+    """Đọc và lọc dữ liệu từ file Excel (.xlsx hoặc .xls), trả về DataFrame
+
+    excel_file: pd.ExcelFile đã mở sẵn cho excel_path (dùng lại, không mở file lần nữa)
+    """
+    from kiem_kho_cache import find_header_row
+
+    excel_path = Path(excel_path)
+    try:
+        if excel_path.suffix.lower() == '.xls':
+            try:
+                excel_file = pd.ExcelFile(excel_path, engine='xlrd')
+                # Tìm dòng tiêu đề trong 30 dòng đầu (một lần parse), mặc định dùng header=0
+                header_row = None
+                try:
+                    header_row = find_header_row(pd, excel_file.parse(header=None, nrows=30))
+                except Exception:
+                    pass
+                df = excel_file.parse(header=header_row if header_row is not None else 0)
+            except Exception as e2:
+                raise ValueError(f"Không thể đọc file .xls: {str(e2)}")
+        else:
+            # File .xlsx - đọc với header=0
+            try:
+                if excel_file is None:
+                    excel_file = pd.ExcelFile(excel_path, engine='openpyxl')
+                df = excel_file.parse(header=0)
+            except Exception as e2:
+                raise ValueError(f"Không thể đọc file .xlsx: {str(e2)}")
+    finally:
+        if excel_file is not None:
+            excel_file.close()
+    return clean_input_frame(df)
+
+
+def clean_input_frame(df):
+    """Lọc DataFrame vừa đọc từ file: bỏ dòng rỗng và dòng có ISBN rỗng/không hợp lệ"""
+    # Loại bỏ các dòng rỗng hoàn toàn
+    df = df.dropna(how='all')
+
+    # Kiểm tra DataFrame có rỗng không (trước khi filter ISBN)
+    if df.empty:
+        raise ValueError("File Excel không có dữ liệu!")
+
+    # Loại bỏ các dòng có ISBN rỗng hoặc không hợp lệ (chỉ khi đã có cột ISBN)
+    if 'isbn' in df.columns or 'ISBN' in df.columns:
+        isbn_col = 'isbn' if 'isbn' in df.columns else 'ISBN'
+        original_count = len(df)
+
+        # Loại bỏ các dòng có ISBN rỗng, là số thứ tự (1.0, 2.0...) hoặc ngắn hơn 4 ký tự
+        # (ISBN bị Excel lưu dạng float như 9786041234567.0 vẫn được giữ)
+        df = df.iloc[[position for position, value in enumerate(df[isbn_col].tolist())
+                      if is_input_isbn(value)]]
+
+        if df.empty:
+            raise ValueError(f"File Excel không có dữ liệu hợp lệ! Đã loại bỏ {original_count} dòng không hợp lệ.")
+
+    if df.empty:
+        raise ValueError("File Excel không có dữ liệu sau khi lọc!")
+
+    return df
+
+
+def is_box_column(col_lower):
+    """Tên cột (viết thường) có phải cột Số thùng không"""
+    return 'số thùng' in col_lower or 'so thung' in col_lower or col_lower == 'thùng' or col_lower == 'thung'
+
+
+def is_title_column(col_lower):
+    """Tên cột (viết thường) có phải cột Tựa không"""
+    return 'tựa' in col_lower or 'tua' in col_lower or 'tên' in col_lower or 'titles' in col_lower
+
+
+def is_quantity_column(col_lower):
+    """Tên cột (viết thường) có phải cột Tồn tựa trong thùng không"""
+    return (('tồn' in col_lower and 'tựa' in col_lower) or ('ton' in col_lower and 'tua' in col_lower) or
+            'qty tựa trong thùng' in col_lower or 'qty tua trong thung' in col_lower)
+
+
+class InputSchema:
+    """Các cột của dữ liệu đầu vào đã chuẩn hóa, xác định một lần khi load
+
+    box/isbn/title/quantity: tên cột Số thùng, ISBN, Tựa, Tồn tựa trong thùng (None nếu không có)
+    positions: {tên cột: vị trí cột}
+    """
+
+    __slots__ = ('box', 'isbn', 'title', 'quantity', 'positions')
+
+    def __init__(self, columns):
+        self.positions = {col: position for position, col in enumerate(columns)}
+        self.box = self.title = self.quantity = None
+        self.isbn = 'isbn' if 'isbn' in self.positions else None
+        for col in columns:
+            col_lower = str(col).lower().strip()
+            if self.box is None and is_box_column(col_lower):
+                self.box = col
+            if self.title is None and is_title_column(col_lower):
+                self.title = col
+            if self.quantity is None and is_quantity_column(col_lower):
+                self.quantity = col
+
+
+def find_input_columns(pd, columns, with_box=True):
+    """Tìm các cột cần thiết (không phân biệt hoa/thường): {'so_thung', 'isbn', 'tua', 'ton_tung_tua'} -> tên cột gốc"""
+    col_mapping = {}
+    for col in columns:
+        if pd.isna(col):
+            continue
+        col_lower = str(col).strip().lower()
+
+        # Số thùng / Thùng
+        if with_box and is_box_column(col_lower):
+            if 'so_thung' not in col_mapping:
+                col_mapping['so_thung'] = col
+
+        # ISBN
+        if 'isbn' in col_lower:
+            if 'isbn' not in col_mapping:
+                col_mapping['isbn'] = col
+
+        # Tựa/Tên sách / Titles
+        if ('tựa' in col_lower or 'tua' in col_lower or 'tên' in col_lower or
+                'titles' in col_lower or 'title' in col_lower):
+            if 'tua' not in col_mapping:
+                col_mapping['tua'] = col
+
+        # Tồn từng tựa / Qty tựa trong thùng / Qty - ưu tiên các cột có tên đầy đủ trước
+        if 'qty tựa trong thùng' in col_lower or 'qty tua trong thung' in col_lower:
+            if 'ton_tung_tua' not in col_mapping:
+                col_mapping['ton_tung_tua'] = col
+        elif (('tồn' in col_lower and 'tựa' in col_lower) or
+              ('ton' in col_lower and 'tua' in col_lower)):
+            if 'ton_tung_tua' not in col_mapping:
+                col_mapping['ton_tung_tua'] = col
+        elif col_lower == 'qty' and 'ton_tung_tua' not in col_mapping:
+            # Chỉ dùng Qty nếu chưa tìm thấy cột nào khác
+            col_mapping['ton_tung_tua'] = col
+    return col_mapping
+
+
+# ---- Quy tắc đối chiếu ----
+
+def compare_quantity(ton_thuc_te, ton_trong_thung):
+    """(tình trạng, ghi chú tự động) nếu lệch, None nếu khớp - ValueError nếu giá trị không phải số"""
+    ton_thuc_te_num = float(ton_thuc_te) if ton_thuc_te else 0
+    ton_trong_thung_num = float(ton_trong_thung) if ton_trong_thung else 0
+    if abs(ton_thuc_te_num - ton_trong_thung_num) <= 0.01:
+        return None
+    if ton_thuc_te_num < ton_trong_thung_num:
+        return "Thiếu", f"Thiếu {int(ton_trong_thung_num - ton_thuc_te_num)} cuốn"
+    return "Dư", f"Dư {int(ton_thuc_te_num - ton_trong_thung_num)} cuốn"
+
+
+def add_auto_note(ghi_chu, ghi_chu_auto):
+    """Đặt ghi chú Thiếu/Dư mới lên đầu, bỏ ghi chú tự động cũ, giữ phần người dùng nhập"""
+    if ghi_chu and ghi_chu.strip():
+        ghi_chu_cleaned = re.sub(_AUTO_NOTE + r'[,\.\s]*', '', ghi_chu, flags=re.IGNORECASE)
+        ghi_chu_cleaned = re.sub(r'\.\s*\.', '.', ghi_chu_cleaned).strip()  # Xóa dấu chấm kép
+        if ghi_chu_cleaned:
+            return f"{ghi_chu_auto}. {ghi_chu_cleaned}"
+    return ghi_chu_auto
+
+
+def format_other_boxes_note(other_boxes):
+    """Ghi chú thùng gốc của ISBN để nhầm thùng: 'Thuộc thùng A (tồn 2), B (tồn 1)'"""
+    parts = [f"{box} (tồn {quantity})" for box, quantity in other_boxes if box]
+    return f"Thuộc thùng {', '.join(parts)}" if parts else ''
+
+
+def remove_auto_note(ghi_chu):
+    """Xóa ghi chú Thiếu/Dư tự động, giữ phần người dùng nhập"""
+    if not ghi_chu:
+        return ''
+    ghi_chu_cleaned = re.sub(r'^' + _AUTO_NOTE + r'[,\.\s]*', '', ghi_chu, flags=re.IGNORECASE)
+    ghi_chu_cleaned = re.sub(r'[,\.\s]*' + _AUTO_NOTE + r'[,\.\s]*', '', ghi_chu_cleaned, flags=re.IGNORECASE)
+    return ghi_chu_cleaned.strip()
+
+
+def remove_auto_note_keep_errors(ghi_chu):
+    """Xóa ghi chú Thiếu/Dư tự động nhưng giữ các phần 'LỖI: ...' (đặt trước phần người dùng nhập)"""
+    if not ghi_chu:
+        return ''
+    loi_parts = re.findall(r'LỖI:[^.]*(?:\.[^.]*)*', ghi_chu, re.IGNORECASE)
+    ghi_chu_cleaned = re.sub(_AUTO_NOTE + r'[,\.\s]*', '', ghi_chu, flags=re.IGNORECASE)
+    ghi_chu_cleaned = re.sub(r'[,\.\s]*' + _AUTO_NOTE + r'[,\.\s]*', '', ghi_chu_cleaned, flags=re.IGNORECASE)
+    ghi_chu_cleaned = re.sub(r'\.\s*\.', '.', ghi_chu_cleaned)
+    ghi_chu_cleaned = re.sub(r'\.\s*$', '', ghi_chu_cleaned).strip()  # Xóa dấu chấm cuối
+    if ghi_chu_cleaned:
+        if re.match(r'^LỖI:', ghi_chu_cleaned, re.IGNORECASE) or not loi_parts:
+            return ghi_chu_cleaned
+        return '. '.join(loi_parts) + '. ' + ghi_chu_cleaned
+    return '. '.join(loi_parts)
+
+
+def is_positive_quantity(value):
+    """Giá trị Tồn tựa trong thùng có phải số > 0 không"""
+    try:
+        return bool(value) and str(value).strip() != '' and float(value) > 0
+    except (ValueError, TypeError):
+        return False
+
+
+def parse_input_quantity(pd, value):
+    """Tồn tựa trong thùng (int) từ một ô dữ liệu đầu vào, 0 nếu rỗng hoặc không phải số"""
+    try:
+        return int(float(value)) if pd.notna(value) else 0
+    except (ValueError, TypeError):
+        return 0
+
+
+def increment_quantity(value, amount=1):
+    """Tồn thực tế sau khi quét lại thêm amount cuốn (amount nếu giá trị cũ rỗng hoặc không phải số)"""
+    try:
+        old_value = str(value).strip() if value is not None else ''
+        return str(int(float(old_value)) + amount) if old_value else str(amount)
+    except (ValueError, TypeError):
+        return str(amount)
+
+
+def format_ton_trong_thung(item):
+    """Giá trị hiển thị cột Tồn tựa trong thùng cho một ISBN đang quét"""
+    ton_trong_thung = item.get('ton_trong_thung', 0)
+    if item.get('is_invalid_isbn') and not ton_trong_thung:
+        return ''
+    try:
+        return str(int(float(ton_trong_thung))) if ton_trong_thung else '0'
+    except (ValueError, TypeError):
+        return str(ton_trong_thung)
+
+
+def make_so_phieu(ngay_value):
+    """Số phiếu P-DD/MM/YYYY từ ngày nhập (DD/MM/YY hoặc DD/MM/YYYY), mặc định là hôm nay"""
+    try:
+        parts = ngay_value.split('/') if ngay_value else []
+        if len(parts) == 3:
+            if len(parts[2]) == 2:
+                # Format DD/MM/YY -> DD/MM/YYYY
+                parts[2] = '20' + parts[2]
+            ngay_parsed = datetime.strptime('/'.join(parts), "%d/%m/%Y")
+        else:
+            ngay_parsed = datetime.now()
+    except Exception:
+        ngay_parsed = datetime.now()
+    return f"P-{ngay_parsed.strftime('%d/%m/%Y')}"
+
+
+def export_dataframe(pd, rows, drop_columns=INTERNAL_COLUMNS):
+    """DataFrame để xuất file từ các dòng Tổng hợp (bỏ cột nội bộ)"""
+    return pd.DataFrame(rows).drop(columns=list(drop_columns), errors='ignore')
+
+
+class PartialInput:
+    """Dữ liệu đầu vào đang được đọc trên thread nền: các thùng đã đọc xong có thể load và quét ngay
+
+    boxes: {số thùng viết thường: list các dòng (giá trị theo columns)}; box_numbers: mã thùng gốc.
+    """
+
+    __slots__ = ('columns', 'boxes', 'box_numbers', 'rows_loaded', 'total_rows')
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.boxes = {}
+        self.box_numbers = set()
+        self.rows_loaded = 0
+        self.total_rows = None
+
+    def update(self, boxes, reopened=()):
+        """Thêm/thay các thùng đã đọc xong ({key: (mã thùng, dòng)}) và bỏ các thùng lại có thêm dòng"""
+        for key in reopened:
+            self.boxes.pop(key, None)
+        for key, (box_number, rows) in boxes.items():
+            self.boxes[key] = rows
+            self.box_numbers.add(box_number)
+
+
+class ScanResult:
+    """Kết quả một lần quét ISBN"""
+
+    __slots__ = ('status', 'isbn', 'item', 'previous_item')
+
+    def __init__(self, status, isbn, item=None, previous_item=None):
+        self.status = status
+        self.isbn = isbn
+        self.item = item                    # Dòng trong scanned_items sau khi quét
+        self.previous_item = previous_item  # Dòng cũ bị thay thế khi cộng dồn (còn item_id cũ)
+
+
+class ImportResult:
+    """Kết quả đối chiếu các mã quét nhập từ file cho một thùng"""
+
+    __slots__ = ('status', 'box_number', 'records', 'scan_count', 'not_in_box', 'already_saved',
+                 'bad_checksum', 'missing_titles')
+
+    def __init__(self, box_number, status=IMPORT_OK):
+        self.status = status
+        self.box_number = box_number
+        self.records = []         # Dòng Tổng hợp (TongHopRecord) chưa được thêm vào tong_hop_data
+        self.scan_count = 0       # Tổng số lần quét của thùng trong file
+        self.not_in_box = []      # ISBN không thuộc thùng (vẫn được lưu như khi quét)
+        self.already_saved = []   # ISBN đã lưu trong Tổng hợp cho thùng này - bỏ qua
+        self.bad_checksum = []    # Mã sai check digit và không có trong dữ liệu đầu vào - bỏ qua
+        self.missing_titles = 0   # Số tựa trong thùng không có trong file (chưa lưu trước đó)
+
+
+class InventorySession:
+    """Một phiên kiểm kê: dữ liệu đầu vào, thùng đang kiểm, các ISBN đã quét và dữ liệu Tổng hợp
+
+    showroom=True: ISBN được tra trên toàn bộ dữ liệu đầu vào (không lọc theo thùng), cho phép quét lại
+    ISBN đã lưu, không đối chiếu Thiếu/Dư; dòng Tổng hợp được cộng dồn theo (ISBN, Số thùng).
+    """
+
+    def __init__(self, showroom=False):
+        self.showroom = showroom
+        self.pd = load_data_engine()  # pandas hoặc kiem_kho_lite (cùng phần API được dùng)
+        self.df = None
+        self.col_mapping = {}  # Tên chuẩn -> tên cột gốc trong file
+        self.schema = None  # Các cột đã xác định của self.df (InputSchema)
+        self.partial_input = None  # Dữ liệu đang đọc dần trên thread nền (PartialInput), None khi đã đọc xong
+        self.current_box_data = None
+        self.current_box_number = None
+        self.box_partition = None  # Phân vùng dữ liệu theo số thùng (BoxPartition)
+        self.isbn_indexes = {}  # Chỉ mục ISBN theo thùng: {số thùng viết thường: IsbnIndex}
+        self.isbn_index = None  # Showroom: chỉ mục ISBN trên toàn bộ self.df (IsbnIndex)
+        self.isbn_keys = []  # Key ISBN chuẩn (kiem_kho_isbn.isbn_key) của từng dòng self.df, tính một lần khi load
+        self.isbn_boxes = IsbnBoxIndex()  # Chỉ mục ngược ISBN -> [(số thùng, tồn)] trên toàn bộ dữ liệu đầu vào
+        # Lưu các item đã quét: {key ISBN chuẩn: {isbn, tua, ton_thuc_te, so_thung, ton_trong_thung, ghi_chu}}
+        self.scanned_items = ScannedItems()
+        self.tong_hop_data = []  # Lưu tổng hợp các data đã kiểm kê
+        self.tong_hop_index = TongHopIndex()  # Chỉ mục (thùng, ISBN) + bộ đếm theo thùng trên tong_hop_data
+        self.tong_hop_rows = RowRegistry()  # id bền -> dòng trong tong_hop_data
+        # Showroom: tổng cộng dồn theo (ISBN, Số thùng), cập nhật tăng dần
+        self.tong_hop_aggregate = TongHopAggregate() if showroom else None
+
+    @property
+    def scanned_items(self):
+        return self._scanned_items
+
+    @scanned_items.setter
+    def scanned_items(self, items):
+        # dict gán từ giao diện/backup/journal cũng được tra theo key ISBN chuẩn
+        self._scanned_items = items if isinstance(items, ScannedItems) else ScannedItems(items)
+
+    # ---- Dữ liệu đầu vào ----
+
+    def load_input(self, excel_path):
+        """Đọc file dữ liệu đầu vào và xây chỉ mục, trả về col_mapping"""
+        return self.load_dataframe(read_input_file(self.pd, excel_path))
+
+    def load_dataframe(self, df):
+        """Chuẩn hóa DataFrame đầu vào đã lọc và xây các chỉ mục tra cứu, trả về col_mapping"""
+        df, col_mapping = self._normalize_frame(df)
+        self.df = df
+        self.col_mapping = col_mapping
+        self.schema = InputSchema(df.columns)
+        self.partial_input = None
+        self._build_input_indexes()
+        return col_mapping
+
+    def _normalize_frame(self, df):
+        """(DataFrame đã chuẩn hóa tên cột và ISBN, col_mapping)"""
+        # Chuẩn hóa tên cột (loại bỏ khoảng trắng thừa)
+        df.columns = df.columns.str.strip()
+        col_mapping = find_input_columns(self.pd, df.columns, with_box=not self.showroom)
+
+        # Đổi tên cột để dễ sử dụng
+        if col_mapping:
+            df = df.rename(columns=col_mapping)
+
+        # Làm sạch dữ liệu (bỏ đuôi '.0' của ISBN lưu dạng số)
+        if 'isbn' in df.columns:
+            df['isbn'] = [clean_isbn_text(value) for value in df['isbn'].tolist()]
+        return df, col_mapping
+
+    def adopt_input(self, loaded):
+        """Dùng dữ liệu đầu vào đã đọc và xây chỉ mục xong trên thread nền (một InventorySession khác)
+
+        Thùng đang kiểm (mở khi dữ liệu còn đang đọc) được lấy lại từ dữ liệu đầy đủ, giữ các ISBN đã quét.
+        """
+        self.df = loaded.df
+        self.col_mapping = loaded.col_mapping
+        self.schema = loaded.schema
+        self.box_partition = loaded.box_partition
+        self.isbn_indexes = loaded.isbn_indexes
+        self.isbn_index = loaded.isbn_index
+        self.isbn_keys = loaded.isbn_keys
+        self.isbn_boxes = loaded.isbn_boxes
+        self.partial_input = None
+        if self.current_box_number is None:
+            return
+        if self.showroom:
+            self.current_box_data = self.df if not self.df.empty else None
+            return
+        box_data = self.get_box_data(self.current_box_number)
+        if box_data is not None and not box_data.empty:
+            self.current_box_data = box_data
+
+    def begin_partial_input(self, columns):
+        """Bắt đầu nhận dữ liệu đọc dần (tên cột gốc trong file)"""
+        self.partial_input = PartialInput(columns)
+        empty, _ = self._normalize_frame(self.pd.DataFrame([], columns=list(columns)))
+        self.schema = InputSchema(empty.columns)
+        self.isbn_boxes = IsbnBoxIndex()
+
+    def update_partial_input(self, boxes, reopened=(), rows_loaded=0, total_rows=None):
+        """Nhận thêm các thùng đã đọc xong, trả về True nếu dữ liệu thùng đang kiểm đã thay đổi"""
+        partial = self.partial_input
+        if partial is None:
+            return False
+        partial.update(boxes, reopened)
+        self._update_partial_isbn_boxes(boxes, reopened)
+        partial.rows_loaded = rows_loaded
+        partial.total_rows = total_rows
+        if self.showroom or self.current_box_number is None:
+            return False
+        box_key = str(self.current_box_number).strip().lower()
+        if box_key not in boxes:
+            return False
+        self.current_box_data = self.get_box_data(self.current_box_number)
+        return True
+
+    def _update_partial_isbn_boxes(self, boxes, reopened):
+        """Thêm các thùng vừa đọc xong vào chỉ mục ngược (bỏ các thùng lại có thêm dòng)"""
+        schema = self.schema
+        for key in list(reopened) + list(boxes):
+            self.isbn_boxes.remove_box(key)
+        if schema.isbn is None:
+            return
+        isbn_position = schema.positions[schema.isbn]
+        quantity_position = schema.positions.get(schema.quantity)
+        for box_number, rows in boxes.values():
+            for row in rows:
+                quantity = 0
+                if quantity_position is not None and quantity_position < len(row):
+                    quantity = parse_input_quantity(self.pd, row[quantity_position])
+                self.isbn_boxes.add(isbn_key(row[isbn_position]), box_number, quantity)
+
+    def is_loading_input(self):
+        """Dữ liệu đầu vào còn đang được đọc trên thread nền"""
+        return self.partial_input is not None
+
+    def is_box_available(self, so_thung):
+        """Thùng đã có đủ dữ liệu để load (đã đọc xong file, hoặc đã đọc xong các dòng của thùng)"""
+        if self.partial_input is None:
+            return True
+        return str(so_thung).strip().lower() in self.partial_input.boxes
+
+    def _build_input_indexes(self):
+        """Xây phân vùng theo số thùng và chỉ mục ISBN một lần - mỗi lần quét chỉ cần tra dict theo key ISBN chuẩn"""
+        df = self.df
+        schema = self.schema
+        self.box_partition = None
+        self.isbn_indexes = {}
+        self.isbn_index = None
+        self.isbn_keys = []
+        self.isbn_boxes = IsbnBoxIndex()
+        # Showroom không lọc theo thùng, nhưng vẫn xây phân vùng số thùng (nếu file có cột số thùng)
+        # để kiểm tra trùng mã thùng mới mà không phải quét lại DataFrame
+        if schema.box is not None:
+            box_col = df[schema.box]
+            self.box_partition = BoxPartition(box_col.astype(str).tolist(), box_col.notna().tolist())
+        if schema.isbn is None:
+            return
+        # Key chuẩn tính một lần cho mỗi dòng - mọi chỉ mục ISBN dùng chung danh sách này
+        self.isbn_keys = isbn_keys = [isbn_key(value) for value in df[schema.isbn].tolist()]
+        box_values = ([str(box).strip() if self.pd.notna(box) else '' for box in df[schema.box].tolist()]
+                      if schema.box is not None else [''] * len(isbn_keys))
+        quantities = ([parse_input_quantity(self.pd, value) for value in df[schema.quantity].tolist()]
+                      if schema.quantity is not None else [0] * len(isbn_keys))
+        self.isbn_boxes = IsbnBoxIndex(isbn_keys, box_values, quantities)
+        if self.showroom:
+            self.isbn_index = IsbnIndex(isbn_keys)
+        elif self.box_partition is not None:
+            self.isbn_indexes = build_box_isbn_indexes(self.box_partition, isbn_keys)
+
+    def get_all_box_numbers(self):
+        """Tập mã thùng trong dữ liệu đầu vào (các thùng đã đọc xong nếu dữ liệu còn đang đọc)"""
+        if self.df is None and self.partial_input is not None:
+            return self.partial_input.box_numbers
+        if self.df is None or self.df.empty or self.box_partition is None:
+            return set()
+        return self.box_partition.box_numbers
+
+    def is_existing_box_number(self, so_thung):
+        """Mã thùng (vị trí mới) có trùng với mã thùng trong dữ liệu đầu vào không"""
+        return bool(so_thung) and so_thung in self.get_all_box_numbers()
+
+    # ---- Thùng đang kiểm ----
+
+    def get_box_data(self, so_thung):
+        """Các dòng dữ liệu đầu vào của một thùng (không phân biệt chữ hoa/thường), None nếu không có cột số thùng"""
+        if self.df is None and self.partial_input is not None:
+            partial = self.partial_input
+            width = len(partial.columns)
+            rows = [row[:width] for row in partial.boxes.get(str(so_thung).strip().lower(), ())]
+            return self._normalize_frame(self.pd.DataFrame(rows, columns=partial.columns))[0]
+        if self.box_partition is None:
+            return None
+        return self.df.iloc[self.box_partition.get_positions(so_thung)].copy()
+
+    def open_box(self, so_thung, box_data=None):
+        """Bắt đầu kiểm một thùng, trả về dữ liệu thùng (None/rỗng nếu không có dữ liệu)
+
+        Showroom: chỉ ghi nhận số thùng, dữ liệu tra cứu là toàn bộ self.df và giữ các ISBN đang quét.
+        """
+        if self.showroom:
+            self.current_box_number = so_thung
+            # Không copy - current_box_data chỉ được đọc
+            has_data = self.df is not None and not self.df.empty
+            self.current_box_data = self.df if has_data else None
+            return self.current_box_data
+
+        if box_data is None:
+            box_data = self.get_box_data(so_thung)
+        if box_data is None or box_data.empty:
+            return box_data
+        self.current_box_number = so_thung
+        self.current_box_data = box_data
+        self.scanned_items = {}  # Reset danh sách đã quét
+        return box_data
+
+    def close_box(self):
+        """Kết thúc thùng đang kiểm (sau khi lưu hoặc reset)"""
+        self.scanned_items.clear()
+        self.current_box_number = None
+        self.current_box_data = None
+
+    def count_valid_scanned_isbns(self):
+        """Đếm số ISBN hợp lệ (tồn tại trong Excel) đã được quét - không đếm ISBN không tồn tại"""
+        if not self.scanned_items or self.df is None or 'isbn' not in self.df.columns:
+            return 0
+        return sum(1 for item in self.scanned_items.values()
+                   if not item.get('is_invalid_isbn', False) and not item.get('is_new_isbn_not_in_data', False))
+
+    def count_scanned_titles_for_box(self, so_thung, valid_only=True):
+        """Đếm số dòng đã lưu trong Tổng hợp cho một thùng (khớp 'Số thùng' hoặc 'Vị trí mới')"""
+        if not so_thung or not self.tong_hop_data:
+            return 0
+        # Dòng không có _is_valid_isbn được coi là hợp lệ (tương thích ngược)
+        return self.tong_hop_index.count_rows_for_box(so_thung, valid_only=valid_only)
+
+    def is_isbn_in_input_data(self, isbn):
+        """ISBN có trong dữ liệu đầu vào không (thùng bất kỳ, tra chỉ mục ngược)"""
+        if not isbn:
+            return False
+        return isbn in self.isbn_boxes
+
+    def find_isbn_boxes(self, isbn, exclude_box=None):
+        """[(mã thùng, tồn)] chứa ISBN trong dữ liệu đầu vào, bỏ thùng exclude_box (thùng đang kiểm)"""
+        if not isbn:
+            return []
+        exclude_key = str(exclude_box).strip().lower() if exclude_box else None
+        return [(box, quantity) for box, quantity in self.isbn_boxes.find(isbn)
+                if box.lower() != exclude_key]
+
+    def is_isbn_already_scanned(self, isbn, so_thung):
+        """ISBN đã được quét và lưu trong Tổng hợp cho thùng này chưa"""
+        if not isbn or not so_thung or not self.tong_hop_data:
+            return False
+        try:
+            return self.tong_hop_index.contains_isbn_in_box(isbn, so_thung)
+        except Exception as e:
+            print(f"Lỗi khi kiểm tra ISBN đã quét: {str(e)}")
+            return False
+
+    def find_isbn_row(self, isbn_clean):
+        """Dòng dữ liệu đầu vào khớp ISBN (trong thùng hiện tại, hoặc toàn bộ dữ liệu với showroom)"""
+        if self.showroom:
+            if self.isbn_index is None or len(self.isbn_index) != len(self.df):
+                # Chỉ mục chưa có hoặc lệch với dữ liệu -> xây lại
+                self.isbn_index = IsbnIndex([isbn_key(value) for value in self.df['isbn'].tolist()])
+            position = self.isbn_index.find(isbn_clean)
+            return None if position is None else self.df.iloc[position]
+
+        box_key = str(self.current_box_number).strip().lower() if self.current_box_number else ''
+        isbn_index = self.isbn_indexes.get(box_key)
+        if isbn_index is None or len(isbn_index) != len(self.current_box_data):
+            # Chỉ mục chưa có hoặc lệch với dữ liệu thùng -> xây lại cho thùng hiện tại
+            isbn_index = IsbnIndex([isbn_key(value) for value in self.current_box_data['isbn'].tolist()])
+            self.isbn_indexes[box_key] = isbn_index
+        position = isbn_index.find(isbn_clean)
+        return None if position is None else self.current_box_data.iloc[position]
+
+    def _read_title_row(self, matched_row):
+        """(Tựa, Tồn tựa trong thùng) từ một dòng dữ liệu đầu vào"""
+        pd = self.pd
+        schema = self.schema
+        tua = ''
+        if schema.title is not None:
+            value = matched_row[schema.title]
+            tua = str(value) if pd.notna(value) else ''
+
+        ton_trong_thung = 0
+        if schema.quantity is not None:
+            ton_trong_thung = parse_input_quantity(pd, matched_row[schema.quantity])
+        return tua, ton_trong_thung
+
+    # ---- Quét ----
+
+    def scan_isbn(self, isbn, vi_tri_moi='', count=1):
+        """Quét một ISBN vào thùng hiện tại, trả về ScanResult
+
+        ISBN không có trong thùng (hoặc trong dữ liệu với showroom) vẫn được thêm như dòng trống,
+        chỉ điền số thùng. ISBN đã quét được cộng thêm 1 vào Tồn thực tế. count > 1 là nhiều lần quét
+        liên tiếp cùng mã được gộp lại (hàng đợi quét) - kết quả giống như quét lần lượt count lần.
+        """
+        isbn_clean = str(isbn).strip()
+        data = self.df if self.showroom else self.current_box_data
+        if data is None or data.empty:
+            return ScanResult(SCAN_NO_DATA, isbn_clean)
+        if 'isbn' not in data.columns:
+            return ScanResult(SCAN_NO_ISBN_COLUMN, isbn_clean)
+        # Quét nhầm: bỏ qua trước khi tra cứu (trừ khi mã sai check digit này có sẵn trong dữ liệu đầu vào)
+        if is_checksum_error(isbn_clean) and not self.is_isbn_in_input_data(isbn_clean):
+            return ScanResult(SCAN_BAD_CHECKSUM, isbn_clean)
+
+        matched_row = self.find_isbn_row(isbn_clean)
+        box_number = self.current_box_number
+        box_text = str(box_number) if box_number else ''
+
+        # Showroom cho phép quét lại ISBN đã lưu và cộng dồn trong Tổng hợp
+        if (matched_row is not None and not self.showroom and
+                self.is_isbn_already_scanned(isbn_clean, box_number)):
+            return ScanResult(SCAN_ALREADY_SAVED, isbn_clean)
+
+        is_invalid_isbn = matched_row is None
+        vi_tri_moi = vi_tri_moi.strip() if vi_tri_moi else ''
+        # Mã thùng mới phải khác với tất cả mã thùng trong dữ liệu đầu vào (chỉ xét cho ISBN hợp lệ)
+        if not is_invalid_isbn and self.is_existing_box_number(vi_tri_moi):
+            return ScanResult(SCAN_BOX_CONFLICT, isbn_clean)
+
+        # ISBN không có trong thùng: tra chỉ mục ngược các thùng khác chứa ISBN (sách để nhầm thùng)
+        other_boxes = self.find_isbn_boxes(isbn_clean, box_number) if is_invalid_isbn else []
+        isbn_not_in_input_data = is_invalid_isbn and not self.is_isbn_in_input_data(isbn_clean)
+
+        if is_invalid_isbn:
+            # Để trống Tựa, Tồn thực tế, Tồn tựa trong thùng, Tình trạng, Ghi chú - chỉ điền số thùng
+            tua, ton_trong_thung = '', 0
+            ton_thuc_te, tinh_trang = '', ''
+            ghi_chu = format_other_boxes_note(other_boxes)
+        else:
+            tua, ton_trong_thung = self._read_title_row(matched_row)
+            ton_thuc_te, tinh_trang, ghi_chu = '1', '', ''  # Mặc định là 1 khi quét lần đầu
+
+        previous_item = None
+        can_increment = self.showroom or not is_invalid_isbn
+        repeats = max(int(count), 1) - 1  # Số lần quét lại gộp vào lần quét này
+        if isbn_clean in self.scanned_items and can_increment:
+            # Quét lại - tăng số lượng lên 1 (mỗi lần quét), giữ lại Tình trạng và Ghi chú
+            previous_item = self.scanned_items.pop(isbn_clean)
+            ton_thuc_te = previous_item.get('ton_thuc_te', '')
+            tinh_trang = previous_item.get('tinh_trang', '')
+            ghi_chu = previous_item.get('ghi_chu', '')
+            repeats += 1
+        if repeats and can_increment:
+            ton_thuc_te = increment_quantity(ton_thuc_te, repeats)
+            if is_invalid_isbn:
+                # ISBN không tồn tại đã cộng dồn: Tồn tựa trong thùng bằng Tồn thực tế
+                try:
+                    if int(float(ton_thuc_te)) > 0:
+                        ton_trong_thung = int(float(ton_thuc_te))
+                except (ValueError, TypeError):
+                    pass
+
+        if is_invalid_isbn or self.showroom:
+            so_thung_hien_thi = box_text
+            so_thung_goc = box_text if is_invalid_isbn else box_number
+        else:
+            so_thung_hien_thi = vi_tri_moi if vi_tri_moi else box_number
+            so_thung_goc = box_number
+
+        item = {
+            'item_id': None,  # iid trên bảng Kiểm kê - giao diện gán sau khi vẽ dòng
+            # ISBN hiển thị: giữ dạng quét lần đầu khi quét lại bằng dạng khác (ISBN-10/EAN-13) của cùng cuốn
+            'isbn': previous_item.get('isbn', isbn_clean) if previous_item is not None else isbn_clean,
+            'tua': tua,
+            'ton_thuc_te': ton_thuc_te,
+            'so_thung': so_thung_hien_thi,  # Số thùng hiển thị (có thể là vị trí mới)
+            'so_thung_goc': so_thung_goc,  # Số thùng gốc từ dữ liệu
+            'vi_tri_moi': vi_tri_moi,  # Giá trị ô "Thùng / vị trí mới" khi quét
+            'ton_trong_thung': ton_trong_thung,
+            'tinh_trang': tinh_trang,
+            'ghi_chu': ghi_chu,
+            'is_invalid_isbn': is_invalid_isbn,  # ISBN không thuộc thùng - cho phép sửa cột Tựa
+            'is_new_isbn_not_in_data': isbn_not_in_input_data,
+            'other_boxes': other_boxes  # [(mã thùng, tồn)] chứa ISBN trong dữ liệu đầu vào (ISBN không thuộc thùng)
+        }
+        self.scanned_items[isbn_clean] = item
+        status = SCAN_INCREMENTED if previous_item is not None else SCAN_ADDED
+        return ScanResult(status, isbn_clean, item, previous_item)
+
+    def _apply_comparison(self, item, ton_thuc_te):
+        """Đối chiếu Tồn thực tế với Tồn tựa trong thùng và cập nhật Tình trạng/Ghi chú của item"""
+        try:
+            result = compare_quantity(ton_thuc_te, item.get('ton_trong_thung', 0))
+        except (ValueError, TypeError):
+            return STATUS_SKIPPED
+        if result is None:
+            item.pop('tinh_trang', None)
+            item['ghi_chu'] = remove_auto_note(item.get('ghi_chu', ''))
+            return STATUS_MATCH
+        tinh_trang, ghi_chu_auto = result
+        item['tinh_trang'] = tinh_trang
+        item['ghi_chu'] = add_auto_note(item.get('ghi_chu', ''), ghi_chu_auto)
+        return STATUS_MISMATCH
+
+    def set_counted_quantity(self, isbn, value):
+        """Nhập Tồn thực tế cho một ISBN đang quét và đối chiếu Thiếu/Dư
+
+        Trả về STATUS_* (None nếu ISBN chưa được quét). Tình trạng/Ghi chú mới nằm trong scanned_items[isbn].
+        """
+        item = self.scanned_items.get(isbn)
+        if item is None:
+            return None
+        value = str(value).strip() if value is not None else ''
+        item['ton_thuc_te'] = value
+        return self._apply_counted_quantity(item, value)
+
+    def _apply_counted_quantity(self, item, value):
+        """Quy tắc Tình trạng/Ghi chú theo Tồn thực tế của một ISBN - dùng chung cho bảng Kiểm kê và import file quét
+
+        item cần ton_trong_thung, ghi_chu, is_invalid_isbn, is_new_isbn_not_in_data, other_boxes (như scan_isbn).
+        """
+        is_invalid_isbn = item.get('is_invalid_isbn', False)
+        is_new_isbn_not_in_data = item.get('is_new_isbn_not_in_data', False)
+
+        # ISBN không tồn tại trong dữ liệu: Tồn tựa trong thùng = Tồn thực tế, không so sánh
+        ton_thuc_te_num = 0
+        if is_new_isbn_not_in_data and value and (is_invalid_isbn or self.showroom):
+            try:
+                ton_thuc_te_num = float(value)
+            except (ValueError, TypeError):
+                ton_thuc_te_num = 0
+            if ton_thuc_te_num > 0:
+                item['ton_trong_thung'] = ton_thuc_te_num
+        if self.showroom:
+            # Showroom không đối chiếu Thiếu/Dư
+            return STATUS_NEW_TITLE if ton_thuc_te_num > 0 else STATUS_SKIPPED
+        if ton_thuc_te_num > 0:
+            item.pop('tinh_trang', None)
+            item['ghi_chu'] = remove_auto_note(item.get('ghi_chu', ''))
+            return STATUS_NEW_TITLE
+
+        if is_invalid_isbn:
+            # ISBN không thuộc thùng - coi như dòng trống mới: bỏ tình trạng và ghi chú cũ,
+            # chỉ giữ ghi chú thùng gốc (ghi chú Dư được đặt lên trước)
+            item.pop('tinh_trang', None)
+            item['ghi_chu'] = format_other_boxes_note(item.get('other_boxes', []))
+        elif not is_positive_quantity(item.get('ton_trong_thung', 0)):
+            # Không có Tồn tựa trong thùng để so sánh - bỏ ghi chú tự động, giữ phần LỖI
+            item.pop('tinh_trang', None)
+            item['ghi_chu'] = remove_auto_note_keep_errors(item.get('ghi_chu', ''))
+            item['is_invalid_isbn'] = True
+
+        if is_new_isbn_not_in_data and item.get('is_invalid_isbn', False):
+            return STATUS_SKIPPED
+        return self._apply_comparison(item, value)
+
+    def refresh_item_status(self, isbn):
+        """Đối chiếu lại Thiếu/Dư sau khi cộng dồn - chỉ cho ISBN thuộc thùng có Tồn tựa trong thùng > 0"""
+        item = self.scanned_items.get(isbn)
+        if item is None or self.showroom or item.get('is_invalid_isbn', False):
+            return STATUS_SKIPPED
+        if not is_positive_quantity(item.get('ton_trong_thung', 0)):
+            return STATUS_SKIPPED
+        return self._apply_comparison(item, item.get('ton_thuc_te', ''))
+
+    # ---- Tổng hợp ----
+
+    def build_tong_hop_records(self, nhap_xuat='', ngay='', vi_tri_moi='', note_thung=''):
+        """Tạo các dòng Tổng hợp từ các ISBN đang quét (bỏ qua ISBN chưa nhập Tồn thực tế)"""
+        so_phieu = make_so_phieu(ngay)
+        vi_tri_moi = vi_tri_moi.strip() if vi_tri_moi else ''
+        nx_value = nhap_xuat.strip() if nhap_xuat else ''
+        records = []
+        for isbn, info in self.scanned_items.items():
+            try:
+                if not info.get('ton_thuc_te', '').strip():
+                    continue  # Bỏ qua item chưa nhập tồn thực tế
+
+                so_thung_goc = info.get('so_thung_goc', '')
+                if not so_thung_goc:
+                    so_thung_goc = self.current_box_number if self.current_box_number else info.get('so_thung', '')
+
+                # "Vị trí mới": ô "Thùng / vị trí mới" hiện tại, sau đó giá trị lưu khi quét - không lấy số thùng gốc
+                so_thung_moi = vi_tri_moi or info.get('vi_tri_moi', '').strip()
+
+                records.append(TongHopRecord({
+                    'N/X': nx_value,
+                    'Số phiếu': so_phieu,
+                    'Ngày': ngay,
+                    'Vị trí mới': so_thung_moi,
+                    'ISBN': info.get('isbn', isbn),
+                    'Tựa': info.get('tua', ''),
+                    'Tồn thực tế': info.get('ton_thuc_te', ''),
+                    'Số thùng': str(so_thung_goc).strip(),
+                    'Tình trạng': info.get('tinh_trang', ''),
+                    'Ghi chú': info.get('ghi_chu', ''),
+                    'Note thùng': note_thung,
+                    '_is_valid_isbn': not info.get('is_invalid_isbn', False)  # Để đếm số tựa đã quét
+                }))
+            except Exception as e:
+                # Bỏ qua item lỗi và tiếp tục
+                print(f"Lỗi khi xử lý item {isbn}: {str(e)}")
+        return records
+
+    def add_tong_hop_records(self, records):
+        """Thêm các dòng vào Tổng hợp (cấp id bền, cập nhật chỉ mục)
+
+        Trả về [(vị trí nhóm, là nhóm mới), ...] của bảng cộng dồn với showroom, [] nếu không cộng dồn.
+        """
+        self.tong_hop_data.extend(records)
+        for record in records:
+            self.tong_hop_rows.add(record)
+            self.tong_hop_index.add(record)
+        if self.tong_hop_aggregate is None:
+            return []
+        return [self.tong_hop_aggregate.add(record) for record in records]
+
+    def set_tong_hop_data(self, rows):
+        """Thay toàn bộ Tổng hợp (khôi phục backup): đổi sang TongHopRecord và xây lại chỉ mục"""
+        self.tong_hop_data = to_records(rows)
+        self.tong_hop_rows.rebuild(self.tong_hop_data)
+        self.tong_hop_index.rebuild(self.tong_hop_data)
+        if self.tong_hop_aggregate is not None:
+            self.tong_hop_aggregate.rebuild(self.tong_hop_data)
+
+    def commit_box(self, nhap_xuat='', ngay='', vi_tri_moi='', note_thung=''):
+        """Lưu các ISBN đang quét vào Tổng hợp và kết thúc thùng, trả về các dòng đã thêm"""
+        records = self.build_tong_hop_records(nhap_xuat, ngay, vi_tri_moi, note_thung)
+        self.add_tong_hop_records(records)
+        self.close_box()
+        return records
+
+    def reconcile_scan_batches(self, batches, nhap_xuat='', ngay='', vi_tri_moi='', note_thung=''):
+        """Đối chiếu số lần quét từng ISBN (file của máy quét) với dữ liệu đầu vào, tạo thẳng các dòng Tổng hợp
+
+        batches: [(mã thùng, {key ISBN chuẩn: [mã hiển thị, số lần quét]})] (kiem_kho_import.ScanDump.batches).
+        Mỗi ISBN là một lần tra chỉ mục theo key; Tồn thực tế là số lần quét, Thiếu/Dư được đối chiếu như
+        khi nhập Tồn thực tế trên bảng. Trả về [ImportResult] - các dòng chưa được thêm (add_tong_hop_records).
+        """
+        schema = self.schema
+        if self.df is None or schema is None or schema.isbn is None:
+            return [ImportResult(box_number, IMPORT_NO_DATA) for box_number, _ in batches]
+        pd = self.pd
+        titles = self.df[schema.title].tolist() if schema.title is not None else None
+        quantities = self.df[schema.quantity].tolist() if schema.quantity is not None else None
+        so_phieu = make_so_phieu(ngay)
+        nx_value = nhap_xuat.strip() if nhap_xuat else ''
+        vi_tri_moi = vi_tri_moi.strip() if vi_tri_moi else ''
+        if self.showroom and (self.isbn_index is None or len(self.isbn_index) != len(self.df)):
+            self.isbn_index = IsbnIndex(self.isbn_keys)
+
+        results = []
+        for box_number, counts in batches:
+            box_number = str(box_number).strip()
+            result = ImportResult(box_number)
+            results.append(result)
+            if self.showroom:
+                positions, index = None, self.isbn_index
+            else:
+                positions = self.box_partition.get_positions(box_number) if self.box_partition is not None else []
+                if not positions:
+                    result.status = IMPORT_UNKNOWN_BOX
+                    continue
+                index = self.isbn_indexes.get(box_number.lower())
+                if index is None or len(index) != len(positions):
+                    index = IsbnIndex([self.isbn_keys[position] for position in positions])
+
+            for key, (code, count) in counts.items():
+                result.scan_count += count
+                local = index.find_key(key)
+                if local is None and is_checksum_error(code) and not self.is_isbn_in_input_data(code):
+                    result.bad_checksum.append(code)
+                    continue
+                item = {'ton_trong_thung': 0, 'ghi_chu': '', 'is_invalid_isbn': local is None,
+                        'is_new_isbn_not_in_data': False, 'other_boxes': []}
+                tua = ''
+                if local is not None:
+                    position = local if positions is None else positions[local]
+                    if not self.showroom and self.tong_hop_index.contains_isbn_in_box(code, box_number):
+                        result.already_saved.append(code)
+                        continue
+                    if titles is not None and pd.notna(titles[position]):
+                        tua = str(titles[position])
+                    if quantities is not None:
+                        item['ton_trong_thung'] = parse_input_quantity(pd, quantities[position])
+                else:
+                    result.not_in_box.append(code)
+                    item['is_new_isbn_not_in_data'] = not self.is_isbn_in_input_data(code)
+                    if not self.showroom:
+                        item['other_boxes'] = self.find_isbn_boxes(code, box_number)
+                # Cùng quy tắc Thiếu/Dư như khi nhập Tồn thực tế trên bảng Kiểm kê
+                self._apply_counted_quantity(item, str(count))
+
+                result.records.append(TongHopRecord({
+                    'N/X': nx_value,
+                    'Số phiếu': so_phieu,
+                    'Ngày': ngay,
+                    'Vị trí mới': vi_tri_moi,
+                    'ISBN': code,
+                    'Tựa': tua,
+                    'Tồn thực tế': str(count),
+                    'Số thùng': box_number,
+                    'Tình trạng': item.get('tinh_trang', ''),
+                    'Ghi chú': item['ghi_chu'],
+                    'Note thùng': note_thung,
+                    '_is_valid_isbn': not item['is_invalid_isbn']  # Để đếm số tựa đã quét
+                }))
+
+            if positions is not None:
+                # Tựa trong thùng không được quét (và chưa lưu trước đó) - không tạo dòng, chỉ báo số lượng
+                box_keys = {self.isbn_keys[position] for position in positions} - {''}
+                result.missing_titles = sum(1 for key in box_keys if key not in counts and
+                                            not self.tong_hop_index.contains_isbn_in_box(key, box_number))
+        return results
+
+    def find_input_position(self, isbn, so_thung):
+        """Vị trí dòng (trong self.df) của (ISBN, số thùng), None nếu không tìm thấy
+
+        Số thùng khớp không phân biệt chữ hoa/thường (hoặc endswith hai chiều nếu không có thùng trùng
+        tên), ISBN khớp như khi quét (IsbnIndex). Nhiều dòng khớp -> lấy dòng đứng trước nhất.
+        """
+        if self.box_partition is None or self.schema is None or self.schema.isbn is None:
+            return None
+        box_positions = self.box_partition.positions
+        box_key = str(so_thung).strip().lower()
+        if box_key in box_positions:
+            box_keys = [box_key]
+        else:
+            box_keys = [key for key in box_positions if key.endswith(box_key) or box_key.endswith(key)]
+
+        best = None
+        for key in box_keys:
+            isbn_index = self.isbn_indexes.get(key)
+            if isbn_index is None:
+                # Showroom không xây sẵn chỉ mục theo thùng - xây khi cần cho thùng này
+                isbn_index = IsbnIndex([self.isbn_keys[position] for position in box_positions[key]])
+                self.isbn_indexes[key] = isbn_index
+            local_position = isbn_index.find(isbn)
+            if local_position is not None:
+                position = box_positions[key][local_position]
+                if best is None or position < best:
+                    best = position
+        return best
+
+    def find_ton_trong_thung(self, isbn, so_thung):
+        """Tồn tựa trong thùng của (ISBN, số thùng) trong dữ liệu đầu vào, 0 nếu không tìm thấy"""
+        if self.df is None or self.df.empty or self.schema is None or self.schema.quantity is None:
+            return 0
+        position = self.find_input_position(isbn, so_thung)
+        if position is None:
+            return 0
+        return self._read_title_row(self.df.iloc[position])[1]
+
+    def recheck_tong_hop_record(self, record, ton_thuc_te_new):
+        """Đối chiếu lại Tình trạng/Ghi chú của một dòng Tổng hợp sau khi sửa Tồn thực tế
+
+        Trả về True nếu dòng đã được cập nhật. ValueError nếu Tồn thực tế không phải số.
+        """
+        isbn = record.get('ISBN', '').strip()
+        so_thung = record.get('Số thùng', '').strip()
+        if not isbn or not so_thung:
+            return False
+
+        ton_trong_thung = self.find_ton_trong_thung(isbn, so_thung)
+        # ISBN không tồn tại trong cả thùng và dữ liệu đầu vào -> không so sánh
+        isbn_not_in_input_data = ton_trong_thung == 0 and not self.is_isbn_in_input_data(isbn)
+        ton_thuc_te_num = float(ton_thuc_te_new) if ton_thuc_te_new else 0
+        if isbn_not_in_input_data and ton_thuc_te_num > 0:
+            result = None
+        else:
+            result = compare_quantity(ton_thuc_te_new, ton_trong_thung)
+
+        if result is None:
+            record['Tình trạng'] = ''
+            record['Ghi chú'] = remove_auto_note(record.get('Ghi chú', ''))
+        else:
+            tinh_trang, ghi_chu_auto = result
+            record['Tình trạng'] = tinh_trang
+            record['Ghi chú'] = add_auto_note(record.get('Ghi chú', ''), ghi_chu_auto)
+        return True
+
+    def export_rows(self):
+        """Bản sao các dòng cần xuất (cộng dồn với showroom) - bất biến, có thể ghi trên thread nền"""
+        if self.tong_hop_aggregate is not None:
+            return [dict(data) for data in self.tong_hop_aggregate.rows]
+        return [data.to_dict() for data in self.tong_hop_data]
+
+    def export(self, filename, rows=None):
+        """Ghi dữ liệu Tổng hợp ra file Excel (không dùng template), trả về số dòng đã ghi"""
+        return write_rows_xlsx(filename, self.export_rows() if rows is None else rows)
+
+
+def session_attribute(name):
+    """Property chuyển tiếp một thuộc tính của ứng dụng sang self.session (giữ tên cũ trong code giao diện)"""
+    return property(lambda self: getattr(self.session, name),
+                    lambda self, value: setattr(self.session, name, value))
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Xuất file Excel Tổng hợp dùng chung cho Kiểm Kho và Kiểm Kho Showroom
+
+Các dòng Tổng hợp được ghi thẳng ra file bằng openpyxl write-only (từng dòng một, không dựng
+DataFrame hay workbook đầy đủ trong bộ nhớ), properties (created/modified/lastModifiedBy) được đặt
+ngay khi ghi. File template chỉ được copy lại và thay docProps/core.xml trong gói zip, không cần
+load_workbook rồi lưu lại cả file. File Kiemkecuoinam được xuất tăng dần (export_incremental):
+chỉ ghi phần thay đổi so với lần xuất trước, gộp lại bằng consolidate_export (ứng dụng gọi khi đóng).
+"""
+
+import hashlib
+import json
+import numbers
+import os
+import shutil
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+from kiem_kho_index import ROW_ID_KEY
+
+# Cột nội bộ không xuất ra file
+INTERNAL_COLUMNS = (ROW_ID_KEY, '_member_ids')
+
+# Phần chứa properties trong gói xlsx
+CORE_PROPERTIES_PART = 'docProps/core.xml'
+
+
+def document_author():
+    """Tên người dùng hệ điều hành (lastModifiedBy)"""
+    return os.getenv('USERNAME', os.getenv('USER', 'User'))
+
+
+def export_columns(rows, drop_columns=INTERNAL_COLUMNS):
+    """Thứ tự cột giống pd.DataFrame(rows): các key theo thứ tự xuất hiện đầu tiên, bỏ cột nội bộ"""
+    columns = {}
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns[key] = None
+    return [column for column in columns if column not in drop_columns]
+
+
+def _cell_value(value):
+    # Giống to_excel: NaN/None -> ô trống, số numpy -> số Python, kiểu khác (list, dict...) ghi dạng chuỗi
+    if value is None or isinstance(value, (str, bool, datetime)):
+        return value
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        return None if value != value else value
+    return str(value)
+
+
+def _header_cells(sheet, columns):
+    """Dòng tiêu đề định dạng giống pandas (in đậm, viền mảnh, căn giữa)"""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    font = Font(bold=True)
+    side = Side(style='thin')
+    border = Border(left=side, right=side, top=side, bottom=side)
+    alignment = Alignment(horizontal='center', vertical='top')
+    cells = []
+    for column in columns:
+        cell = WriteOnlyCell(sheet, value=str(column))
+        cell.font = font
+        cell.border = border
+        cell.alignment = alignment
+        cells.append(cell)
+    return cells
+
+
+def write_rows_xlsx(path, rows, columns=None, sheet_title='Sheet1', author=None):
+    """Ghi các dòng Tổng hợp ra file xlsx ở chế độ write-only, trả về số dòng đã ghi
+
+    columns: thứ tự cột (mặc định export_columns(rows)). Properties của file được đặt trước khi lưu.
+    """
+    from openpyxl import Workbook
+
+    if columns is None:
+        columns = export_columns(rows)
+    wb = Workbook(write_only=True)
+    now = datetime.now()
+    wb.properties.created = now
+    wb.properties.modified = now
+    wb.properties.lastModifiedBy = author or document_author()
+
+    sheet = wb.create_sheet(sheet_title)
+    if columns:
+        sheet.append(_header_cells(sheet, columns))
+    count = 0
+    for row in rows:
+        sheet.append([_cell_value(row.get(column)) for column in columns])
+        count += 1
+    wb.save(str(path))
+    return count
+
+
+def _core_properties_xml(original_xml, author):
+    """docProps/core.xml mới: giữ title/creator... của file gốc, đặt created/modified về hiện tại"""
+    from openpyxl.packaging.core import DocumentProperties
+    from openpyxl.xml.functions import fromstring, tostring
+
+    props = DocumentProperties.from_tree(fromstring(original_xml))
+    now = datetime.now()
+    props.created = now
+    props.modified = now
+    props.lastModifiedBy = author or document_author()
+    return tostring(props.to_tree())
+
+
+def copy_with_properties(source_path, dest_path, author=None):
+    """Copy file xlsx và đặt properties (created/modified/lastModifiedBy) về hiện tại
+
+    Các phần khác của gói zip được copy nguyên (không parse sheet). File không phải xlsx chỉ được copy.
+    Trả về True nếu đã cập nhật properties.
+    """
+    source_path = str(source_path)
+    dest_path = str(dest_path)
+    if not zipfile.is_zipfile(source_path):
+        shutil.copyfile(source_path, dest_path)
+        return False
+
+    with zipfile.ZipFile(source_path, 'r') as src:
+        if CORE_PROPERTIES_PART not in src.namelist():
+            # Không có core.xml (file tạo bởi công cụ khác) - chỉ copy, không thêm part mới vào gói
+            shutil.copyfile(source_path, dest_path)
+            return False
+        original_xml = src.read(CORE_PROPERTIES_PART)
+
+        temp_path = dest_path + '.tmp'
+        try:
+            with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_DEFLATED) as dst:
+                for info in src.infolist():
+                    if info.filename == CORE_PROPERTIES_PART:
+                        dst.writestr(info, _core_properties_xml(original_xml, author))
+                    else:
+                        with src.open(info) as part, dst.open(info, 'w') as out:
+                            shutil.copyfileobj(part, out, 1024 * 1024)
+            os.replace(temp_path, dest_path)
+        finally:
+            if os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+    return True
+
+
+# ---- Xuất tăng dần file Kiemkecuoinam ----
+#
+# File chính (Kiemkecuoinam_<ngày>_<tổ>.xlsx) chỉ được ghi lại toàn bộ ở lần xuất đầu tiên. Các lần
+# xuất sau chỉ ghi phần thay đổi (dòng mới/sửa và dòng bị xóa, theo id dòng) vào file phần trong thư
+# mục <tên file>_parts, kèm manifest.json ghi lại dấu vân tay các dòng đã xuất. consolidate_export
+# gộp các file phần vào file chính (tự động khi đủ MAX_PARTS phần, khi đóng phần mềm, hoặc chạy tay).
+
+MAX_PARTS = 10
+MANIFEST_VERSION = 1
+PART_ID_COLUMN = ROW_ID_KEY
+PART_OP_COLUMN = '_thao_tac'
+OP_WRITE = 'ghi'
+OP_DELETE = 'xoa'
+
+EXPORT_FULL = 'full'
+EXPORT_DELTA = 'delta'
+EXPORT_UNCHANGED = 'unchanged'
+
+
+def parts_dir(path):
+    """Thư mục chứa các file phần và manifest của một file xuất"""
+    path = Path(path)
+    return path.with_name(f"{path.stem}_parts")
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _row_digest(row, columns):
+    values = [_cell_value(row.get(column)) for column in columns]
+    data = json.dumps(values, ensure_ascii=False, default=str).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def _load_manifest(path):
+    manifest_path = parts_dir(path) / 'manifest.json'
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != MANIFEST_VERSION:
+            return None
+        return manifest
+    except (OSError, ValueError):
+        return None
+
+
+def _save_manifest(path, manifest):
+    directory = parts_dir(path)
+    directory.mkdir(exist_ok=True)
+    manifest_path = directory / 'manifest.json'
+    temp_path = manifest_path.with_name('manifest.json.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_path, manifest_path)
+
+
+def _replace_with(path, write_func):
+    """Ghi file tạm bằng write_func(temp_path) rồi thay thế file chính"""
+    path = Path(path)
+    temp_path = path.with_name(path.stem + '_temp.xlsx')
+    try:
+        result = write_func(temp_path)
+        os.replace(temp_path, path)
+        return result
+    finally:
+        if temp_path.exists():
+            try:
+                temp_path.unlink()
+            except OSError:
+                pass
+
+
+def _remove_parts(path, keep=('manifest.json',)):
+    directory = parts_dir(path)
+    if not directory.exists():
+        return
+    for part in directory.iterdir():
+        if part.name not in keep:
+            try:
+                part.unlink()
+            except OSError:
+                pass
+
+
+def _write_full_export(path, rows, columns, digests):
+    count = _replace_with(path, lambda temp_path: write_rows_xlsx(temp_path, rows, columns))
+    _remove_parts(path)
+    _save_manifest(path, {
+        'version': MANIFEST_VERSION,
+        'columns': columns,
+        'base_ids': [row.get(ROW_ID_KEY) for row in rows],
+        'base_signature': _file_signature(path),
+        'digests': digests,
+        'parts': [],
+    })
+    return EXPORT_FULL, count
+
+
+def export_incremental(path, rows, max_parts=MAX_PARTS):
+    """Xuất các dòng Tổng hợp ra path, chỉ ghi phần thay đổi so với lần xuất trước
+
+    Trả về (EXPORT_FULL | EXPORT_DELTA | EXPORT_UNCHANGED, số dòng đã ghi). Ghi lại toàn bộ khi chưa có
+    file/manifest, file chính bị sửa ngoài phần mềm, cột thay đổi, dòng thiếu id hoặc thay đổi quá nửa.
+    """
+    columns = export_columns(rows)
+    ids = [row.get(ROW_ID_KEY) for row in rows]
+    digests = {str(row_id): _row_digest(row, columns) for row_id, row in zip(ids, rows)}
+
+    manifest = _load_manifest(path)
+    if (manifest is None or manifest.get('columns') != columns or
+            manifest.get('base_signature') != _file_signature(path) or
+            len(digests) != len(rows) or not all(isinstance(row_id, int) for row_id in ids)):
+        return _write_full_export(path, rows, columns, digests)
+
+    exported = manifest['digests']
+    changed = [row for row_id, row in zip(ids, rows) if exported.get(str(row_id)) != digests[str(row_id)]]
+    deleted = [int(row_id) for row_id in exported if row_id not in digests]
+    if not changed and not deleted:
+        return EXPORT_UNCHANGED, 0
+    if len(changed) + len(deleted) > len(rows) // 2:
+        return _write_full_export(path, rows, columns, digests)
+
+    part_rows = [{PART_ID_COLUMN: row_id, PART_OP_COLUMN: OP_DELETE} for row_id in deleted]
+    part_rows.extend(dict(row, **{PART_ID_COLUMN: row[ROW_ID_KEY], PART_OP_COLUMN: OP_WRITE})
+                     for row in changed)
+    part_name = f"part_{len(manifest['parts']) + 1:04d}.xlsx"
+    directory = parts_dir(path)
+    directory.mkdir(exist_ok=True)
+    write_rows_xlsx(directory / part_name, part_rows, [PART_ID_COLUMN, PART_OP_COLUMN] + columns)
+
+    manifest['parts'].append(part_name)
+    manifest['digests'] = digests
+    _save_manifest(path, manifest)
+    if len(manifest['parts']) >= max_parts:
+        consolidate_export(path)
+    return EXPORT_DELTA, len(part_rows)
+
+
+def _read_rows(path):
+    """Các dòng (list giá trị) của sheet đầu tiên, bỏ dòng tiêu đề"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(str(path), read_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(min_row=2, values_only=True)
+        return [list(row) for row in rows]
+    finally:
+        wb.close()
+
+
+def consolidate_export(path):
+    """Gộp các file phần vào file chính, trả về số dòng của file chính (None nếu không có gì để gộp)"""
+    manifest = _load_manifest(path)
+    if manifest is None or not manifest.get('parts'):
+        return None
+    if manifest.get('base_signature') != _file_signature(path):
+        raise ValueError(f"File {path} đã bị thay đổi ngoài phần mềm - không gộp được các file phần")
+
+    columns = manifest['columns']
+    merged = dict(zip(manifest['base_ids'], _read_rows(path)))
+    directory = parts_dir(path)
+    for part_name in manifest['parts']:
+        for values in _read_rows(directory / part_name):
+            row_id, op = values[0], values[1]
+            if op == OP_DELETE:
+                merged.pop(row_id, None)
+            else:
+                # Dòng đã có giữ nguyên vị trí, dòng mới thêm vào cuối (giống thứ tự trong Tổng hợp)
+                merged[row_id] = values[2:]
+
+    rows = [dict(zip(columns, values)) for values in merged.values()]
+    count = _replace_with(path, lambda temp_path: write_rows_xlsx(temp_path, rows, columns))
+    _remove_parts(path)
+    manifest.update(base_ids=list(merged), base_signature=_file_signature(path), parts=[])
+    _save_manifest(path, manifest)
+    return count
+
+
+if __name__ == '__main__':
+    # Gộp tay các file phần: python kiem_kho_export.py Kiemkecuoinam_<ngày>_<tổ>.xlsx ...
+    import sys
+
+    for file_path in sys.argv[1:]:
+        try:
+            count = consolidate_export(file_path)
+            if count is None:
+                print(f"[INFO] Không có file phần cần gộp: {file_path}")
+            else:
+                print(f"[OK] Đã gộp: {file_path} ({count:,} dòng)")
+        except Exception as e:
+            print(f"Lỗi khi gộp file {file_path}: {str(e)}")
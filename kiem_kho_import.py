@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Đọc file mã quét của máy quét cầm tay (chế độ lưu offline) dùng chung cho Kiểm Kho và Kiểm Kho Showroom
+
+Máy quét lưu các mã đã quét rồi xuất ra file văn bản (.txt/.csv). Các dạng được hỗ trợ:
+- Mỗi dòng một mã: 9786041234567
+- CSV/TSV (dấu phẩy, chấm phẩy hoặc tab): mã, số lượng (tùy chọn), các cột khác (thời gian...) bị bỏ qua
+- CSV có dòng tiêu đề: cột ISBN/Barcode/Mã, cột Số thùng (tùy chọn), cột Số lượng/Qty (tùy chọn)
+- Dòng đánh dấu thùng: 'THÙNG: T001', 'BOX: T001' hoặc mã thùng có trong dữ liệu đầu vào
+  (quét nhãn thùng trước khi quét sách) - các mã sau đó thuộc thùng này cho đến dấu thùng tiếp theo
+
+Các mã được đếm theo key ISBN chuẩn (kiem_kho_isbn.isbn_key) - ISBN-10 và EAN-13 của cùng cuốn sách
+được cộng chung. Mã đứng trước mọi dấu thùng thuộc thùng đang nhập trên màn hình.
+"""
+
+import re
+from pathlib import Path
+
+from kiem_kho_engine import IMPORT_NO_DATA, IMPORT_UNKNOWN_BOX, is_box_column
+from kiem_kho_isbn import MIN_ISBN_LENGTH, clean_isbn_text, isbn_key
+
+# Dòng đánh dấu thùng: 'THÙNG: T001', 'Thung T001', 'BOX=T001'
+_BOX_MARKER = re.compile(r'^(?:th[uù]ng|box)(?:\s*[:=]\s*|\s+)(.+)$', re.IGNORECASE)
+_DELIMITERS = re.compile(r'[,;\t]')
+# Số lượng trên một dòng (cột thứ hai) - lớn hơn thì coi là dữ liệu khác, không phải số lượng
+_MAX_LINE_QUANTITY = 9999
+_ISBN_HEADERS = ('isbn', 'barcode', 'mã vạch', 'ma vach', 'mã', 'ma', 'code', 'ean')
+_QUANTITY_HEADERS = ('số lượng', 'so luong', 'sl', 'qty', 'quantity', 'count', 'số lần', 'so lan')
+# Số thùng tối đa liệt kê trong bảng tóm tắt import
+_SUMMARY_MAX_BOXES = 15
+# File không có BOM UTF-16 (Notepad "Unicode"): thử lần lượt UTF-8 (có/không BOM), cp1258 (Windows tiếng Việt)
+_ENCODINGS = ('utf-8-sig', 'cp1258')
+
+
+class ScanDump:
+    """Các mã đọc từ một file mã quét, đã đếm theo thùng
+
+    boxes: {số thùng viết thường: [mã thùng, counts]} theo thứ tự gặp dấu thùng
+    unassigned: counts của các mã đứng trước mọi dấu thùng
+    counts: {key ISBN chuẩn: [mã hiển thị (lần gặp đầu tiên), số lần quét]}
+    """
+
+    __slots__ = ('boxes', 'unassigned', 'code_count', 'skipped_lines')
+
+    def __init__(self):
+        self.boxes = {}
+        self.unassigned = {}
+        self.code_count = 0  # Tổng số lần quét (đã cộng số lượng trên từng dòng)
+        self.skipped_lines = []  # (số dòng, nội dung) không đọc được mã
+
+    def batches(self, default_box=''):
+        """[(mã thùng, counts)] - các mã chưa có thùng được gộp vào default_box (bỏ qua nếu không có)"""
+        boxes = {key: [box_number, {code_key: list(entry) for code_key, entry in counts.items()}]
+                 for key, (box_number, counts) in self.boxes.items()}
+        default_box = str(default_box).strip() if default_box else ''
+        if self.unassigned and default_box:
+            # Mã chưa có thùng đứng đầu file -> thùng mặc định đứng trước, các mã này đứng trước trong thùng
+            merged = {key: list(entry) for key, entry in self.unassigned.items()}
+            target = boxes.pop(default_box.lower(), None)
+            if target is not None:
+                for key, (code, count) in target[1].items():
+                    add_count(merged, key, code, count)
+            boxes = {default_box.lower(): [target[0] if target else default_box, merged], **boxes}
+        return [(box_number, counts) for box_number, counts in boxes.values() if counts]
+
+
+def add_count(counts, key, code, count=1):
+    """Cộng count lần quét của một mã vào counts ({key: [mã hiển thị, số lần]})"""
+    entry = counts.get(key)
+    if entry is None:
+        counts[key] = [code, count]
+    else:
+        entry[1] += count
+
+
+def _split_fields(line):
+    return [field.strip().strip('"\'').strip() for field in _DELIMITERS.split(line)]
+
+
+def _parse_quantity(text):
+    """Số lượng trên một dòng (số nguyên dương hợp lý), None nếu không phải số lượng"""
+    text = clean_isbn_text(text)
+    if not text.isdigit():
+        return None
+    value = int(text)
+    return value if 0 < value <= _MAX_LINE_QUANTITY else None
+
+
+def _find_header(fields):
+    """{'isbn': cột, 'box': cột, 'quantity': cột} nếu dòng là tiêu đề CSV, ngược lại None"""
+    columns = {}
+    for position, field in enumerate(fields):
+        name = field.lower()
+        if 'isbn' not in columns and (name in _ISBN_HEADERS or 'isbn' in name or 'barcode' in name):
+            columns['isbn'] = position
+        elif 'box' not in columns and (is_box_column(name) or 'thùng' in name or 'thung' in name or name == 'box'):
+            columns['box'] = position
+        elif 'quantity' not in columns and name in _QUANTITY_HEADERS:
+            columns['quantity'] = position
+    return columns if 'isbn' in columns else None
+
+
+def _box_marker(text, known_boxes):
+    """Mã thùng nếu dòng là dấu thùng, ngược lại None"""
+    match = _BOX_MARKER.match(text)
+    if match:
+        box = match.group(1).strip()
+        return known_boxes.get(box.lower(), box)
+    return known_boxes.get(text.lower())
+
+
+def parse_scan_lines(lines, box_numbers=()):
+    """Đọc các dòng của file mã quét thành ScanDump
+
+    box_numbers: các mã thùng trong dữ liệu đầu vào - một dòng chỉ có mã thùng được coi là dấu thùng.
+    """
+    known_boxes = {str(box).strip().lower(): str(box).strip() for box in box_numbers if str(box).strip()}
+    dump = ScanDump()
+    counts = dump.unassigned
+    header = None
+    keys = {}  # Mã -> key chuẩn (file quét lặp lại cùng mã rất nhiều lần)
+
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        fields = _split_fields(line)
+        if header is None and len(fields) > 1 and dump.code_count == 0 and not dump.boxes:
+            header = _find_header(fields)
+            if header is not None:
+                continue
+
+        box = None
+        quantity = 1
+        if header is not None:
+            code = fields[header['isbn']] if header['isbn'] < len(fields) else ''
+            if 'box' in header and header['box'] < len(fields) and fields[header['box']]:
+                box = fields[header['box']]
+            if 'quantity' in header and header['quantity'] < len(fields) and fields[header['quantity']]:
+                # Ô số lượng không phải số -> bỏ dòng (ô trống tính là 1)
+                quantity = _parse_quantity(fields[header['quantity']]) or 0
+        else:
+            marker = _box_marker(fields[0], known_boxes) if len(fields) == 1 else None
+            if marker is not None:
+                counts = dump.boxes.setdefault(marker.lower(), [marker, {}])[1]
+                continue
+            if len(fields) > 1 and fields[0].lower() in known_boxes:
+                # Dạng mã thùng, mã sách[, số lượng]
+                box, fields = known_boxes[fields[0].lower()], fields[1:]
+            code = fields[0]
+            if len(fields) > 1:
+                quantity = _parse_quantity(fields[1]) or 1
+
+        code = clean_isbn_text(code)
+        if len(code) < MIN_ISBN_LENGTH or quantity <= 0:
+            dump.skipped_lines.append((line_number, line))
+            continue
+        key = keys.get(code)
+        if key is None:
+            key = keys[code] = isbn_key(code)
+        target = counts
+        if box is not None:
+            box = known_boxes.get(box.lower(), box)
+            target = dump.boxes.setdefault(box.lower(), [box, {}])[1]
+        add_count(target, key, code, quantity)
+        dump.code_count += quantity
+    return dump
+
+
+def read_scan_dump(path, box_numbers=()):
+    """Đọc file mã quét (.txt/.csv) thành ScanDump"""
+    data = Path(path).read_bytes()
+    if data[:2] in (b'\xff\xfe', b'\xfe\xff'):
+        return parse_scan_lines(data.decode('utf-16').splitlines(), box_numbers)
+    text = None
+    for encoding in _ENCODINGS:
+        try:
+            text = data.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    if text is None:
+        text = data.decode('latin-1')
+    return parse_scan_lines(text.splitlines(), box_numbers)
+
+
+def format_import_summary(dump, results):
+    """Nội dung tóm tắt kết quả đối chiếu file mã quét (hiển thị trước khi lưu vào Tổng hợp)"""
+    code_count = sum(len(counts) for _, counts in dump.batches()) + len(dump.unassigned)
+    lines = [f"Đã đọc {dump.code_count:,} lần quét ({code_count:,} mã) từ file."]
+    imported = [result for result in results if result.records]
+    for result in imported[:_SUMMARY_MAX_BOXES]:
+        mismatched = sum(1 for record in result.records if record.get('Tình trạng', ''))
+        details = []
+        if mismatched:
+            details.append(f"Thiếu/Dư: {mismatched}")
+        if result.not_in_box:
+            details.append(f"không thuộc thùng: {len(result.not_in_box)}")
+        if result.missing_titles:
+            details.append(f"chưa quét: {result.missing_titles} tựa")
+        suffix = f" ({', '.join(details)})" if details else ""
+        lines.append(f"- Thùng {result.box_number}: {len(result.records)} dòng, {result.scan_count:,} cuốn{suffix}")
+    if len(imported) > _SUMMARY_MAX_BOXES:
+        lines.append(f"... và {len(imported) - _SUMMARY_MAX_BOXES} thùng khác")
+
+    skipped = []
+    already_saved = sum(len(result.already_saved) for result in results)
+    if already_saved:
+        skipped.append(f"{already_saved} ISBN đã lưu trong Tổng hợp")
+    bad_checksum = sum(len(result.bad_checksum) for result in results)
+    if bad_checksum:
+        skipped.append(f"{bad_checksum} mã sai số kiểm tra (check digit)")
+    if dump.skipped_lines:
+        skipped.append(f"{len(dump.skipped_lines)} dòng không đọc được")
+    unknown_boxes = [result.box_number for result in results if result.status == IMPORT_UNKNOWN_BOX]
+    if unknown_boxes:
+        skipped.append(f"thùng không có trong dữ liệu đầu vào: {', '.join(unknown_boxes[:10])}"
+                       + (f" và {len(unknown_boxes) - 10} thùng khác" if len(unknown_boxes) > 10 else ""))
+    if any(result.status == IMPORT_NO_DATA for result in results):
+        skipped.append("chưa có dữ liệu đầu vào (cột ISBN)")
+    if skipped:
+        lines.append("")
+        lines.append("Bỏ qua: " + "; ".join(skipped) + ".")
+    return "\n".join(lines)
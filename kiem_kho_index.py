@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chỉ mục tra cứu dùng chung cho Kiểm Kho và Kiểm Kho Showroom
+Xây dựng một lần khi load dữ liệu để mỗi lần quét không phải duyệt lại toàn bộ DataFrame
+"""
+
+from kiem_kho_isbn import isbn_key, record_isbn_key
+
+
+class IsbnIndex:
+    """Chỉ mục ISBN theo key chuẩn (kiem_kho_isbn.isbn_key): một lần tra dict cho mỗi mã quét
+
+    Xây từ danh sách key đã tính sẵn của các dòng; kết quả là vị trí dòng (0-based) đầu tiên có key khớp
+    (giống .iloc[0]) theo thứ tự danh sách truyền vào.
+    """
+
+    __slots__ = ('_positions', '_size')
+
+    def __init__(self, keys):
+        self._positions = {}
+        position = -1
+        for position, key in enumerate(keys):
+            if key:
+                # setdefault giữ vị trí xuất hiện đầu tiên
+                self._positions.setdefault(key, position)
+        self._size = position + 1
+
+    def __len__(self):
+        return self._size
+
+    def find_key(self, key):
+        """Vị trí dòng có key chuẩn này, None nếu không có"""
+        return self._positions.get(key) if key else None
+
+    def find(self, isbn):
+        """Tìm vị trí dòng khớp với ISBN quét được, trả về None nếu không khớp"""
+        return self.find_key(isbn_key(isbn))
+
+
+class BoxPartition:
+    """Phân vùng dữ liệu đầu vào theo số thùng (giống groupby), xây một lần sau khi load
+
+    - positions: {số thùng viết thường: [vị trí dòng trong DataFrame]} theo thứ tự gốc
+    - box_numbers: tập mã thùng gốc (đã strip, bỏ rỗng/NaN) - dùng để kiểm tra trùng mã thùng
+    """
+
+    __slots__ = ('positions', 'box_numbers')
+
+    def __init__(self, box_values, valid_flags=None):
+        self.positions = {}
+        self.box_numbers = set()
+        if valid_flags is None:
+            valid_flags = [True] * len(box_values)
+        for position, (box, is_valid) in enumerate(zip(box_values, valid_flags)):
+            box_clean = str(box).strip()
+            self.positions.setdefault(box_clean.lower(), []).append(position)
+            if is_valid and box_clean:
+                self.box_numbers.add(box_clean)
+
+    def get_positions(self, box_number):
+        """Lấy danh sách vị trí dòng của một thùng (không phân biệt chữ hoa/thường)"""
+        return self.positions.get(str(box_number).strip().lower(), [])
+
+
+def build_box_isbn_indexes(box_partition, isbn_keys):
+    """Xây chỉ mục ISBN cho từng thùng (key là số thùng viết thường) từ key ISBN chuẩn của các dòng
+
+    Vị trí trong mỗi chỉ mục là vị trí dòng bên trong thùng đó, theo thứ tự xuất hiện
+    trong DataFrame gốc - khớp với current_box_data sau khi lọc theo thùng
+    """
+    return {box: IsbnIndex([isbn_keys[pos] for pos in positions])
+            for box, positions in box_partition.positions.items()}
+
+
+class IsbnBoxIndex:
+    """Chỉ mục ngược trên toàn bộ dữ liệu đầu vào: ISBN -> các thùng chứa ISBN và tồn trong từng thùng
+
+    Xây một lần khi load để ISBN không có trong thùng đang kiểm (sách để nhầm thùng) tra được ngay
+    thùng gốc bằng một lần tra dict. Tồn của cùng ISBN xuất hiện nhiều dòng trong một thùng được cộng dồn.
+    """
+
+    __slots__ = ('_locations', '_box_keys')
+
+    def __init__(self, isbn_keys=(), boxes=(), quantities=()):
+        # {key ISBN: {số thùng viết thường: [mã thùng gặp đầu tiên, tồn]}} theo thứ tự xuất hiện
+        self._locations = {}
+        self._box_keys = {}  # {số thùng viết thường: [key ISBN]} - để bỏ một thùng khi đọc dần
+        for key, box, quantity in zip(isbn_keys, boxes, quantities):
+            self.add(key, box, quantity)
+
+    def __len__(self):
+        return len(self._locations)
+
+    def add(self, key, box, quantity=0):
+        """Thêm một dòng (key ISBN chuẩn, mã thùng, tồn)"""
+        if not key:
+            return
+        box_number = str(box).strip()
+        box_key = box_number.lower()
+        boxes = self._locations.setdefault(key, {})
+        location = boxes.get(box_key)
+        if location is None:
+            boxes[box_key] = [box_number, quantity]
+            self._box_keys.setdefault(box_key, []).append(key)
+        else:
+            location[1] += quantity
+
+    def remove_box(self, box_number):
+        """Bỏ tất cả ISBN của một thùng (thùng đọc dần lại có thêm dòng)"""
+        box_key = str(box_number).strip().lower()
+        for key in self._box_keys.pop(box_key, ()):
+            boxes = self._locations.get(key)
+            if boxes is None:
+                continue
+            boxes.pop(box_key, None)
+            if not boxes:
+                del self._locations[key]
+
+    def find(self, isbn):
+        """[(mã thùng, tồn)] của ISBN trong dữ liệu đầu vào, rỗng nếu không có"""
+        boxes = self._locations.get(isbn_key(isbn))
+        return [tuple(location) for location in boxes.values()] if boxes else []
+
+    def __contains__(self, isbn):
+        return isbn_key(isbn) in self._locations
+
+
+class TongHopIndex:
+    """Chỉ mục cập nhật tăng dần trên tong_hop_data
+
+    Key theo thùng là 'Số thùng' và 'Vị trí mới' (viết thường) - giống cách so khớp thùng cũ.
+    Phải gọi add/remove khi thêm, sửa (remove trước, add sau) hoặc xóa dòng, và rebuild khi
+    thay cả danh sách (khôi phục backup) để các kiểm tra khi quét là O(1) thay vì duyệt toàn bộ.
+    """
+
+    __slots__ = ('_box_isbns', '_box_row_counts', '_box_valid_counts')
+
+    def __init__(self, records=()):
+        self.rebuild(records)
+
+    @staticmethod
+    def _box_keys(record):
+        return {str(record.get('Số thùng', '')).strip().lower(),
+                str(record.get('Vị trí mới', '')).strip().lower()}
+
+    def rebuild(self, records):
+        self._box_isbns = {}
+        self._box_row_counts = {}
+        self._box_valid_counts = {}
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        key = record_isbn_key(record)
+        # Mặc định là hợp lệ để tương thích với dữ liệu cũ không có _is_valid_isbn
+        is_valid = record.get('_is_valid_isbn', True) is not False
+        for box_key in self._box_keys(record):
+            box_isbns = self._box_isbns.get(box_key)
+            if box_isbns is None:
+                box_isbns = self._box_isbns[box_key] = {}  # {key ISBN: số dòng}
+            box_isbns[key] = box_isbns.get(key, 0) + 1
+            self._box_row_counts[box_key] = self._box_row_counts.get(box_key, 0) + 1
+            if is_valid:
+                self._box_valid_counts[box_key] = self._box_valid_counts.get(box_key, 0) + 1
+
+    def remove(self, record):
+        key = record_isbn_key(record)
+        is_valid = record.get('_is_valid_isbn', True) is not False
+        for box_key in self._box_keys(record):
+            box_isbns = self._box_isbns.get(box_key)
+            if box_isbns is None:
+                continue
+            count = box_isbns.get(key, 0)
+            if count > 1:
+                box_isbns[key] = count - 1
+            else:
+                box_isbns.pop(key, None)
+            if not box_isbns:
+                del self._box_isbns[box_key]
+            self._box_row_counts[box_key] = max(self._box_row_counts.get(box_key, 0) - 1, 0)
+            if is_valid:
+                self._box_valid_counts[box_key] = max(self._box_valid_counts.get(box_key, 0) - 1, 0)
+
+    def contains_isbn_in_box(self, isbn, so_thung):
+        """ISBN đã được lưu cho thùng này chưa (khớp 'Số thùng' hoặc 'Vị trí mới')"""
+        box_isbns = self._box_isbns.get(str(so_thung).strip().lower())
+        return box_isbns is not None and isbn_key(isbn) in box_isbns
+
+    def count_rows_for_box(self, so_thung, valid_only=False):
+        """Số dòng đã lưu cho thùng (valid_only=True: chỉ đếm ISBN tồn tại trong dữ liệu)"""
+        box_key = str(so_thung).strip().lower()
+        counts = self._box_valid_counts if valid_only else self._box_row_counts
+        return counts.get(box_key, 0)
+
+
+# Key lưu id bền của mỗi dòng trong tong_hop_data (được lưu cùng dòng trong backup)
+ROW_ID_KEY = '_row_id'
+
+
+class RowRegistry:
+    """Map id -> dòng cho tong_hop_data
+
+    Mỗi dòng mang một id bền (ROW_ID_KEY) được dùng làm iid trong Treeview, nên sửa/xóa dòng
+    tra được dòng trong O(1) thay vì tìm vị trí trong danh sách. Dòng cũ chưa có id (backup
+    từ phiên bản trước) được cấp id khi rebuild.
+    """
+
+    __slots__ = ('records', '_next_id')
+
+    def __init__(self, records=()):
+        self.rebuild(records)
+
+    def rebuild(self, records):
+        self.records = {}
+        self._next_id = 1
+        pending = []
+        for record in records:
+            row_id = record.get(ROW_ID_KEY)
+            if isinstance(row_id, int) and row_id not in self.records:
+                self.records[row_id] = record
+                self._next_id = max(self._next_id, row_id + 1)
+            else:
+                pending.append(record)
+        for record in pending:
+            self.add(record)
+
+    def add(self, record):
+        """Cấp id (nếu chưa có) và đăng ký dòng, trả về id"""
+        row_id = record.get(ROW_ID_KEY)
+        if not isinstance(row_id, int) or self.records.get(row_id, record) is not record:
+            row_id = self._next_id
+            record[ROW_ID_KEY] = row_id
+        self._next_id = max(self._next_id, row_id + 1)
+        self.records[row_id] = record
+        return row_id
+
+    def remove(self, row_id):
+        return self.records.pop(row_id, None)
+
+    def get(self, row_id):
+        """Lấy dòng theo id (nhận cả iid dạng chuỗi của Treeview), None nếu không có"""
+        try:
+            return self.records.get(int(row_id))
+        except (TypeError, ValueError):
+            return None
+
+
+def parse_quantity(value):
+    """Đổi 'Tồn thực tế' sang số (rỗng/không hợp lệ = 0)"""
+    try:
+        return float(value or 0)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def format_quantity(value):
+    """Chuyển 'Tồn thực tế' đã cộng dồn về string để hiển thị (loại bỏ .0 nếu là số nguyên)"""
+    if isinstance(value, float):
+        if value == int(value):
+            return str(int(value))
+        return str(value)
+    return str(value)
+
+
+class TongHopAggregate:
+    """Cộng dồn tong_hop_data theo (key ISBN chuẩn, Số thùng), cập nhật tăng dần khi thêm/sửa/xóa dòng
+
+    rows: các dòng cộng dồn theo thứ tự xuất hiện của nhóm - bản sao dòng đầu tiên của nhóm,
+    'Tồn thực tế' là tổng của nhóm (string hiển thị), '_member_ids' là id các dòng thuộc nhóm.
+    Tổng được giữ dạng số nên làm mới bảng/xuất file là O(số nhóm), không parse lại số lượng.
+    """
+
+    __slots__ = ('rows', '_positions', '_sums', '_quantities')
+
+    def __init__(self, records=()):
+        self.rows = []
+        self.rebuild(records)
+
+    @staticmethod
+    def key_of(record):
+        # ISBN-10 và EAN-13 của cùng cuốn sách cộng chung một nhóm
+        return (record_isbn_key(record), str(record.get('Số thùng', '')).strip())
+
+    def rebuild(self, records):
+        # Giữ nguyên object rows (bảng tổng hợp đang tham chiếu)
+        del self.rows[:]
+        self._positions = {}
+        self._sums = {}
+        self._quantities = {}  # id dòng -> số lượng đã cộng vào tổng
+        for record in records:
+            self.add(record)
+
+    def add(self, record):
+        """Cộng dòng vào nhóm, trả về (vị trí nhóm, True nếu là nhóm mới)"""
+        key = self.key_of(record)
+        row_id = record.get(ROW_ID_KEY)
+        quantity = parse_quantity(record.get('Tồn thực tế', 0))
+        self._quantities[row_id] = quantity
+
+        position = self._positions.get(key)
+        if position is None:
+            # Dòng đầu tiên - giữ nguyên tất cả thông tin (id dòng đầu là iid của nhóm trên bảng)
+            row = dict(record)
+            row['_member_ids'] = [row_id]
+            self._sums[key] = quantity
+            row['Tồn thực tế'] = format_quantity(quantity)
+            position = len(self.rows)
+            self._positions[key] = position
+            self.rows.append(row)
+            return position, True
+
+        row = self.rows[position]
+        row['_member_ids'].append(row_id)
+        self._sums[key] += quantity
+        row['Tồn thực tế'] = format_quantity(self._sums[key])
+        return position, False
+
+    def update_quantity(self, record):
+        """Dòng đã sửa 'Tồn thực tế' - cập nhật tổng của nhóm, trả về vị trí nhóm (None nếu không có)"""
+        key = self.key_of(record)
+        position = self._positions.get(key)
+        if position is None:
+            return None
+        row_id = record.get(ROW_ID_KEY)
+        quantity = parse_quantity(record.get('Tồn thực tế', 0))
+        self._sums[key] += quantity - self._quantities.get(row_id, 0.0)
+        self._quantities[row_id] = quantity
+        self.rows[position]['Tồn thực tế'] = format_quantity(self._sums[key])
+        return position
+
+    def remove_records(self, records, get_record):
+        """Bỏ các dòng khỏi nhóm của chúng (xử lý một lần cho nhiều dòng)
+
+        get_record(id) trả về dòng còn lại để làm dòng hiển thị khi dòng đầu của nhóm bị xóa.
+        Trả về (vị trí các nhóm bị xóa hẳn - theo vị trí trước khi xóa, vị trí các nhóm còn lại bị đổi).
+        """
+        touched = set()
+        for record in records:
+            key = self.key_of(record)
+            position = self._positions.get(key)
+            if position is None:
+                continue
+            row_id = record.get(ROW_ID_KEY)
+            member_ids = self.rows[position]['_member_ids']
+            if row_id not in member_ids:
+                continue
+            member_ids.remove(row_id)
+            self._sums[key] -= self._quantities.pop(row_id, 0.0)
+            touched.add(key)
+
+        removed_positions = []
+        updated_keys = []
+        for key in touched:
+            position = self._positions[key]
+            row = self.rows[position]
+            member_ids = row['_member_ids']
+            if not member_ids:
+                removed_positions.append(position)
+                del self._positions[key]
+                del self._sums[key]
+                continue
+            first = get_record(member_ids[0])
+            if first is not None and first.get(ROW_ID_KEY) != row.get(ROW_ID_KEY):
+                # Dòng đầu của nhóm đã bị xóa - hiển thị thông tin dòng đầu còn lại
+                row.clear()
+                row.update(first)
+                row['_member_ids'] = member_ids
+            row['Tồn thực tế'] = format_quantity(self._sums[key])
+            updated_keys.append(key)
+
+        if removed_positions:
+            removed_set = set(removed_positions)
+            self.rows[:] = [row for position, row in enumerate(self.rows) if position not in removed_set]
+            self._positions = {self.key_of(row): position for position, row in enumerate(self.rows)}
+        return sorted(removed_positions), [self._positions[key] for key in updated_keys]
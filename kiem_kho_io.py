@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Luồng ghi file chạy nền (backup, xuất Excel) để mainloop Tk không bị chặn khi ghi đĩa
+
+Tác vụ được đưa vào hàng đợi giới hạn và chạy tuần tự trên một thread riêng. Tác vụ có cùng
+key đang chờ sẽ được gộp (chỉ giữ lần gửi mới nhất). Kết quả được trả về main thread bằng
+root.after (polling) - không gọi Tk từ thread nền.
+"""
+
+import queue
+import threading
+import traceback
+from collections import deque
+
+
+class IoTask:
+    """Một tác vụ ghi file: func(*args) chạy trên thread nền"""
+
+    __slots__ = ('func', 'args', 'key', 'on_done', 'on_error')
+
+    def __init__(self, func, args, key, on_done, on_error):
+        self.func = func
+        self.args = args
+        self.key = key
+        self.on_done = on_done
+        self.on_error = on_error
+
+
+class IoWorker:
+    """Thread ghi file nền với hàng đợi giới hạn và gộp tác vụ trùng key"""
+
+    def __init__(self, root, name='io-worker', maxsize=32, poll_ms=50):
+        self.root = root
+        self.maxsize = maxsize
+        self.poll_ms = poll_ms
+        self._tasks = deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._results = queue.Queue()  # (callback, value) chờ chạy trên main thread
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        self._schedule_poll()
+
+    def submit(self, func, *args, key=None, on_done=None, on_error=None):
+        """Đưa tác vụ vào hàng đợi (gọi từ main thread)
+
+        key: nếu đã có tác vụ cùng key đang chờ thì thay thế tại chỗ (gộp), không thêm mới.
+        on_done(result) / on_error(exception) được gọi trên main thread qua root.after.
+        """
+        task = IoTask(func, args, key, on_done, on_error)
+        with self._cond:
+            if key is not None:
+                for index, pending in enumerate(self._tasks):
+                    if pending.key == key:
+                        self._tasks[index] = task
+                        return
+            # Hàng đợi đầy -> chờ thread nền xử lý bớt (chỉ xảy ra khi ghi đĩa rất chậm)
+            while len(self._tasks) >= self.maxsize:
+                self._cond.wait()
+            self._tasks.append(task)
+            self._cond.notify_all()
+
+    def cancel_pending(self):
+        """Bỏ tất cả tác vụ đang chờ (tác vụ đang chạy vẫn chạy xong)"""
+        with self._cond:
+            self._tasks.clear()
+            self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Chờ đến khi hàng đợi rỗng và không còn tác vụ đang chạy"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._tasks and not self._busy, timeout)
+
+    @property
+    def pending_count(self):
+        with self._cond:
+            return len(self._tasks) + (1 if self._busy else 0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._tasks:
+                    self._cond.wait()
+                task = self._tasks.popleft()
+                self._busy = True
+                self._cond.notify_all()
+            try:
+                result = task.func(*task.args)
+                if task.on_done is not None:
+                    self._results.put((task.on_done, result))
+            except Exception as e:
+                print(f"Lỗi khi chạy tác vụ ghi file nền: {str(e)}")
+                traceback.print_exc()
+                if task.on_error is not None:
+                    self._results.put((task.on_error, e))
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _schedule_poll(self):
+        try:
+            self.root.after(self.poll_ms, self._poll)
+        except Exception:
+            # Root đã bị destroy - dừng polling
+            pass
+
+    def _poll(self):
+        """Chạy các callback hoàn tất trên main thread"""
+        while True:
+            try:
+                callback, value = self._results.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(value)
+            except Exception as e:
+                print(f"Lỗi trong callback tác vụ nền: {str(e)}")
+                traceback.print_exc()
+        self._schedule_poll()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chuẩn hóa ISBN dùng chung cho Kiểm Kho và Kiểm Kho Showroom
+
+Mỗi mã (ô dữ liệu đầu vào, dòng Tổng hợp, mã quét) được đổi một lần sang key chuẩn:
+- ISBN-10 (kể cả check digit X), EAN-13/ISBN-13, UPC-A (12 số) -> EAN-13 đã kiểm tra check digit,
+  nên ISBN-10 và ISBN-13 của cùng một cuốn sách có cùng key
+- Bỏ đuôi '.0' do Excel lưu số dạng float, dấu gạch ngang/khoảng trắng, tiền tố 'ISBN'
+- Số 0 đầu bị Excel cắt mất (ISBN-10 còn 9 số, EAN-13 còn 12 số) được thêm lại nếu check digit khớp
+- Mã không phải ISBN/EAN (mã nội bộ, ASIN...) giữ nguyên dạng đã làm sạch, viết hoa
+
+So khớp ISBN chỉ còn là một lần tra dict theo key (không còn endswith hai chiều).
+"""
+
+import re
+
+# Ô số bị Excel lưu dạng float: '9786041234567.0'
+_FLOAT_ARTEFACT = re.compile(r'^(\d+)\.0+$')
+# Dấu phân cách trong ISBN in trên sách: 978-604-1-23456-7, 978 604 ...
+_SEPARATORS = re.compile(r'[\s\-‐‑–]+')
+# Số thứ tự (1, 2, 3... lưu dạng float) trong cột ISBN - không phải mã sách
+_SERIAL_NUMBER_MAX_DIGITS = 7
+# Mã ngắn hơn (sau khi bỏ '.0') bị loại khi đọc dữ liệu đầu vào
+MIN_ISBN_LENGTH = 4
+
+
+def clean_isbn_text(value):
+    """Chuỗi ISBN để hiển thị/lưu: strip, bỏ đuôi '.0' của số float, '' nếu rỗng/NaN"""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if value != value:
+            return ''
+        if value.is_integer():
+            return str(int(value))
+    text = str(value).strip()
+    if text.lower() in ('nan', 'none'):
+        return ''
+    match = _FLOAT_ARTEFACT.match(text)
+    return match.group(1) if match else text
+
+
+def _ean13_check_digit(digits12):
+    total = sum(int(digit) * (3 if position % 2 else 1) for position, digit in enumerate(digits12))
+    return str((10 - total % 10) % 10)
+
+
+def _isbn10_is_valid(code):
+    total = 0
+    for position, char in enumerate(code):
+        total += (10 - position) * (10 if char == 'X' else int(char))
+    return total % 11 == 0
+
+
+def to_ean13(code):
+    """EAN-13 của một mã số (ISBN-10, EAN-13, UPC-A, hoặc thiếu số 0 đầu), None nếu sai check digit"""
+    if len(code) == 13 and code.isdigit():
+        return code if _ean13_check_digit(code[:12]) == code[12] else None
+    if len(code) == 12 and code.isdigit():
+        # UPC-A, hoặc EAN-13 bị Excel cắt số 0 đầu
+        return to_ean13('0' + code)
+    if len(code) == 9 and code.isdigit():
+        # ISBN-10 bị Excel cắt số 0 đầu
+        return to_ean13('0' + code)
+    if len(code) == 10 and code[:9].isdigit() and (code[9].isdigit() or code[9] == 'X'):
+        if not _isbn10_is_valid(code):
+            return None
+        body = '978' + code[:9]
+        return body + _ean13_check_digit(body)
+    return None
+
+
+def _compact(value):
+    """Mã đã bỏ '.0', dấu phân cách và tiền tố ISBN, viết hoa"""
+    compact = _SEPARATORS.sub('', clean_isbn_text(value)).upper()
+    if compact.startswith('ISBN'):
+        compact = compact[4:].lstrip(':')
+    return compact
+
+
+def _is_numeric_code(compact):
+    return compact.isdigit() or (len(compact) == 10 and compact[:9].isdigit() and compact[9] == 'X')
+
+
+def isbn_key(value):
+    """Key chuẩn để so khớp: EAN-13 nếu là ISBN/EAN hợp lệ, ngược lại là mã đã làm sạch ('' nếu rỗng)"""
+    compact = _compact(value)
+    if _is_numeric_code(compact):
+        return to_ean13(compact) or compact
+    return compact
+
+
+def record_isbn_key(record):
+    """Key chuẩn của một dòng Tổng hợp (TongHopRecord lưu sẵn key, dict thì tính từ cột 'ISBN')"""
+    key = getattr(record, 'isbn_key', None)
+    return key if key is not None else isbn_key(record.get('ISBN', ''))
+
+
+def is_checksum_error(value):
+    """Mã có dạng ISBN-10/EAN-13 (10 hoặc 13 số) nhưng sai check digit - thường là quét/gõ nhầm"""
+    compact = _compact(value)
+    return len(compact) in (10, 13) and _is_numeric_code(compact) and to_ean13(compact) is None
+
+
+def is_input_isbn(value):
+    """Ô ISBN của một dòng dữ liệu đầu vào có phải mã sách không
+
+    Loại ô rỗng, mã quá ngắn và số thứ tự Excel lưu dạng float (1.0, 2.0...); ISBN lưu dạng float
+    (9786041234567.0) vẫn được giữ lại.
+    """
+    if value is None or (isinstance(value, float) and value != value):
+        return False
+    text = clean_isbn_text(value)
+    if len(text) < MIN_ISBN_LENGTH:
+        return False
+    raw = str(value).strip()
+    if not (isinstance(value, float) or _FLOAT_ARTEFACT.match(raw) or raw.endswith('.')):
+        return True
+    digits = text.rstrip('.')
+    return not (digits.isdigit() and len(digits) <= _SERIAL_NUMBER_MAX_DIGITS)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Journal backup (write-ahead, append-only) dùng chung cho Kiểm Kho và Kiểm Kho Showroom
+
+File backup JSON cũ được giữ làm snapshot. Mỗi thay đổi sau snapshot chỉ ghi thêm một dòng
+JSON (thêm dòng, sửa dòng, xóa dòng, trạng thái đang quét) vào file .journal cạnh snapshot.
+Khi khôi phục: đọc snapshot rồi phát lại các thao tác trong journal.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+
+from kiem_kho_index import ROW_ID_KEY
+from kiem_kho_records import json_default
+
+# Ngưỡng gộp journal vào snapshot (compaction)
+JOURNAL_MAX_ENTRIES = 2000
+JOURNAL_MAX_BYTES = 8 * 1024 * 1024  # 8MB
+
+# Các loại thao tác trong journal
+OP_ADD_ROWS = 'add_rows'        # {'rows': [record, ...]} - thêm vào cuối tong_hop_data
+OP_UPDATE_ROW = 'update_row'    # {'row_id': id, 'row': record} - thay dòng có id (bản cũ: {'index': i})
+OP_DELETE_ROWS = 'delete_rows'  # {'row_ids': [id, ...]} - xóa các dòng theo id (bản cũ: {'indices': [...]})
+OP_SCAN_STATE = 'scan_state'    # {'scanned_items': {...}, 'current_box_number': ...}
+
+
+def new_journal_id():
+    """Tạo id mới cho cặp snapshot/journal"""
+    return uuid.uuid4().hex
+
+
+class BackupJournal:
+    """File journal JSON-lines gắn với một snapshot backup
+
+    Dòng đầu tiên là header {'journal_id': ...}. Journal chỉ hợp lệ khi journal_id trùng với
+    journal_id lưu trong snapshot - nếu lệch (ví dụ crash giữa lúc ghi snapshot và reset journal)
+    thì snapshot đã chứa đầy đủ dữ liệu và journal cũ bị bỏ qua.
+
+    Trạng thái logic (journal_id, số dòng) do main thread quản lý; việc ghi file (reset, write_line)
+    có thể chạy trên thread ghi nền - dùng lock để không ghi chồng với lần lưu đồng bộ khi thoát.
+    """
+
+    def __init__(self, snapshot_path):
+        self.snapshot_path = snapshot_path
+        self.journal_path = snapshot_path.with_suffix('.journal')
+        self.journal_id = None  # None = chưa có snapshot trong phiên này, chưa được ghi journal
+        self.entry_count = 0
+        self.byte_count = 0
+        self.failed = False  # Ghi snapshot lỗi -> phải ghi snapshot mới trước khi journal tiếp
+        self.lock = threading.Lock()
+        self._disk_journal_id = None  # journal_id của file journal trên đĩa
+
+    @property
+    def is_active(self):
+        return self.journal_id is not None and not self.failed
+
+    def needs_compaction(self):
+        """Journal đã đủ lớn để gộp vào snapshot chưa"""
+        return self.entry_count >= JOURNAL_MAX_ENTRIES or self.byte_count >= JOURNAL_MAX_BYTES
+
+    def begin(self, journal_id):
+        """Bắt đầu journal mới về mặt logic (gọi khi gửi snapshot đi ghi)"""
+        self.journal_id = journal_id
+        self.entry_count = 0
+        self.byte_count = 0
+        self.failed = False
+
+    def make_line(self, op, payload):
+        """Chuyển thao tác thành một dòng JSON (bất biến, có thể ghi sau trên thread nền)"""
+        line = json.dumps({'op': op, 'timestamp': time.time(), **payload}, ensure_ascii=False,
+                          default=json_default) + '\n'
+        self.entry_count += 1
+        self.byte_count += len(line)
+        return line
+
+    def reset(self, journal_id):
+        """Ghi file journal mới (chỉ có header) sau khi đã ghi snapshot có cùng journal_id"""
+        header = json.dumps({'journal_id': journal_id}, ensure_ascii=False) + '\n'
+        with open(self.journal_path, 'w', encoding='utf-8') as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+        self._disk_journal_id = journal_id
+
+    def write_line(self, journal_id, line):
+        """Ghi thêm một dòng (flush + fsync để không mất khi cúp điện)
+
+        Bỏ qua nếu snapshot tương ứng chưa được ghi thành công (journal trên đĩa khác id)
+        """
+        with self.lock:
+            if self._disk_journal_id != journal_id:
+                return False
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            return True
+
+    def read_entries(self, journal_id):
+        """Đọc các thao tác của journal có journal_id khớp với snapshot (bỏ qua dòng cuối bị ghi dở)"""
+        if not self.journal_path.exists():
+            return []
+        entries = []
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            header_line = f.readline()
+            try:
+                header = json.loads(header_line)
+            except ValueError:
+                return []
+            if header.get('journal_id') != journal_id:
+                return []
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Dòng ghi dở do crash - các dòng sau (nếu có) không đáng tin
+                    break
+        return entries
+
+
+def replay_journal(entries, scanned_items, tong_hop_data, current_box_number):
+    """Phát lại các thao tác journal lên dữ liệu snapshot, trả về (scanned_items, tong_hop_data, current_box_number)"""
+    records_by_id = None  # id -> dòng, chỉ xây khi gặp thao tác theo id
+
+    def get_records_by_id():
+        nonlocal records_by_id
+        if records_by_id is None:
+            records_by_id = {data.get(ROW_ID_KEY): data for data in tong_hop_data}
+        return records_by_id
+
+    for entry in entries:
+        op = entry.get('op')
+        if op == OP_ADD_ROWS:
+            rows = entry.get('rows', [])
+            tong_hop_data.extend(rows)
+            if records_by_id is not None:
+                for data in rows:
+                    records_by_id[data.get(ROW_ID_KEY)] = data
+        elif op == OP_UPDATE_ROW:
+            if 'row_id' in entry:
+                data = get_records_by_id().get(entry['row_id'])
+                if data is not None:
+                    # Sửa tại chỗ để vị trí dòng trong tong_hop_data không đổi
+                    data.clear()
+                    data.update(entry.get('row', {}))
+            else:
+                index = entry.get('index', -1)
+                if 0 <= index < len(tong_hop_data):
+                    tong_hop_data[index] = entry.get('row', {})
+                    records_by_id = None
+        elif op == OP_DELETE_ROWS:
+            if 'row_ids' in entry:
+                row_ids = set(entry.get('row_ids', []))
+                tong_hop_data[:] = [data for data in tong_hop_data if data.get(ROW_ID_KEY) not in row_ids]
+                if records_by_id is not None:
+                    for row_id in row_ids:
+                        records_by_id.pop(row_id, None)
+            else:
+                for index in sorted(entry.get('indices', []), reverse=True):
+                    if 0 <= index < len(tong_hop_data):
+                        del tong_hop_data[index]
+                records_by_id = None
+        elif op == OP_SCAN_STATE:
+            scanned_items = entry.get('scanned_items', {})
+            current_box_number = entry.get('current_box_number')
+    return scanned_items, tong_hop_data, current_box_number
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Engine dữ liệu gọn không cần pandas/numpy cho bản build lite của Kiểm Kho và Kiểm Kho Showroom
+
+Module này thay thế `pandas` trong InventorySession (session.pd) với đúng phần API mà ứng dụng dùng:
+ExcelFile/read_excel (openpyxl read-only, xlrd cho .xls), DataFrame lưu theo cột (list Python),
+lọc theo mask, iloc, rename, dropna, isna/notna. Dữ liệu được đọc theo luồng từng dòng và không
+kéo theo pandas + numpy khi khởi động, nên bản .exe nhỏ hơn và mở nhanh hơn trên máy yếu.
+
+Giá trị trống là None (tương đương NaN của pandas).
+"""
+
+import re
+
+__version__ = 'lite'
+
+# Chuỗi được pandas.read_excel coi là NaN (na_values mặc định)
+_NA_STRINGS = frozenset(('', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+                         '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a',
+                         'nan', 'null'))
+
+
+def isna(value):
+    """Giá trị trống (None hoặc float NaN)"""
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def notna(value):
+    return not isna(value)
+
+
+def _to_str(value):
+    # Giống astype(str) của pandas với cột đọc từ Excel: ô trống -> 'nan'
+    return 'nan' if isna(value) else str(value)
+
+
+class _StrAccessor:
+    """Phần .str của Series/Index được ứng dụng dùng"""
+
+    __slots__ = ('_values', '_factory')
+
+    def __init__(self, values, factory):
+        self._values = values
+        self._factory = factory
+
+    def _map(self, func):
+        return self._factory([func(value) if isinstance(value, str) else None for value in self._values])
+
+    def strip(self):
+        return self._map(str.strip)
+
+    def lower(self):
+        return self._map(str.lower)
+
+    def len(self):
+        return Series([len(value) if isinstance(value, str) else None for value in self._values])
+
+    def replace(self, old, new):
+        # pandas >= 2: regex=False mặc định - thay chuỗi nguyên văn
+        return self._map(lambda value: value.replace(old, new))
+
+    def match(self, pattern):
+        regex = re.compile(pattern)
+        return Series([bool(regex.match(value)) if isinstance(value, str) else False
+                       for value in self._values])
+
+
+class Index(list):
+    """Danh sách tên cột (list có thêm .str như pandas.Index)"""
+
+    @property
+    def str(self):
+        return _StrAccessor(self, Index)
+
+    def tolist(self):
+        return list(self)
+
+
+class Series:
+    """Một cột dữ liệu (list giá trị)"""
+
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        self.values = list(values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __getitem__(self, position):
+        return self.values[position]
+
+    @property
+    def iloc(self):
+        # Truy cập theo vị trí (series.iloc[0]) - list đã hỗ trợ [int] và [slice]
+        return self.values
+
+    @property
+    def str(self):
+        return _StrAccessor(self.values, Series)
+
+    def astype(self, dtype):
+        if dtype is not str:
+            raise TypeError(f"kiem_kho_lite chỉ hỗ trợ astype(str), không hỗ trợ {dtype!r}")
+        return Series([_to_str(value) for value in self.values])
+
+    def notna(self):
+        return Series([notna(value) for value in self.values])
+
+    def isna(self):
+        return Series([isna(value) for value in self.values])
+
+    def tolist(self):
+        return list(self.values)
+
+    # Phép toán trên mask (Series bool) và so sánh với số
+    def __invert__(self):
+        return Series([not value for value in self.values])
+
+    def __and__(self, other):
+        return Series([a and b for a, b in zip(self.values, other)])
+
+    def __or__(self, other):
+        return Series([a or b for a, b in zip(self.values, other)])
+
+    def _compare(self, other, op):
+        return Series([value is not None and op(value, other) for value in self.values])
+
+    def __ge__(self, other):
+        return self._compare(other, lambda a, b: a >= b)
+
+    def __gt__(self, other):
+        return self._compare(other, lambda a, b: a > b)
+
+    def __le__(self, other):
+        return self._compare(other, lambda a, b: a <= b)
+
+    def __lt__(self, other):
+        return self._compare(other, lambda a, b: a < b)
+
+
+class Row:
+    """Một dòng (như Series của pandas khi lấy df.iloc[i]): row.index là tên cột, row[col] là giá trị"""
+
+    __slots__ = ('index', '_values')
+
+    def __init__(self, index, values):
+        self.index = index
+        self._values = dict(zip(index, values))
+
+    def __getitem__(self, column):
+        return self._values[column]
+
+    def get(self, column, default=None):
+        return self._values.get(column, default)
+
+
+class _ILoc:
+    __slots__ = ('_frame',)
+
+    def __init__(self, frame):
+        self._frame = frame
+
+    def __getitem__(self, key):
+        frame = self._frame
+        if isinstance(key, int):
+            return Row(frame.columns, [data[key] for data in frame._data])
+        if isinstance(key, slice):
+            return DataFrame._from_columns(frame.columns, [data[key] for data in frame._data])
+        positions = list(key)
+        return DataFrame._from_columns(frame.columns,
+                                       [[data[position] for position in positions] for data in frame._data])
+
+
+class DataFrame:
+    """Bảng dữ liệu lưu theo cột: columns (Index) và _data (list các list giá trị cùng độ dài)"""
+
+    def __init__(self, data=None, columns=None):
+        if data is None:
+            data = []
+        if isinstance(data, dict):
+            names = list(data)
+            self._init_columns(names, [list(values) for values in data.values()])
+            return
+        rows = list(data)
+        if columns is not None and rows and not isinstance(rows[0], dict):
+            # list các dòng theo vị trí (giống pd.DataFrame(list_of_lists, columns=...)), dòng ngắn -> None
+            width = len(columns)
+            self._init_columns(columns, [[row[position] if position < len(row) else None for row in rows]
+                                         for position in range(width)])
+            return
+        # list các dict (giống pd.DataFrame(list_of_dicts)): cột theo thứ tự key xuất hiện đầu tiên
+        if columns is None:
+            seen = {}
+            for row in rows:
+                for key in row:
+                    seen.setdefault(key, None)
+            columns = list(seen)
+        self._init_columns(columns, [[row.get(column) for row in rows] for column in columns])
+
+    def _init_columns(self, columns, data):
+        self._columns = Index(columns)
+        self._data = data
+
+    @classmethod
+    def _from_columns(cls, columns, data):
+        frame = cls.__new__(cls)
+        frame._init_columns(list(columns), data)
+        return frame
+
+    # ---- Thuộc tính ----
+
+    @property
+    def columns(self):
+        return self._columns
+
+    @columns.setter
+    def columns(self, names):
+        names = list(names)
+        if len(names) != len(self._data):
+            raise ValueError(f"Số tên cột ({len(names)}) khác số cột ({len(self._data)})")
+        self._columns = Index(names)
+
+    def __len__(self):
+        return len(self._data[0]) if self._data else 0
+
+    @property
+    def empty(self):
+        return len(self) == 0 or not self._data
+
+    @property
+    def shape(self):
+        return len(self), len(self._columns)
+
+    @property
+    def iloc(self):
+        return _ILoc(self)
+
+    # ---- Truy cập cột / lọc ----
+
+    def _column_position(self, column):
+        try:
+            return self._columns.index(column)
+        except ValueError:
+            raise KeyError(column) from None
+
+    def __getitem__(self, key):
+        if isinstance(key, Series):
+            mask = key.values
+            return DataFrame._from_columns(self._columns, [[value for value, keep in zip(data, mask) if keep]
+                                                           for data in self._data])
+        if isinstance(key, list):
+            positions = [self._column_position(column) for column in key]
+            return DataFrame._from_columns(key, [list(self._data[position]) for position in positions])
+        return Series(self._data[self._column_position(key)])
+
+    def __setitem__(self, column, values):
+        values = list(values.values if isinstance(values, Series) else values)
+        if self._data and len(values) != len(self):
+            raise ValueError(f"Độ dài cột {column!r} ({len(values)}) khác số dòng ({len(self)})")
+        if column in self._columns:
+            self._data[self._column_position(column)] = values
+        else:
+            self._columns.append(column)
+            self._data.append(values)
+
+    def __contains__(self, column):
+        return column in self._columns
+
+    # ---- Biến đổi (trả về bảng mới như pandas) ----
+
+    def copy(self):
+        return DataFrame._from_columns(self._columns, [list(data) for data in self._data])
+
+    def rename(self, columns=None):
+        mapping = columns or {}
+        return DataFrame._from_columns([mapping.get(column, column) for column in self._columns],
+                                       [list(data) for data in self._data])
+
+    def drop(self, columns=(), errors='raise'):
+        drop = set(columns)
+        missing = drop - set(self._columns)
+        if missing and errors != 'ignore':
+            raise KeyError(sorted(missing, key=str))
+        keep = [position for position, column in enumerate(self._columns) if column not in drop]
+        return DataFrame._from_columns([self._columns[position] for position in keep],
+                                       [list(self._data[position]) for position in keep])
+
+    def dropna(self, how='any'):
+        check = all if how == 'all' else any
+        keep = [position for position in range(len(self))
+                if not check(isna(data[position]) for data in self._data)]
+        return self.iloc[keep]
+
+    # ---- Duyệt ----
+
+    def itertuples(self, index=True):
+        rows = zip(*self._data) if self._data else iter(())
+        if index:
+            return (tuple([position]) + row for position, row in enumerate(rows))
+        return (tuple(row) for row in rows)
+
+    def iterrows(self):
+        for position, values in enumerate(zip(*self._data)):
+            yield position, Row(self._columns, values)
+
+    def __repr__(self):
+        return f"<kiem_kho_lite.DataFrame {len(self)} dòng x {len(self._columns)} cột: {list(self._columns)}>"
+
+
+# ---- Đọc file Excel ----
+
+def _clean_value(value):
+    # Giống read_excel: chuỗi NA -> trống, số nguyên dạng float -> int
+    if isinstance(value, str):
+        return None if value in _NA_STRINGS else value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def clean_row(values):
+    """Giá trị một dòng như read_excel (chuỗi NA -> None, số nguyên dạng float -> int), bỏ ô trống ở cuối"""
+    values = [_clean_value(value) for value in values]
+    # Bảng có max_column lớn hơn vùng dữ liệu thực -> nhiều ô trống ở cuối dòng
+    while values and values[-1] is None:
+        values.pop()
+    return values
+
+
+def header_names(values, width):
+    """Tên cột từ dòng tiêu đề: ô trống -> 'Unnamed: i', tên trùng -> 'tên.1', 'tên.2'..."""
+    names = []
+    counts = {}
+    for position in range(width):
+        name = values[position] if position < len(values) else None
+        if isna(name):
+            name = f"Unnamed: {position}"
+        if name in counts:
+            counts[name] += 1
+            name = f"{name}.{counts[name]}"
+        else:
+            counts[name] = 0
+        names.append(name)
+    return names
+
+
+def _build_frame(rows, header, nrows):
+    """DataFrame từ các dòng đã làm sạch (clean_row), header là vị trí dòng tiêu đề hoặc None"""
+    rows = iter(rows)
+    header_values = []
+    if header is not None:
+        for _ in range(header):
+            next(rows, None)
+        header_values = next(rows, [])
+
+    records = []
+    for values in rows:
+        if nrows is not None and len(records) >= nrows:
+            break
+        records.append(values)
+    # Bỏ các dòng trống ở cuối sheet
+    while records and not records[-1]:
+        records.pop()
+
+    width = max([len(header_values)] + [len(values) for values in records])
+    columns = header_names(header_values, width) if header is not None else list(range(width))
+    data = [[values[position] if position < len(values) else None for values in records]
+            for position in range(width)]
+    return DataFrame._from_columns(columns, data)
+
+
+class ExcelFile:
+    """File Excel mở để đọc (giống pd.ExcelFile): sheet_names, parse(header=0, nrows=None), close()"""
+
+    def __init__(self, path, engine=None):
+        self.path = str(path)
+        if engine is None:
+            engine = 'xlrd' if self.path.lower().endswith('.xls') else 'openpyxl'
+        self.engine = engine
+        if engine == 'xlrd':
+            import xlrd
+            self._book = xlrd.open_workbook(self.path, on_demand=True)
+            self.sheet_names = self._book.sheet_names()
+        else:
+            from openpyxl import load_workbook
+            self._book = load_workbook(self.path, read_only=True, data_only=True)
+            self.sheet_names = self._book.sheetnames
+
+    def _sheet_index(self, sheet_name):
+        if not self.sheet_names:
+            raise ValueError("File Excel không có worksheet nào!")
+        return sheet_name if isinstance(sheet_name, int) else self.sheet_names.index(sheet_name)
+
+    def row_count(self, sheet_name=0):
+        """Số dòng của sheet theo thông tin trong file (có thể gồm dòng trống), None nếu không biết"""
+        try:
+            sheet_index = self._sheet_index(sheet_name)
+            if self.engine == 'xlrd':
+                return self._book.sheet_by_index(sheet_index).nrows
+            return self._book.worksheets[sheet_index].max_row
+        except Exception:
+            return None
+
+    def iter_rows(self, sheet_name=0):
+        """Đọc lần lượt từng dòng của sheet (kể cả dòng tiêu đề), mỗi dòng đã qua clean_row"""
+        for values in self._iter_raw_rows(self._sheet_index(sheet_name)):
+            yield clean_row(values)
+
+    def _iter_raw_rows(self, sheet_index):
+        if self.engine == 'xlrd':
+            import xlrd
+            sheet = self._book.sheet_by_index(sheet_index)
+            datemode = self._book.datemode
+            for row_index in range(sheet.nrows):
+                values = []
+                for cell in sheet.row(row_index):
+                    if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+                        values.append(None)
+                    elif cell.ctype == xlrd.XL_CELL_DATE:
+                        values.append(xlrd.xldate_as_datetime(cell.value, datemode))
+                    elif cell.ctype == xlrd.XL_CELL_BOOLEAN:
+                        values.append(bool(cell.value))
+                    else:
+                        values.append(cell.value)
+                yield values
+        else:
+            yield from self._book.worksheets[sheet_index].iter_rows(values_only=True)
+
+    def parse(self, sheet_name=0, header=0, nrows=None):
+        return _build_frame(self.iter_rows(sheet_name), header, nrows)
+
+    def close(self):
+        try:
+            if self.engine == 'xlrd':
+                self._book.release_resources()
+            else:
+                self._book.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_excel(path, engine=None, header=0, nrows=None, sheet_name=0):
+    """Đọc sheet đầu tiên (hoặc sheet_name) thành DataFrame"""
+    with ExcelFile(path, engine=engine) as excel_file:
+        return excel_file.parse(sheet_name=sheet_name, header=header, nrows=nrows)
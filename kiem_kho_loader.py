@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Đọc dữ liệu đầu vào trên thread nền, theo từng đợt dòng, dùng chung cho Kiểm Kho và Kiểm Kho Showroom
+
+File Excel được đọc lần lượt từng dòng (openpyxl read-only / xlrd) trên một thread riêng nên cửa sổ
+không bị đứng khi mở file .xls lớn. Các dòng được gom theo số thùng ngay khi đọc: khi file chuyển sang
+thùng khác, thùng trước được gửi về main thread và có thể load/quét ngay mà không chờ đọc hết file.
+Đọc xong, DataFrame đầy đủ và các chỉ mục được xây trên thread nền rồi giao cho phiên kiểm kê.
+
+Kết quả được trả về main thread bằng root.after (polling) - không gọi Tk từ thread nền.
+"""
+
+import queue
+import threading
+import traceback
+from pathlib import Path
+
+import kiem_kho_lite
+from kiem_kho_cache import find_header_row, load_cached_dataframe, save_cached_dataframe
+from kiem_kho_engine import InventorySession, clean_input_frame, is_box_column
+from kiem_kho_isbn import is_input_isbn
+
+# Số dòng đọc giữa hai lần gửi tiến độ về main thread
+LOAD_CHUNK_ROWS = 2000
+
+
+class InputLoadResult:
+    """Kết quả đọc xong: phiên tạm đã có df + chỉ mục, file nguồn và có đọc từ cache không"""
+
+    __slots__ = ('session', 'source_path', 'from_cache')
+
+    def __init__(self, session, source_path, from_cache):
+        self.session = session
+        self.source_path = source_path
+        self.from_cache = from_cache
+
+
+def open_input_excel(excel_path, alternatives=()):
+    """Mở file đầu vào (kiem_kho_lite.ExcelFile), thử lần lượt các file thay thế nếu file chính lỗi/không có sheet"""
+    candidates = [Path(excel_path)] + [Path(path) for path in alternatives if Path(path).exists()]
+    last_error = None
+    for path in candidates:
+        try:
+            excel_file = kiem_kho_lite.ExcelFile(path)
+        except Exception as e:
+            last_error = e
+            continue
+        if excel_file.sheet_names:
+            return excel_file, path
+        excel_file.close()
+        last_error = ValueError("File Excel không có worksheet nào và không tìm thấy file thay thế!")
+    raise last_error
+
+
+class InputLoader:
+    """Đọc một file dữ liệu đầu vào trên thread nền
+
+    Callback (đều chạy trên main thread):
+    - on_header(columns): đã đọc dòng tiêu đề (tên cột gốc)
+    - on_progress(boxes, reopened, rows_loaded, total_rows): các thùng vừa đọc xong {key: (mã thùng, dòng)}
+      và các thùng đã gửi trước đó nhưng lại có thêm dòng (file không sắp xếp theo thùng)
+    - on_done(InputLoadResult) / on_error(exception)
+    """
+
+    def __init__(self, root, pd, excel_path, alternatives=(), showroom=False, cache_path=None,
+                 cache_candidates=(), on_header=None, on_progress=None, on_done=None, on_error=None,
+                 chunk_rows=LOAD_CHUNK_ROWS, poll_ms=50):
+        self.root = root
+        self.pd = pd
+        self.excel_path = excel_path
+        self.alternatives = list(alternatives)
+        self.showroom = showroom
+        self.cache_path = cache_path
+        self.cache_candidates = list(cache_candidates)
+        self.on_header = on_header
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.chunk_rows = chunk_rows
+        self.poll_ms = poll_ms
+        self._messages = queue.Queue()  # (callback, args) chờ chạy trên main thread
+        self._cancelled = threading.Event()
+        self._finished = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='input-loader', daemon=True)
+        self._thread.start()
+        self._schedule_poll()
+
+    def cancel(self):
+        """Dừng đọc (thread nền dừng ở đợt dòng tiếp theo, không gọi callback nữa)"""
+        self._cancelled.set()
+
+    def _post(self, callback, *args):
+        if callback is not None and not self._cancelled.is_set():
+            self._messages.put((callback, args))
+
+    def _run(self):
+        try:
+            result = self._load()
+            if result is not None:
+                self._post(self.on_done, result)
+        except Exception as e:
+            print(f"Lỗi khi đọc dữ liệu đầu vào: {str(e)}")
+            traceback.print_exc()
+            self._post(self.on_error, e)
+        finally:
+            self._messages.put((None, ()))  # Báo kết thúc cho vòng polling
+
+    def _new_session(self):
+        session = InventorySession(showroom=self.showroom)
+        session.pd = self.pd
+        return session
+
+    def _load(self):
+        # Cache còn hợp lệ -> không cần đọc file Excel
+        if self.cache_path is not None:
+            df, cached_source = load_cached_dataframe(self.cache_path, self.cache_candidates)
+            if df is not None:
+                session = self._new_session()
+                session.load_dataframe(df)
+                return InputLoadResult(session, Path(cached_source), True)
+
+        excel_file, source_path = open_input_excel(self.excel_path, self.alternatives)
+        try:
+            header_row = 0
+            if source_path.suffix.lower() == '.xls':
+                # Tìm dòng tiêu đề trong 30 dòng đầu, mặc định dùng dòng đầu tiên
+                try:
+                    found = find_header_row(kiem_kho_lite, excel_file.parse(header=None, nrows=30))
+                    header_row = found if found is not None else 0
+                except Exception:
+                    pass
+            columns, rows = self._stream_rows(excel_file, header_row)
+        finally:
+            excel_file.close()
+        if rows is None:
+            return None
+
+        # DataFrame đầy đủ bằng engine của ứng dụng (pandas hoặc kiem_kho_lite), lọc như read_input_file
+        df = clean_input_frame(self.pd.DataFrame(rows, columns=columns))
+        session = self._new_session()
+        session.load_dataframe(df)
+        if self.cache_path is not None:
+            save_cached_dataframe(self.cache_path, self.cache_candidates, source_path, df)
+        return InputLoadResult(session, source_path, False)
+
+    def _stream_rows(self, excel_file, header_row):
+        """Đọc các dòng dữ liệu, gửi dần các thùng đã đọc xong, trả về (tên cột, tất cả dòng)"""
+        total_rows = excel_file.row_count()
+        row_iter = excel_file.iter_rows()
+        for _ in range(header_row):
+            next(row_iter, None)
+        header_values = next(row_iter, [])
+        width = len(header_values)
+        columns = kiem_kho_lite.header_names(header_values, width)
+        self._post(self.on_header, list(columns))
+
+        # Cột số thùng/ISBN theo tên gốc (giống _build_input_indexes và clean_input_frame)
+        box_position = next((position for position, col in enumerate(columns)
+                             if isinstance(col, str) and is_box_column(col.strip().lower())), None)
+        isbn_position = None
+        for name in ('isbn', 'ISBN'):
+            if name in columns:
+                isbn_position = columns.index(name)
+                break
+        progressive = not self.showroom and box_position is not None
+
+        rows = []
+        boxes = {}  # {key: (mã thùng, [dòng])}
+        published = set()  # Thùng đã gửi về main thread
+        pending = {}  # Thùng vừa đọc xong, chờ gửi ở đợt tiếp theo
+        reopened = set()
+        current_key = None
+        rows_read = header_row + 1
+
+        for values in row_iter:
+            rows_read += 1
+            if len(values) < width:
+                values.extend([None] * (width - len(values)))
+            elif len(values) > width:
+                # Dòng dài hơn tiêu đề -> thêm cột 'Unnamed: i' như read_excel
+                columns.extend(kiem_kho_lite.header_names([], len(values))[width:])
+                width = len(values)
+            rows.append(values)
+
+            if progressive:
+                box = values[box_position]
+                keep = any(value is not None for value in values) and box is not None and (
+                    isbn_position is None or is_input_isbn(values[isbn_position]))
+                if keep:
+                    box_number = str(box).strip()
+                    key = box_number.lower()
+                    if key != current_key:
+                        if current_key is not None and current_key in boxes:
+                            pending[current_key] = boxes[current_key]
+                        current_key = key
+                        if key in published or key in pending:
+                            # Thùng đã đọc xong trước đó lại có thêm dòng -> chưa dùng được cho đến khi đọc xong
+                            pending.pop(key, None)
+                            published.discard(key)
+                            reopened.add(key)
+                    boxes.setdefault(key, (box_number, []))[1].append(values)
+
+            if rows_read % self.chunk_rows == 0:
+                if self._cancelled.is_set():
+                    return columns, None
+                self._publish(pending, reopened, published, rows_read, total_rows)
+
+        # Hết file: thùng cuối cùng cũng đã đọc xong
+        if current_key is not None and current_key in boxes:
+            pending[current_key] = boxes[current_key]
+        self._publish(pending, reopened, published, rows_read, total_rows)
+        return columns, rows
+
+    def _publish(self, pending, reopened, published, rows_read, total_rows):
+        boxes = {key: (box_number, tuple(box_rows)) for key, (box_number, box_rows) in pending.items()}
+        self._post(self.on_progress, boxes, tuple(reopened), rows_read, total_rows)
+        published.update(pending)
+        pending.clear()
+        reopened.clear()
+
+    def _schedule_poll(self):
+        try:
+            self.root.after(self.poll_ms, self._poll)
+        except Exception:
+            # Root đã bị destroy - dừng polling
+            pass
+
+    def _poll(self):
+        """Chạy các callback trên main thread"""
+        while True:
+            try:
+                callback, args = self._messages.get_nowait()
+            except queue.Empty:
+                break
+            if callback is None:
+                self._finished = True
+                continue
+            if self._cancelled.is_set():
+                continue
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Lỗi trong callback đọc dữ liệu đầu vào: {str(e)}")
+                traceback.print_exc()
+        if not self._finished:
+            self._schedule_poll()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dải thông báo không chặn (non-modal) dùng chung cho Kiểm Kho và Kiểm Kho Showroom
+
+messagebox là cửa sổ modal: khi đang mở, các phím của mã vạch quét tiếp theo bị mất cho đến khi
+có người bấm OK. NotificationStrip hiển thị thông báo trên một dải màu ở cuối cửa sổ, không lấy focus
+của ô quét ISBN, tự ẩn sau vài giây và xếp hàng các thông báo đến liên tiếp. Cảnh báo/lỗi có tiếng
+bíp (root.bell) và màu nền riêng để người quét nhận ra mà không cần nhìn kỹ.
+
+Chỉ dùng cho thông báo không cần người dùng quyết định - các câu hỏi vẫn dùng messagebox/dialog.
+"""
+
+import tkinter as tk
+from collections import deque
+from datetime import datetime
+from tkinter import messagebox
+
+NOTIFY_INFO = 'info'
+NOTIFY_SUCCESS = 'success'
+NOTIFY_WARNING = 'warning'
+NOTIFY_ERROR = 'error'
+
+# level -> (nền, chữ, biểu tượng, thời gian hiển thị ms, số tiếng bíp)
+NOTIFY_STYLES = {
+    NOTIFY_INFO: ('#E3F2FD', '#0D47A1', 'ℹ', 2500, 0),
+    NOTIFY_SUCCESS: ('#E8F5E9', '#1B5E20', '✔', 2000, 0),
+    NOTIFY_WARNING: ('#FFF3E0', '#E65100', '⚠', 4000, 1),
+    NOTIFY_ERROR: ('#FFEBEE', '#B71C1C', '✖', 6000, 2),
+}
+
+# Khi còn thông báo đang chờ, mỗi thông báo chỉ hiển thị trong thời gian này để hàng đợi không bị trễ
+QUEUED_DISPLAY_MS = 1200
+# Số thông báo chờ tối đa - quá thì bỏ thông báo cũ nhất (quét liên tục vẫn thấy thông báo mới nhất)
+MAX_QUEUED = 20
+# Số thông báo gần nhất được giữ lại để xem lại (history)
+HISTORY_SIZE = 100
+
+_DEFAULT_TITLES = {
+    NOTIFY_INFO: "Thông báo",
+    NOTIFY_SUCCESS: "Thành công",
+    NOTIFY_WARNING: "Cảnh báo",
+    NOTIFY_ERROR: "Lỗi",
+}
+
+
+def one_line(message):
+    """Nội dung nhiều dòng (viết cho messagebox) thành một dòng: nối các dòng bằng dấu chấm/khoảng trắng"""
+    text = ''
+    for line in str(message).splitlines():
+        line = ' '.join(line.split())
+        if not line:
+            continue
+        if text:
+            text += ' ' if text[-1] in '.!?:,;' else '. '
+        text += line
+    return text
+
+
+class NotificationStrip:
+    """Dải thông báo xếp hàng, tự ẩn, không lấy focus - đặt ở cuối cửa sổ chính"""
+
+    def __init__(self, root, parent=None, bg='#F5F5F5'):
+        self.root = root
+        self.bg = bg
+        self.history = deque(maxlen=HISTORY_SIZE)  # (thời gian, level, nội dung)
+        self._queue = deque()
+        self._current = None  # (level, nội dung) đang hiển thị
+        self._repeat = 1  # Số lần thông báo đang hiển thị lặp lại liên tiếp
+        self._after_id = None
+
+        self.frame = tk.Frame(parent or root, bg=bg, height=34)
+        self.frame.pack_propagate(False)
+        self._icon = tk.Label(self.frame, text='', bg=bg, font=('Arial', 13, 'bold'), width=2)
+        self._icon.pack(side=tk.LEFT, padx=(8, 2))
+        self._label = tk.Label(self.frame, text='', bg=bg, anchor='w', justify=tk.LEFT,
+                               font=('Arial', 11, 'bold'))
+        self._label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self._pending = tk.Label(self.frame, text='', bg=bg, fg='#757575', font=('Arial', 10))
+        self._pending.pack(side=tk.RIGHT, padx=8)
+        # Bấm vào dải thông báo để bỏ qua thông báo đang hiển thị
+        for widget in (self.frame, self._icon, self._label, self._pending):
+            widget.bind('<Button-1>', lambda event: self.dismiss())
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    # ---- API ----
+
+    def show(self, level, message):
+        """Đưa một thông báo vào hàng đợi (hiển thị ngay nếu đang trống)"""
+        message = one_line(message)
+        self.history.append((datetime.now(), level, message))
+        if self._current == (level, message):
+            # Lặp lại thông báo đang hiển thị (quét lại cùng mã) -> đếm số lần, hiển thị lại từ đầu
+            self._repeat += 1
+            self._display(level, message)
+            return
+        if self._current is None:
+            self._display(level, message)
+            return
+        if len(self._queue) >= MAX_QUEUED:
+            self._queue.popleft()
+        self._queue.append((level, message))
+        self._update_pending()
+        if len(self._queue) == 1:
+            # Thông báo đang hiển thị nhường chỗ sớm cho thông báo đang chờ
+            self._schedule(QUEUED_DISPLAY_MS)
+
+    def info(self, message):
+        self.show(NOTIFY_INFO, message)
+
+    def success(self, message):
+        self.show(NOTIFY_SUCCESS, message)
+
+    def warning(self, message):
+        self.show(NOTIFY_WARNING, message)
+
+    def error(self, message):
+        self.show(NOTIFY_ERROR, message)
+
+    def dismiss(self):
+        """Ẩn thông báo đang hiển thị và chuyển sang thông báo tiếp theo"""
+        self._cancel()
+        if self._queue:
+            self._repeat = 1
+            self._display(*self._queue.popleft())
+            return
+        self._current = None
+        self._repeat = 1
+        for widget in (self.frame, self._icon, self._label, self._pending):
+            widget.configure(bg=self.bg)
+        self._icon.configure(text='')
+        self._label.configure(text='')
+        self._pending.configure(text='')
+
+    # ---- Nội bộ ----
+
+    def _display(self, level, message):
+        bg, fg, icon, duration_ms, bells = NOTIFY_STYLES.get(level, NOTIFY_STYLES[NOTIFY_INFO])
+        self._current = (level, message)
+        for widget in (self.frame, self._icon, self._label, self._pending):
+            widget.configure(bg=bg)
+        self._icon.configure(text=icon, fg=fg)
+        text = f"{message} (x{self._repeat})" if self._repeat > 1 else message
+        self._label.configure(text=text, fg=fg)
+        self._update_pending()
+        self._ring(bells)
+        self._schedule(QUEUED_DISPLAY_MS if self._queue else duration_ms)
+
+    def _update_pending(self):
+        self._pending.configure(text=f"+{len(self._queue)} thông báo" if self._queue else '')
+
+    def _ring(self, bells):
+        for index in range(bells):
+            try:
+                self.root.after(index * 180, self.root.bell)
+            except Exception:
+                pass
+
+    def _schedule(self, delay_ms):
+        self._cancel()
+        try:
+            self._after_id = self.root.after(delay_ms, self._on_timeout)
+        except Exception:
+            # Root đã bị destroy
+            self._after_id = None
+
+    def _cancel(self):
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+
+    def _on_timeout(self):
+        self._after_id = None
+        self.dismiss()
+
+
+def show_notification(notifier, level, message, title=None):
+    """Thông báo qua dải thông báo, hoặc messagebox nếu giao diện chưa có dải thông báo (lúc khởi động)"""
+    if notifier is not None:
+        notifier.show(level, message)
+        return
+    show = {NOTIFY_WARNING: messagebox.showwarning,
+            NOTIFY_ERROR: messagebox.showerror}.get(level, messagebox.showinfo)
+    show(title or _DEFAULT_TITLES.get(level, "Thông báo"), message)
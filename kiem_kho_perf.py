@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Đo độ trễ các thao tác chính (quét ISBN, backup, bảng Tổng hợp, xuất Excel) dùng chung cho
+Kiểm Kho và Kiểm Kho Showroom
+
+Các hàm được đánh dấu @timed('tên') ghi thời gian chạy (time.perf_counter) vào PERF. Khi tắt đo,
+wrapper chỉ kiểm tra một cờ rồi gọi thẳng hàm gốc. Mỗi lần đo lưu kèm ngữ cảnh (số dòng Tổng hợp,
+số ISBN đang quét, các thao tác khác đang chạy như ghi backup) để xuất CSV và đối chiếu lần quét chậm.
+
+Bật đo: phím tắt Ctrl+Shift+P mở bảng hiệu năng, hoặc đặt biến môi trường KIEM_KHO_PERF=1.
+"""
+
+import csv
+import functools
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+PERF_ENV_VAR = 'KIEM_KHO_PERF'
+
+# Phím tắt mở bảng hiệu năng (bind cả chữ thường khi bật Caps Lock)
+PERF_PANEL_HOTKEYS = ('<Control-Shift-P>', '<Control-Shift-p>')
+
+# Số lần đo gần nhất dùng để tính p50/p95/p99 cho mỗi thao tác
+DEFAULT_WINDOW = 2000
+# Số lần đo tối đa giữ lại để xuất CSV (cả phiên)
+DEFAULT_MAX_SAMPLES = 200000
+
+CSV_COLUMNS = ('thoi_gian', 'thao_tac', 'ms', 'thread', 'so_dong_tong_hop', 'so_isbn_dang_quet',
+               'dang_chay_dong_thoi')
+
+
+def percentile(sorted_values, q):
+    """Phân vị q (0-100) của list đã sắp xếp (nearest-rank), None nếu rỗng"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[min(len(sorted_values), int(rank)) - 1]
+
+
+class LatencyStats:
+    """Thống kê độ trễ (ms) của một thao tác: cửa sổ trượt các lần đo gần nhất + tổng cả phiên"""
+
+    __slots__ = ('window', 'count', 'total_ms', 'max_ms')
+
+    def __init__(self, window_size):
+        self.window = deque(maxlen=window_size)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.window.append(ms)
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def summary(self):
+        """(số lần, trung bình, p50, p95, p99, max) - phân vị tính trên cửa sổ trượt"""
+        values = sorted(self.window)
+        mean = self.total_ms / self.count if self.count else None
+        return (self.count, mean, percentile(values, 50), percentile(values, 95),
+                percentile(values, 99), self.max_ms)
+
+
+class PerfRecorder:
+    """Bộ ghi độ trễ dùng chung cho các thread (main thread Tk và thread ghi nền)
+
+    context_func(): trả về (số dòng Tổng hợp, số ISBN đang quét) tại thời điểm đo - do ứng dụng gán.
+    """
+
+    def __init__(self, window_size=DEFAULT_WINDOW, max_samples=DEFAULT_MAX_SAMPLES):
+        self.enabled = False
+        self.context_func = None
+        self.window_size = window_size
+        self.stats = {}
+        self.samples = deque(maxlen=max_samples)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def context(self):
+        """(số dòng Tổng hợp, số ISBN đang quét) hiện tại, (None, None) nếu chưa có"""
+        if self.context_func is None:
+            return (None, None)
+        try:
+            return self.context_func()
+        except Exception:
+            return (None, None)
+
+    def call(self, name, func, args, kwargs):
+        """Chạy func và ghi thời gian dưới tên name"""
+        with self._lock:
+            self._inflight[name] = self._inflight.get(name, 0) + 1
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            self.record(name, ms)
+
+    def record(self, name, ms):
+        """Ghi một lần đo (ms) - gọi sau khi thao tác name kết thúc"""
+        context = self.context()
+        with self._lock:
+            remaining = self._inflight.get(name, 0) - 1
+            if remaining > 0:
+                self._inflight[name] = remaining
+            else:
+                self._inflight.pop(name, None)
+            # Các thao tác khác đang chạy cùng lúc (ví dụ ghi backup ở thread nền khi đang quét)
+            concurrent = ';'.join(sorted(self._inflight))
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = LatencyStats(self.window_size)
+            stats.add(ms)
+            self.samples.append((time.time(), name, ms, threading.current_thread().name,
+                                 context[0], context[1], concurrent))
+
+    def summary(self):
+        """[(tên, số lần, trung bình, p50, p95, p99, max)] sắp xếp theo tên"""
+        with self._lock:
+            return [(name,) + stats.summary() for name, stats in sorted(self.stats.items())]
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self.samples.clear()
+
+    def dump_csv(self, path):
+        """Ghi toàn bộ các lần đo ra CSV (utf-8-sig để mở được bằng Excel), trả về số dòng"""
+        with self._lock:
+            samples = list(self.samples)
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_COLUMNS)
+            for timestamp, name, ms, thread_name, tong_hop_rows, scanned, concurrent in samples:
+                writer.writerow([datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+                                 name, f"{ms:.3f}", thread_name,
+                                 '' if tong_hop_rows is None else tong_hop_rows,
+                                 '' if scanned is None else scanned, concurrent])
+        return len(samples)
+
+
+PERF = PerfRecorder()
+PERF.enabled = os.environ.get(PERF_ENV_VAR, '').strip() in ('1', 'true', 'yes')
+
+
+def timed(name):
+    """Decorator đo thời gian chạy của hàm vào PERF (không đo gì khi PERF.enabled = False)"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PERF.enabled:
+                return func(*args, **kwargs)
+            return PERF.call(name, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+class PerfPanel:
+    """Cửa sổ nhỏ hiển thị p50/p95/p99 các thao tác, bật/tắt đo và xuất CSV"""
+
+    REFRESH_MS = 1000
+
+    def __init__(self, root, recorder=PERF, csv_dir=None):
+        self.root = root
+        self.recorder = recorder
+        self.csv_dir = csv_dir
+        self.window = None
+        self._after_id = None
+
+    def toggle(self, event=None):
+        """Mở bảng (bật đo nếu đang tắt) hoặc đóng nếu đang mở"""
+        if self.window is not None:
+            self.close()
+            return
+        if not self.recorder.enabled:
+            self.recorder.enabled = True
+            print("[INFO] Đã bật đo hiệu năng")
+        self._create_window()
+        self._refresh()
+
+    def _create_window(self):
+        self.window = tk.Toplevel(self.root)
+        self.window.title("Hiệu năng (ms)")
+        self.window.geometry("640x300")
+        self.window.transient(self.root)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        columns = ('ten', 'so_lan', 'tb', 'p50', 'p95', 'p99', 'max')
+        headings = ('Thao tác', 'Số lần', 'TB', 'p50', 'p95', 'p99', 'Max')
+        self.tree = ttk.Treeview(self.window, columns=columns, show='headings', height=9)
+        for column, heading in zip(columns, headings):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=170 if column == 'ten' else 70,
+                             anchor='w' if column == 'ten' else 'e')
+        self.tree.pack(fill='both', expand=True, padx=5, pady=5)
+
+        self.info_label = tk.Label(self.window, anchor='w', font=('Arial', 9))
+        self.info_label.pack(fill='x', padx=5)
+
+        button_frame = tk.Frame(self.window)
+        button_frame.pack(fill='x', padx=5, pady=5)
+        self.toggle_button = tk.Button(button_frame, command=self._toggle_enabled, width=10)
+        self.toggle_button.pack(side='left')
+        tk.Button(button_frame, text="Xuất CSV", command=self._export_csv, width=10).pack(side='left', padx=5)
+        tk.Button(button_frame, text="Xóa số liệu", command=self._reset, width=10).pack(side='left')
+
+    def _refresh(self):
+        if self.window is None:
+            return
+        try:
+            self.tree.delete(*self.tree.get_children())
+            for name, count, mean, p50, p95, p99, max_ms in self.recorder.summary():
+                self.tree.insert('', 'end', values=(name, count) + tuple(
+                    '' if value is None else f"{value:.1f}" for value in (mean, p50, p95, p99, max_ms)))
+            tong_hop_rows, scanned = self.recorder.context()
+            self.info_label.config(text=f"Tổng hợp: {tong_hop_rows} dòng | Đang quét: {scanned} ISBN | "
+                                        f"Đã ghi {len(self.recorder.samples):,} lần đo")
+            self.toggle_button.config(text="Tắt đo" if self.recorder.enabled else "Bật đo")
+            self._after_id = self.window.after(self.REFRESH_MS, self._refresh)
+        except tk.TclError:
+            self.window = None
+
+    def _toggle_enabled(self):
+        self.recorder.enabled = not self.recorder.enabled
+        self.toggle_button.config(text="Tắt đo" if self.recorder.enabled else "Bật đo")
+
+    def _reset(self):
+        self.recorder.reset()
+
+    def _export_csv(self):
+        filename = filedialog.asksaveasfilename(
+            parent=self.window,
+            title="Xuất số liệu hiệu năng",
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            initialfile=f"hieu_nang_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            initialdir=self.csv_dir
+        )
+        if not filename:
+            return
+        try:
+            count = self.recorder.dump_csv(filename)
+            messagebox.showinfo("Thành công", f"Đã xuất {count:,} lần đo ra:\n{filename}", parent=self.window)
+        except Exception as e:
+            messagebox.showerror("Lỗi", f"Không thể xuất CSV: {str(e)}", parent=self.window)
+
+    def close(self):
+        if self.window is None:
+            return
+        try:
+            if self._after_id is not None:
+                self.window.after_cancel(self._after_id)
+            self.window.destroy()
+        except tk.TclError:
+            pass
+        self.window = None
+        self._after_id = None
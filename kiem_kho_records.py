@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dòng Tổng hợp dạng gọn (__slots__) dùng chung cho Kiểm Kho và Kiểm Kho Showroom
+
+Mỗi dòng tong_hop_data trước đây là một dict 12-13 key; với 100k dòng phần lớn bộ nhớ nằm ở bảng
+băm của từng dict và các chuỗi lặp lại (N/X, Số phiếu, Ngày, Vị trí mới, Note thùng...). TongHopRecord
+lưu mỗi cột trong một slot và intern các giá trị lặp lại, nhưng vẫn dùng được như dict
+(record['ISBN'], record.get(...), dict(record), for key in record...) nên code giao diện, backup
+và xuất file không phải đổi.
+"""
+
+import operator
+import sys
+
+from kiem_kho_index import ROW_ID_KEY
+from kiem_kho_isbn import isbn_key
+
+# (key, tên slot) theo đúng thứ tự cột của dòng Tổng hợp
+TONG_HOP_FIELDS = (
+    ('N/X', 'nhap_xuat'),
+    ('Số phiếu', 'so_phieu'),
+    ('Ngày', 'ngay'),
+    ('Vị trí mới', 'vi_tri_moi'),
+    ('ISBN', 'isbn'),
+    ('Tựa', 'tua'),
+    ('Tồn thực tế', 'ton_thuc_te'),
+    ('Số thùng', 'so_thung'),
+    ('Tình trạng', 'tinh_trang'),
+    ('Ghi chú', 'ghi_chu'),
+    ('Note thùng', 'note_thung'),
+    ('_is_valid_isbn', 'is_valid_isbn'),
+    (ROW_ID_KEY, 'row_id'),
+)
+
+_SLOT_OF = dict(TONG_HOP_FIELDS)
+_KEYS = tuple(key for key, _ in TONG_HOP_FIELDS)
+_MISSING = object()
+
+# Cột có giá trị lặp lại giữa nhiều dòng - intern để các dòng dùng chung một object chuỗi
+INTERNED_FIELDS = frozenset(('N/X', 'Số phiếu', 'Ngày', 'Vị trí mới', 'Số thùng', 'Tình trạng',
+                             'Ghi chú', 'Note thùng', 'Tựa'))
+
+
+class TongHopRecord:
+    """Một dòng Tổng hợp: slot cho các cột cố định, _extra (dict, None nếu không có) cho key lạ
+
+    Slot chưa gán tương đương key không có trong dict. isbn_key là key ISBN chuẩn (kiem_kho_isbn),
+    tính lại mỗi khi gán 'ISBN' và không nằm trong dict (không ghi vào backup/file xuất).
+    """
+
+    __slots__ = tuple(slot for _, slot in TONG_HOP_FIELDS) + ('_extra', 'isbn_key')
+
+    def __init__(self, data=None):
+        self._extra = None
+        self.isbn_key = None
+        if data:
+            self.update(data)
+
+    # ---- Giao diện dict ----
+
+    def __getitem__(self, key):
+        slot = _SLOT_OF.get(key)
+        if slot is not None:
+            try:
+                return getattr(self, slot)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        slot = _SLOT_OF.get(key)
+        if slot is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+            return
+        if key in INTERNED_FIELDS and type(value) is str:
+            value = sys.intern(value)
+        elif key == 'ISBN':
+            self.isbn_key = isbn_key(value)
+        setattr(self, slot, value)
+
+    def __delitem__(self, key):
+        slot = _SLOT_OF.get(key)
+        try:
+            if slot is not None:
+                delattr(self, slot)
+                if key == 'ISBN':
+                    self.isbn_key = None
+            else:
+                del self._extra[key]
+        except (AttributeError, KeyError, TypeError):
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        slot = _SLOT_OF.get(key)
+        if slot is not None:
+            return getattr(self, slot, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __contains__(self, key):
+        slot = _SLOT_OF.get(key)
+        if slot is not None:
+            return getattr(self, slot, _MISSING) is not _MISSING
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self):
+        return len(self.to_dict())
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def values(self):
+        return self.to_dict().values()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def update(self, data=(), **kwargs):
+        items = data.items() if hasattr(data, 'items') else data
+        for key, value in items:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def clear(self):
+        for _, slot in TONG_HOP_FIELDS:
+            if getattr(self, slot, _MISSING) is not _MISSING:
+                delattr(self, slot)
+        self._extra = None
+        self.isbn_key = None
+
+    def copy(self):
+        return TongHopRecord(self)
+
+    def to_dict(self):
+        """dict thường (cùng thứ tự key) - dùng cho JSON backup/journal và bản sao bất biến"""
+        try:
+            # Trường hợp thường gặp: đủ tất cả các cột
+            result = dict(zip(_KEYS, _get_all_slots(self)))
+        except AttributeError:
+            result = self._partial_dict()
+        if self._extra:
+            result.update(self._extra)
+        return result
+
+    def _partial_dict(self):
+        result = {}
+        for key, slot in TONG_HOP_FIELDS:
+            value = getattr(self, slot, _MISSING)
+            if value is not _MISSING:
+                result[key] = value
+        return result
+
+    def __eq__(self, other):
+        if isinstance(other, (TongHopRecord, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"TongHopRecord({self.to_dict()!r})"
+
+
+_get_all_slots = operator.attrgetter(*(slot for _, slot in TONG_HOP_FIELDS))
+
+
+def to_record(data):
+    """TongHopRecord từ một dict (giữ nguyên nếu đã là TongHopRecord)"""
+    return data if isinstance(data, TongHopRecord) else TongHopRecord(data)
+
+
+def to_records(rows):
+    """Đổi các dòng Tổng hợp (dict đọc từ backup/journal) sang TongHopRecord, trả về list mới"""
+    return [to_record(data) for data in rows]
+
+
+class ScannedItems(dict):
+    """Các ISBN đang quét của thùng hiện tại: {key ISBN chuẩn: item}
+
+    Key luôn được đổi sang kiem_kho_isbn.isbn_key nên ISBN-10 và EAN-13 của cùng cuốn sách là một dòng,
+    và code giao diện vẫn tra được bằng ISBN đang hiển thị trên bảng (scanned_items[isbn], isbn in ...).
+    ISBN hiển thị (dạng quét lần đầu) nằm trong item['isbn'].
+    """
+
+    __slots__ = ()
+
+    def __init__(self, items=()):
+        super().__init__()
+        self.update(items)
+
+    def __setitem__(self, isbn, item):
+        if isinstance(item, dict):
+            item.setdefault('isbn', str(isbn).strip())
+        super().__setitem__(isbn_key(isbn), item)
+
+    def __getitem__(self, isbn):
+        return super().__getitem__(isbn_key(isbn))
+
+    def __delitem__(self, isbn):
+        super().__delitem__(isbn_key(isbn))
+
+    def __contains__(self, isbn):
+        return super().__contains__(isbn_key(isbn))
+
+    def get(self, isbn, default=None):
+        return super().get(isbn_key(isbn), default)
+
+    def pop(self, isbn, *default):
+        return super().pop(isbn_key(isbn), *default)
+
+    def update(self, items=(), **kwargs):
+        for isbn, item in (items.items() if hasattr(items, 'items') else items):
+            self[isbn] = item
+        for isbn, item in kwargs.items():
+            self[isbn] = item
+
+
+def json_default(value):
+    """Tham số default của json.dump: ghi TongHopRecord như dict"""
+    if isinstance(value, TongHopRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
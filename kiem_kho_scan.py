@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hàng đợi quét mã vạch dùng chung cho Kiểm Kho và Kiểm Kho Showroom
+
+Máy quét gõ cả mã ISBN và phím Enter chỉ trong vài mili giây. Nếu xử lý (tìm ISBN, kiểm tra trùng,
+vẽ dòng trên bảng, highlight) ngay trong sự kiện Enter, các phím của lần quét tiếp theo có thể lẫn vào
+ô nhập đang bị xóa/đọc. ScanQueue tách hai việc:
+- Khi có Enter: lấy ngay nội dung ô quét, xóa ô, đưa mã vào hàng đợi FIFO (kèm ngữ cảnh lúc quét,
+  ví dụ "Thùng / vị trí mới") - ô quét sẵn sàng cho lần quét sau
+- Khi Tk rảnh (after_idle): lần lượt xử lý từng mã theo thứ tự quét, mỗi lần một mã để các phím
+  đang đến vẫn được nhận giữa hai lần xử lý
+
+Các lần quét liên tiếp cùng một mã (cùng ngữ cảnh) chưa được xử lý được gộp thành một lần cộng dồn.
+"""
+
+import tkinter as tk
+import traceback
+from collections import deque
+
+
+class ScanQueue:
+    """Hàng đợi FIFO các mã đã quét, xử lý lần lượt khi Tk rảnh
+
+    process(isbn, context, count) được gọi trên main thread cho từng mã, count là số lần quét liên tiếp
+    đã gộp. context() (nếu có) được gọi lúc Enter để lưu ngữ cảnh của lần quét.
+    """
+
+    def __init__(self, root, entry, process, context=None):
+        self.root = root
+        self.entry = entry
+        self.process = process
+        self.context = context
+        self._pending = deque()  # [mã, ngữ cảnh, số lần quét]
+        self._idle_id = None
+        self._processing = False
+
+    def bind(self, sequence='<Return>'):
+        self.entry.bind(sequence, self.on_return)
+
+    @property
+    def pending(self):
+        """Số mã đang chờ xử lý"""
+        return len(self._pending)
+
+    def on_return(self, event=None):
+        """Enter trên ô quét: đưa mã vào hàng đợi và xóa ô ngay (không xử lý trong sự kiện phím)"""
+        try:
+            isbn = self.entry.get().strip()
+            self.entry.delete(0, tk.END)
+        except Exception as e:
+            print(f"Lỗi khi đọc ô quét ISBN: {str(e)}")
+            return 'break'
+        if isbn:
+            context = None
+            if self.context is not None:
+                try:
+                    context = self.context()
+                except Exception as e:
+                    print(f"Lỗi khi lấy ngữ cảnh quét: {str(e)}")
+            self.push(isbn, context)
+        # Không chuyển Enter lên binding của cửa sổ (on_enter_pressed)
+        return 'break'
+
+    def push(self, isbn, context=None):
+        """Thêm một lần quét vào cuối hàng đợi (gộp với mã cuối nếu trùng mã và ngữ cảnh)"""
+        if self._pending and self._pending[-1][0] == isbn and self._pending[-1][1] == context:
+            self._pending[-1][2] += 1
+        else:
+            self._pending.append([isbn, context, 1])
+        self._schedule()
+
+    def flush(self):
+        """Xử lý ngay tất cả mã đang chờ - gọi trước khi đổi thùng, lưu hoặc xóa danh sách đang quét
+
+        Trả về False nếu đang xử lý dở một mã (gọi từ vòng lặp sự kiện lồng, ví dụ hộp thoại của mã đó):
+        các mã còn lại được xử lý tiếp khi mã đó xong, nơi gọi không được đổi thùng/lưu lúc này.
+        """
+        if self._processing:
+            return False
+        self._cancel()
+        while self._pending:
+            self._process_next()
+        self._cancel()
+        return True
+
+    def clear(self):
+        """Bỏ các mã đang chờ (reset danh sách đang quét)"""
+        self._cancel()
+        self._pending.clear()
+
+    def _schedule(self):
+        if self._idle_id is None and not self._processing:
+            try:
+                self._idle_id = self.root.after_idle(self._on_idle)
+            except Exception:
+                # Root đã bị destroy
+                self._idle_id = None
+
+    def _cancel(self):
+        if self._idle_id is not None:
+            try:
+                self.root.after_cancel(self._idle_id)
+            except Exception:
+                pass
+            self._idle_id = None
+
+    def _on_idle(self):
+        self._idle_id = None
+        # Mỗi lần rảnh chỉ xử lý một mã - phím quét đang đến được nhận trước mã tiếp theo
+        self._process_next()
+
+    def _process_next(self):
+        if not self._pending or self._processing:
+            return
+        isbn, context, count = self._pending.popleft()
+        self._processing = True
+        try:
+            self.process(isbn, context, count)
+        except Exception as e:
+            print(f"Lỗi khi xử lý mã quét {isbn}: {str(e)}")
+            traceback.print_exc()
+        finally:
+            self._processing = False
+            if self._pending:
+                # Các mã quét trong lúc xử lý (hoặc flush bị từ chối) được xử lý ở lần rảnh tiếp theo
+                self._schedule()
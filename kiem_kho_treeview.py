@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Treeview dạng virtual list dùng chung cho Kiểm Kho và Kiểm Kho Showroom
+
+Treeview chỉ chứa các dòng đang nhìn thấy; dữ liệu nằm trong list Python. Scrollbar dọc
+được map theo vị trí trong list nên cập nhật bảng chỉ tốn O(số dòng nhìn thấy) thay vì
+xóa và insert lại toàn bộ dữ liệu. Khi dữ liệu thay đổi một phần (thêm cuối, sửa, xóa dòng),
+gọi rows_appended/rows_updated/rows_removed để chỉ cập nhật các item bị ảnh hưởng.
+"""
+
+from bisect import bisect_left
+from tkinter import ttk
+
+# Chiều cao mặc định khi chưa đo được từ Treeview (px)
+_DEFAULT_ROW_HEIGHT = 25
+_DEFAULT_HEADER_HEIGHT = 25
+
+# Số dòng cuộn mỗi nấc con lăn chuột
+_WHEEL_STEP = 3
+
+
+class VirtualTreeview:
+    """Điều khiển ttk.Treeview hiển thị một cửa sổ dòng quanh vị trí cuộn
+
+    - rows: list dữ liệu (có thể là chính list của ứng dụng, không copy)
+    - values_func(row): trả về tuple values cho một dòng
+    - before_render(): gọi trước khi xóa các dòng đang hiển thị (ví dụ để kết thúc ô đang sửa)
+    - iid_func(row, index): iid của dòng trong Treeview (mặc định là chỉ số dòng)
+
+    Map iid <-> chỉ số dòng được giữ cho các dòng đang hiển thị (dùng index_of/iid_of).
+    Dòng được chọn và dòng highlight được lưu theo chỉ số nên vẫn giữ khi cuộn.
+    """
+
+    def __init__(self, tree, scrollbar, values_func, rows=None, before_render=None,
+                 highlight_tag='search_highlight', iid_func=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.values_func = values_func
+        self.rows = rows if rows is not None else []
+        self.before_render = before_render
+        self.highlight_tag = highlight_tag
+        self.iid_func = iid_func
+        self.first = 0  # Chỉ số dòng đầu tiên đang hiển thị
+        self._rendered = []  # Các chỉ số dòng đang có trong Treeview (liên tiếp từ first)
+        self._index_by_iid = {}  # iid -> chỉ số dòng của các dòng đang hiển thị
+        self._selected = set()
+        self._highlighted = None
+        self._extend_selection = True  # False khi click chuột không giữ Ctrl/Shift (chọn mới)
+        self._row_height = None
+        self._header_height = None
+
+        # Treeview không tự cuộn - scrollbar điều khiển vị trí trong list
+        self.tree.configure(yscrollcommand='')
+        self.scrollbar.config(command=self.yview)
+
+        self.tree.bind('<<TreeviewSelect>>', self._on_select, add='+')
+        self.tree.bind('<ButtonPress-1>', self._on_button_press, add='+')
+        self.tree.bind('<Configure>', lambda e: self.refresh(), add='+')
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', self._on_mousewheel)
+        self.tree.bind('<Button-5>', self._on_mousewheel)
+        self.tree.bind('<Up>', lambda e: self._move_focus(-1))
+        self.tree.bind('<Down>', lambda e: self._move_focus(1))
+        self.tree.bind('<Prior>', lambda e: self._move_focus(-self.visible_rows()))
+        self.tree.bind('<Next>', lambda e: self._move_focus(self.visible_rows()))
+
+    # ---- Chuyển đổi iid <-> chỉ số dòng ----
+
+    def iid_of(self, index):
+        if self.iid_func is not None:
+            return str(self.iid_func(self.rows[index], index))
+        return str(index)
+
+    def index_of(self, iid):
+        """Chỉ số dòng trong rows của một item đang hiển thị (None nếu không hợp lệ)"""
+        return self._index_by_iid.get(iid)
+
+    # ---- Dữ liệu ----
+
+    def set_rows(self, rows):
+        """Gắn list dữ liệu mới (hoặc list cũ đã thay đổi) và vẽ lại phần đang nhìn thấy"""
+        self.rows = rows
+        total = len(rows)
+        self._selected = {index for index in self._selected if index < total}
+        if self._highlighted is not None and self._highlighted >= total:
+            self._highlighted = None
+        self.refresh()
+
+    def selected_indices(self):
+        """Các chỉ số dòng đang được chọn (kể cả dòng đã cuộn khỏi màn hình), tăng dần"""
+        return sorted(self._selected)
+
+    def clear_selection(self):
+        self._selected = set()
+        self.tree.selection_set([])
+
+    def set_highlight(self, index):
+        """Đánh dấu một dòng (None để bỏ đánh dấu)"""
+        self._highlighted = index
+        self.refresh()
+
+    def select(self, index):
+        """Chọn một dòng, cuộn đến dòng đó và đặt focus"""
+        self._selected = {index}
+        self.see(index)
+        iid = self.iid_of(index)
+        if self.tree.exists(iid):
+            self.tree.selection_set(iid)
+            self.tree.focus(iid)
+
+    # ---- Cuộn và vẽ ----
+
+    def _row_metrics(self):
+        """(chiều cao dòng, chiều cao header) - đo từ dòng đầu tiên khi đã có dòng hiển thị"""
+        if self._row_height is None and self._rendered:
+            bbox = self.tree.bbox(self.iid_of(self._rendered[0]))
+            if bbox:
+                self._header_height = bbox[1]
+                self._row_height = bbox[3]
+        if self._row_height:
+            return self._row_height, self._header_height
+        try:
+            row_height = int(ttk.Style(self.tree).lookup('Treeview', 'rowheight') or _DEFAULT_ROW_HEIGHT)
+        except Exception:
+            row_height = _DEFAULT_ROW_HEIGHT
+        return row_height, _DEFAULT_HEADER_HEIGHT
+
+    def visible_rows(self):
+        """Số dòng nhìn thấy đầy đủ trong Treeview"""
+        height = self.tree.winfo_height()
+        if height <= 1:
+            # Chưa hiển thị (tab chưa được mở) - dùng chiều cao cấu hình
+            return max(1, int(self.tree.cget('height')))
+        row_height, header_height = self._row_metrics()
+        return max(1, (height - header_height) // row_height)
+
+    def see(self, index):
+        """Cuộn để dòng index nằm trong vùng nhìn thấy"""
+        count = self.visible_rows()
+        if index < self.first:
+            self.first = index
+        elif index >= self.first + count:
+            self.first = index - count + 1
+        self.refresh()
+
+    def yview(self, *args):
+        """Lệnh của scrollbar: ('moveto', fraction) hoặc ('scroll', n, 'units'|'pages')"""
+        if not args:
+            return
+        total = len(self.rows)
+        if args[0] == 'moveto':
+            self.first = int(float(args[1]) * total)
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.visible_rows()
+            self.first += amount
+        self.refresh()
+
+    def refresh(self):
+        """Vẽ lại các dòng đang nhìn thấy từ rows - O(số dòng nhìn thấy)"""
+        self._render(self.index_of(self.tree.focus()))
+
+    def _render(self, focus_index):
+        if self.before_render:
+            self.before_render()
+
+        total = len(self.rows)
+        count = self.visible_rows()
+        self.first = max(0, min(self.first, total - count))
+        last = min(total, self.first + count)
+
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self._rendered = []
+        self._index_by_iid = {}
+
+        selection = []
+        for index in range(self.first, last):
+            iid = self._insert_row(index)
+            if index in self._selected:
+                selection.append(iid)
+        self.tree.selection_set(selection)
+        if focus_index is not None and self.first <= focus_index < last:
+            self.tree.focus(self.iid_of(focus_index))
+
+        self._update_scrollbar()
+
+    def _insert_row(self, index):
+        iid = self.iid_of(index)
+        tags = (self.highlight_tag,) if index == self._highlighted else ()
+        self.tree.insert('', 'end', iid=iid, values=self.values_func(self.rows[index]), tags=tags)
+        self._rendered.append(index)
+        self._index_by_iid[iid] = index
+        return iid
+
+    def _update_scrollbar(self):
+        total = len(self.rows)
+        if total:
+            last = self.first + len(self._rendered)
+            self.scrollbar.set(self.first / total, last / total)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    # ---- Cập nhật tăng dần (chỉ chạm vào các item bị ảnh hưởng) ----
+
+    def rows_appended(self, count):
+        """count dòng mới đã được thêm vào cuối rows - chỉ insert các dòng lọt vào vùng nhìn thấy"""
+        if count <= 0:
+            return
+        start = self.first + len(self._rendered)
+        end = min(len(self.rows), self.first + self.visible_rows())
+        for index in range(start, end):
+            self._insert_row(index)
+        self._update_scrollbar()
+
+    def rows_updated(self, indices):
+        """Các dòng đã bị sửa tại chỗ - cập nhật values của những dòng đang hiển thị"""
+        last = self.first + len(self._rendered)
+        for index in indices:
+            if self.first <= index < last:
+                iid = self.iid_of(index)
+                if iid not in self._index_by_iid:
+                    # iid của dòng đã đổi (ví dụ dòng đầu của nhóm bị xóa) - vẽ lại vùng nhìn thấy
+                    self.refresh()
+                    return
+                self.tree.item(iid, values=self.values_func(self.rows[index]))
+
+    def rows_removed(self, indices):
+        """Các dòng (chỉ số trước khi xóa) đã bị xóa khỏi rows"""
+        removed = sorted(set(indices))
+        if not removed:
+            return
+
+        def shift(index):
+            # Chỉ số mới sau khi xóa, None nếu chính dòng đó bị xóa
+            pos = bisect_left(removed, index)
+            if pos < len(removed) and removed[pos] == index:
+                return None
+            return index - pos
+
+        focus_index = self.index_of(self.tree.focus())
+        if focus_index is not None:
+            focus_index = shift(focus_index)
+        self._selected = {index for index in map(shift, self._selected) if index is not None}
+        if self._highlighted is not None:
+            self._highlighted = shift(self._highlighted)
+
+        if removed[0] < self.first + len(self._rendered):
+            # Có dòng bị xóa trước hoặc trong vùng nhìn thấy -> vẽ lại vùng nhìn thấy
+            self.first -= bisect_left(removed, self.first)
+            self._render(focus_index)
+        else:
+            self._update_scrollbar()
+
+    # ---- Sự kiện ----
+
+    def _on_button_press(self, event):
+        # Shift = 0x0001, Control = 0x0004: giữ các dòng đã chọn ngoài màn hình
+        self._extend_selection = bool(event.state & 0x0005)
+
+    def _on_select(self, event=None):
+        window = set(self._rendered)
+        selected = {self.index_of(iid) for iid in self.tree.selection()}
+        selected.discard(None)
+        if self._extend_selection:
+            self._selected = (self._selected - window) | selected
+        else:
+            self._selected = selected
+        self._extend_selection = True
+
+    def _on_mousewheel(self, event):
+        if event.num == 4:
+            step = -_WHEEL_STEP
+        elif event.num == 5:
+            step = _WHEEL_STEP
+        elif event.delta:
+            # Windows: bội số 120, macOS: giá trị nhỏ
+            notches = max(1, abs(event.delta) // 120)
+            step = -_WHEEL_STEP * notches if event.delta > 0 else _WHEEL_STEP * notches
+        else:
+            return 'break'
+        self.first += step
+        self.refresh()
+        return 'break'
+
+    def _move_focus(self, delta):
+        """Di chuyển dòng chọn bằng bàn phím, tự cuộn khi ra khỏi vùng nhìn thấy"""
+        total = len(self.rows)
+        if total:
+            current = self.index_of(self.tree.focus())
+            if current is None:
+                target = self.first
+            else:
+                target = max(0, min(total - 1, current + delta))
+            self.select(target)
+        return 'break'
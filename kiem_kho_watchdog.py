@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Watchdog phát hiện mainloop Tk bị đứng dùng chung cho Kiểm Kho và Kiểm Kho Showroom
+
+Main thread cập nhật nhịp tim bằng root.after mỗi HEARTBEAT_MS. Một thread nền kiểm tra nhịp tim;
+nếu quá ngưỡng (mặc định 150 ms, đổi bằng biến môi trường KIEM_KHO_STALL_MS) thì chụp stack của
+main thread (sys._current_frames) và ghi vào file log xoay vòng cạnh file backup, để biết chính xác
+hàm nào làm giao diện đứng khi đang quét.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from kiem_kho_perf import PERF
+
+STALL_ENV_VAR = 'KIEM_KHO_STALL_MS'
+DEFAULT_THRESHOLD_MS = 150
+HEARTBEAT_MS = 50
+
+# File log xoay vòng: tối đa 1 MB x (1 + 3 file cũ)
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+
+def stall_log_path(backup_file_path):
+    """File log cạnh file backup: kiem_kho_backup.json -> kiem_kho_stall.log"""
+    stem = backup_file_path.stem
+    if stem.endswith('_backup'):
+        stem = stem[:-len('_backup')]
+    return backup_file_path.with_name(f"{stem}_stall.log")
+
+
+def threshold_from_env(default=DEFAULT_THRESHOLD_MS):
+    """Ngưỡng (ms) từ biến môi trường KIEM_KHO_STALL_MS, không hợp lệ thì dùng mặc định"""
+    try:
+        value = int(os.environ.get(STALL_ENV_VAR, ''))
+        return value if value > 0 else default
+    except ValueError:
+        return default
+
+
+class StallWatchdog:
+    """Ghi stack main thread vào log khi mainloop không chạy nhịp tim quá threshold_ms"""
+
+    def __init__(self, root, log_path, threshold_ms=DEFAULT_THRESHOLD_MS):
+        self.root = root
+        self.log_path = log_path
+        self.threshold = threshold_ms / 1000
+        self._main_thread_id = threading.main_thread().ident
+        self._last_beat = None  # None cho đến khi mainloop chạy nhịp tim đầu tiên
+        self._stall_start = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._logger = None
+
+    def _get_logger(self):
+        if self._logger is None:
+            logger = logging.getLogger(f"kiem_kho.stall.{self.log_path}")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            if not logger.handlers:
+                handler = RotatingFileHandler(self.log_path, maxBytes=LOG_MAX_BYTES,
+                                              backupCount=LOG_BACKUP_COUNT, encoding='utf-8', delay=True)
+                handler.setFormatter(logging.Formatter('%(message)s'))
+                logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+    def start(self):
+        """Bắt đầu nhịp tim trên main thread và thread theo dõi"""
+        if self._thread is not None:
+            return
+        self.root.after(HEARTBEAT_MS, self._heartbeat)
+        # Dừng khi cửa sổ chính bị hủy (không báo đứng trong lúc thoát)
+        self.root.bind('<Destroy>', self._on_destroy, add='+')
+        self._thread = threading.Thread(target=self._watch, name='stall-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _on_destroy(self, event):
+        if event.widget is self.root:
+            self.stop()
+
+    def _heartbeat(self):
+        if self._stop.is_set():
+            return
+        self._last_beat = time.monotonic()
+        try:
+            self.root.after(HEARTBEAT_MS, self._heartbeat)
+        except Exception:
+            self.stop()
+
+    def _watch(self):
+        interval = min(self.threshold / 3, HEARTBEAT_MS / 1000)
+        while not self._stop.wait(interval):
+            last_beat = self._last_beat
+            if last_beat is None:
+                continue
+            lag = time.monotonic() - last_beat - HEARTBEAT_MS / 1000
+            if lag > self.threshold:
+                if self._stall_start != last_beat:
+                    # Lần đầu phát hiện đợt đứng này - chụp stack ngay khi main thread đang bị chặn
+                    self._stall_start = last_beat
+                    self._log_stall(lag)
+            elif self._stall_start is not None and self._stall_start != last_beat:
+                self._log_recovered(last_beat)
+
+    def _log_stall(self, lag):
+        try:
+            frame = sys._current_frames().get(self._main_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else '  (không lấy được stack)\n'
+            tong_hop_rows, scanned = PERF.context()
+            self._get_logger().warning(
+                f"=== {datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} "
+                f"Giao diện đứng > {lag * 1000:.0f} ms (ngưỡng {self.threshold * 1000:.0f} ms) | "
+                f"Tổng hợp: {tong_hop_rows} dòng | Đang quét: {scanned} ISBN ===\n{stack}")
+        except Exception as e:
+            print(f"Lỗi khi ghi log giao diện bị đứng: {str(e)}")
+
+    def _log_recovered(self, last_beat):
+        # Nhịp tim đầu tiên sau khi main thread chạy lại - thời gian đứng thực tế
+        stalled_ms = (last_beat - self._stall_start) * 1000 - HEARTBEAT_MS
+        self._stall_start = None
+        if PERF.enabled:
+            PERF.record('mainloop_stall', stalled_ms)
+        try:
+            self._get_logger().warning(f"--- Giao diện chạy lại sau {stalled_ms:.0f} ms\n")
+        except Exception as e:
+            print(f"Lỗi khi ghi log giao diện bị đứng: {str(e)}")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Kiểm tra xuất tăng dần file Kiemkecuoinam: lần đầu ghi toàn bộ, không đổi, ghi phần thay đổi
+(dòng sửa/thêm/xóa) rồi gộp lại - file chính sau khi gộp phải trùng với dữ liệu Tổng hợp.
+
+Chạy: python -m pytest -q test_kiem_kho_export.py
+"""
+
+from kiem_kho_engine import InventorySession
+from kiem_kho_export import (EXPORT_DELTA, EXPORT_FULL, EXPORT_UNCHANGED, _read_rows, consolidate_export,
+                             export_columns, export_incremental, parts_dir)
+from kiem_kho_records import TongHopRecord
+
+
+def _make_record(index, box_count=40):
+    return TongHopRecord({
+        'N/X': 'KK',
+        'Số phiếu': 'P-01/12/2025',
+        'Ngày': '01/12/2025',
+        'Vị trí mới': '',
+        'ISBN': f"978604{index:07d}",
+        'Tựa': f"Tựa {index}",
+        'Tồn thực tế': str(index % 7 + 1),
+        'Số thùng': f"T{index % box_count:03d}",
+        'Tình trạng': '',
+        'Ghi chú': '',
+        'Note thùng': '',
+        '_is_valid_isbn': True,
+    })
+
+
+def _make_session(rows):
+    session = InventorySession()
+    session.add_tong_hop_records([_make_record(index) for index in range(rows)])
+    return session
+
+
+def _delete_rows(session, records):
+    for record in records:
+        session.tong_hop_rows.remove(record['_row_id'])
+    removed = {id(record) for record in records}
+    session.tong_hop_data[:] = [data for data in session.tong_hop_data if id(data) not in removed]
+
+
+def _file_rows(path):
+    # Ô trống đọc lại là None
+    return [['' if value is None else value for value in row] for row in _read_rows(path)]
+
+
+def _expected_rows(session):
+    rows = session.export_rows()
+    columns = export_columns(rows)
+    return [[row.get(column, '') for column in columns] for row in rows]
+
+
+def test_incremental_export_round_trip(tmp_path):
+    session = _make_session(400)
+    path = tmp_path / 'Kiemkecuoinam_01-12-2025_To1.xlsx'
+
+    assert export_incremental(path, session.export_rows()) == (EXPORT_FULL, 400)
+    assert export_incremental(path, session.export_rows()) == (EXPORT_UNCHANGED, 0)
+
+    # Sửa 3 dòng, xóa 2 dòng, thêm 4 dòng -> chỉ ghi file phần
+    for record in session.tong_hop_data[10:13]:
+        record['Tồn thực tế'] = '99'
+        record['Tình trạng'] = 'Dư'
+    _delete_rows(session, [session.tong_hop_data[0], session.tong_hop_data[200]])
+    session.add_tong_hop_records([_make_record(index) for index in range(400, 404)])
+
+    status, part_rows = export_incremental(path, session.export_rows())
+    assert (status, part_rows) == (EXPORT_DELTA, 3 + 2 + 4)
+    assert (parts_dir(path) / 'part_0001.xlsx').exists()
+    # File chính chưa đổi cho đến khi gộp
+    assert len(_read_rows(path)) == 400
+
+    assert consolidate_export(path) == 402
+    assert [part.name for part in parts_dir(path).iterdir()] == ['manifest.json']
+    assert _file_rows(path) == _expected_rows(session)
+
+    # Sau khi gộp, lần xuất tiếp theo vẫn nhận ra không có gì thay đổi
+    assert export_incremental(path, session.export_rows()) == (EXPORT_UNCHANGED, 0)
+    assert consolidate_export(path) is None
+
+
+def test_parts_consolidated_at_max_parts(tmp_path):
+    session = _make_session(50)
+    path = tmp_path / 'Kiemkecuoinam.xlsx'
+    export_incremental(path, session.export_rows(), max_parts=2)
+
+    session.tong_hop_data[0]['Tồn thực tế'] = '20'
+    assert export_incremental(path, session.export_rows(), max_parts=2) == (EXPORT_DELTA, 1)
+    session.add_tong_hop_records([_make_record(50)])
+    # Đủ max_parts file phần -> tự gộp vào file chính
+    assert export_incremental(path, session.export_rows(), max_parts=2) == (EXPORT_DELTA, 1)
+
+    assert [part.name for part in parts_dir(path).iterdir()] == ['manifest.json']
+    assert _file_rows(path) == _expected_rows(session)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Kiểm tra khôi phục backup từ snapshot + journal: phát lại thêm/sửa/xóa dòng và trạng thái đang quét,
+bỏ dòng cuối bị ghi dở, bỏ cả journal khi journal_id không khớp với snapshot.
+
+Chạy: python -m pytest -q test_kiem_kho_journal.py
+"""
+
+from kiem_kho_journal import (OP_ADD_ROWS, OP_DELETE_ROWS, OP_SCAN_STATE, OP_UPDATE_ROW, BackupJournal,
+                              new_journal_id, replay_journal)
+
+
+def _row(row_id, isbn, quantity):
+    return {'ISBN': isbn, 'Tồn thực tế': quantity, 'Số thùng': 'T001', '_row_id': row_id}
+
+
+def _write(journal, journal_id, op, payload):
+    assert journal.write_line(journal_id, journal.make_line(op, payload))
+
+
+def test_replay_snapshot_and_journal(tmp_path):
+    journal = BackupJournal(tmp_path / 'kiem_kho_backup.json')
+    journal_id = new_journal_id()
+    journal.begin(journal_id)
+    journal.reset(journal_id)
+
+    # Snapshot: 3 dòng Tổng hợp, chưa có ISBN đang quét
+    snapshot_rows = [_row(1, '9786040000001', '1'), _row(2, '9786040000002', '2'), _row(3, '9786040000003', '3')]
+
+    _write(journal, journal_id, OP_ADD_ROWS, {'rows': [_row(4, '9786040000004', '4'), _row(5, '9786040000005', '5')]})
+    _write(journal, journal_id, OP_UPDATE_ROW, {'row_id': 2, 'row': _row(2, '9786040000002', '20')})
+    _write(journal, journal_id, OP_DELETE_ROWS, {'row_ids': [1, 4]})
+    _write(journal, journal_id, OP_UPDATE_ROW, {'row_id': 5, 'row': _row(5, '9786040000005', '50')})
+    scanned = {'9786040000009': {'isbn': '9786040000009', 'tua': '', 'ton_thuc_te': '2'}}
+    _write(journal, journal_id, OP_SCAN_STATE, {'scanned_items': scanned, 'current_box_number': 'T002'})
+    # Crash giữa lúc ghi: dòng cuối bị ghi dở (không có xuống dòng, JSON không đầy đủ)
+    with open(journal.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"op": "delete_rows", "row_ids": [2')
+
+    entries = journal.read_entries(journal_id)
+    assert [entry['op'] for entry in entries] == [OP_ADD_ROWS, OP_UPDATE_ROW, OP_DELETE_ROWS, OP_UPDATE_ROW,
+                                                  OP_SCAN_STATE]
+
+    scanned_items, tong_hop_data, current_box_number = replay_journal(entries, {}, snapshot_rows, 'T001')
+    assert [(row['_row_id'], row['Tồn thực tế']) for row in tong_hop_data] == [(2, '20'), (3, '3'), (5, '50')]
+    assert scanned_items == scanned
+    assert current_box_number == 'T002'
+
+
+def test_journal_ignored_when_id_mismatch(tmp_path):
+    journal = BackupJournal(tmp_path / 'kiem_kho_backup.json')
+    old_id = new_journal_id()
+    journal.begin(old_id)
+    journal.reset(old_id)
+    _write(journal, old_id, OP_ADD_ROWS, {'rows': [_row(1, '9786040000001', '1')]})
+
+    # Snapshot mới đã được ghi (id mới) nhưng chưa kịp reset journal - journal cũ không được phát lại
+    assert journal.read_entries(new_journal_id()) == []
+    # Ghi vào journal với id khác id trên đĩa bị bỏ qua
+    assert not journal.write_line(new_journal_id(), journal.make_line(OP_DELETE_ROWS, {'row_ids': [1]}))
+    assert len(journal.read_entries(old_id)) == 1